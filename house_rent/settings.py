@@ -363,7 +363,21 @@ CLOUDINARY_STORAGE = {
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Django 5 no longer reads DEFAULT_FILE_STORAGE or STATICFILES_STORAGE; 'default'
+# and 'staticfiles' are what it has been using in their place. 'images' receives
+# the variants made by the image pipeline (rent_api/images.py); set
+# IMAGE_STORAGE_BACKEND=django.core.files.storage.FileSystemStorage to keep them
+# under MEDIA_ROOT instead of on Cloudinary.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'images': {
+        'BACKEND': config('IMAGE_STORAGE_BACKEND', default='cloudinary_storage.storage.MediaCloudinaryStorage'),
+    },
+}
+
 MIDDLEWARE = [
+    'rent_api.performance.PerformanceMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -454,6 +468,105 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson when installed, same output as DRF's JSON classes (rent_api/fast_json.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'rent_api.fast_json.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rent_api.fast_json.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# The response cache and the view count buffer get caches of their own, so
+# neither evicts the other's entries (or everything else's). Per process as
+# configured here; point them at Redis or Memcached to share them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api-responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api-responses',
+        'OPTIONS': {'MAX_ENTRIES': config('API_RESPONSE_CACHE_MAX_ENTRIES', default=5000, cast=int)},
+    },
+    'view-counts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'view-counts',
+        # Dedupe markers take one entry per viewer and ad
+        'OPTIONS': {'MAX_ENTRIES': config('VIEW_COUNT_CACHE_MAX_ENTRIES', default=200000, cast=int)},
+    },
+}
+
+# Shared cache for public list/detail responses (see rent_api/cache.py)
+API_RESPONSE_CACHE = {
+    'CACHE': 'api-responses',
+    'TIMEOUT': config('API_RESPONSE_CACHE_TIMEOUT', default=300, cast=int),
+}
+
+# Advertisement view counts are buffered in the cache and flushed in bulk
+# (see rent_add/view_counts.py and the flush_view_counts command)
+VIEW_COUNT_BUFFER = {
+    'CACHE': 'view-counts',
+    'DEDUPE_WINDOW': config('VIEW_COUNT_DEDUPE_WINDOW', default=30 * 60, cast=int),
+    'FLUSH_INTERVAL': config('VIEW_COUNT_FLUSH_INTERVAL', default=30, cast=int),
+}
+
+# Notifications are queued as jobs and written in batches by a worker
+# (see rent_user/notifications.py and the run_notification_worker command)
+NOTIFICATION_QUEUE = {
+    'BATCH_SIZE': config('NOTIFICATION_QUEUE_BATCH_SIZE', default=500, cast=int),
+    'MAX_ATTEMPTS': config('NOTIFICATION_QUEUE_MAX_ATTEMPTS', default=5, cast=int),
+    'IN_PROCESS_WORKER': config('NOTIFICATION_QUEUE_IN_PROCESS_WORKER', default=True, cast=bool),
+}
+
+# Similar-ads refresh queue (rent_add/similarity.py)
+SIMILAR_ADS = {
+    'BATCH_SIZE': config('SIMILAR_ADS_BATCH_SIZE', default=100, cast=int),
+    'IN_PROCESS_WORKER': config('SIMILAR_ADS_IN_PROCESS_WORKER', default=True, cast=bool),
+}
+
+# Notification digests and archiving (rent_user/retention.py)
+NOTIFICATION_RETENTION = {
+    'ARCHIVE_AFTER_DAYS': config('NOTIFICATION_ARCHIVE_AFTER_DAYS', default=90, cast=int),
+    'COALESCE_AFTER_HOURS': config('NOTIFICATION_COALESCE_AFTER_HOURS', default=24, cast=int),
+    'MIN_COUNT': config('NOTIFICATION_COALESCE_MIN_COUNT', default=5, cast=int),
+}
+
+# Uploaded images are resized and re-encoded off the request path
+# (see rent_api/images.py and the process_images command)
+IMAGE_PIPELINE = {
+    'WORKERS': config('IMAGE_PIPELINE_WORKERS', default=2, cast=int),
+    'QUALITY': config('IMAGE_PIPELINE_QUALITY', default=80, cast=int),
+    'IN_PROCESS_WORKER': config('IMAGE_PIPELINE_IN_PROCESS_WORKER', default=True, cast=bool),
+}
+
+# Per-request timing and query accounting (rent_api/performance.py)
+API_PERFORMANCE = {
+    'SERVER_TIMING': config('API_PERFORMANCE_SERVER_TIMING', default=True, cast=bool),
+    'LOG_SAMPLE_RATE': config('API_PERFORMANCE_LOG_SAMPLE_RATE', default=0.01, cast=float),
+    'SLOW_REQUEST_MS': config('API_PERFORMANCE_SLOW_REQUEST_MS', default=1000, cast=int),
+    'QUERY_BUDGET': config('API_PERFORMANCE_QUERY_BUDGET', default=50, cast=int),
+    'BUDGET_ACTION': config('API_PERFORMANCE_BUDGET_ACTION', default='warn'),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'rent_api.performance': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Server-sent events at /api/v1/stream/ (rent_user/broadcast.py)
+REALTIME_STREAM = {
+    'HEARTBEAT': config('REALTIME_STREAM_HEARTBEAT', default=20, cast=int),
+    'POLL_INTERVAL': config('REALTIME_STREAM_POLL_INTERVAL', default=15, cast=int),
 }
 
 # Simple JWT
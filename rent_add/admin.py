@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import RentAdvertisement, AdvertisementImage, RentRequest, FavoriteAdvertisement, Review
+from .models import RentAdvertisement, AdvertisementImage, RentRequest, FavoriteAdvertisement, Review, AdvertisementDailyStat
 # Register your models here.
 
 
 @admin.register(RentAdvertisement)
 class RentAdvertisementAdmin(admin.ModelAdmin):
-    list_display = ['title', 'owner', 'location', 'price', 'status', 'created_at', 'views_count']
+    list_display = ['title', 'owner', 'location', 'price', 'status', 'created_at', 'views_count', 'rating_count', 'favorite_count']
     list_filter = ['status', 'category', 'created_at']
     search_fields = ['title', 'location', 'description']
     readonly_fields = ['created_at', 'updated_at', 'views_count']
@@ -42,4 +42,10 @@ class FavoriteAdvertisementAdmin(admin.ModelAdmin):
 class ReviewAdmin(admin.ModelAdmin):
     list_display = ['advertisement', 'user', 'rating', 'created_at', 'is_verified']
     list_filter = ['rating', 'created_at', 'is_verified']
-    search_fields = ['advertisement__title', 'user__username']
\ No newline at end of file
+    search_fields = ['advertisement__title', 'user__username']
+
+@admin.register(AdvertisementDailyStat)
+class AdvertisementDailyStatAdmin(admin.ModelAdmin):
+    list_display = ['date', 'category', 'location', 'status', 'count']
+    list_filter = ['status', 'category', 'date']
+    search_fields = ['location']
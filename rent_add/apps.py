@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RentAddConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rent_add'
+
+    def ready(self):
+        # Connect the statistics rollup receivers
+        from rent_add import search_index, signals  # noqa: F401
+
+        # Migrations that rebuild the ads table on SQLite drop the FTS triggers
+        post_migrate.connect(search_index.reinstall_after_migrate, sender=self)
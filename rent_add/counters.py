@@ -0,0 +1,64 @@
+"""
+Denormalized review and favorite counters on RentAdvertisement.
+
+``rating_sum``, ``rating_count`` and ``favorite_count`` are moved with
+F() expressions as Review and FavoriteAdvertisement rows are saved and
+deleted (rent_add/signals.py), so concurrent writers never lose an update.
+``reconcile()``, run by the reconcile_advertisement_counters command,
+recomputes them from the source tables for anything that bypassed the
+signals (queryset.update(), bulk_create(), raw SQL).
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from rent_add.models import RentAdvertisement
+
+COUNTER_FIELDS = ('rating_sum', 'rating_count', 'favorite_count')
+
+
+def adjust(advertisement_id, **deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if advertisement_id is None or not deltas:
+        return
+    RentAdvertisement.objects.filter(pk=advertisement_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def expected_counters(model=RentAdvertisement):
+    """Subquery expressions computing each counter from the source rows."""
+    def total(related_name, aggregate):
+        related = model._meta.get_field(related_name)
+        rows = related.related_model.objects.filter(**{related.field.name: OuterRef('pk')})
+        value = rows.order_by().values(related.field.name).annotate(value=aggregate).values('value')
+        return Coalesce(Subquery(value, output_field=IntegerField()), Value(0))
+
+    return {
+        'rating_sum': total('reviews', Sum('rating')),
+        'rating_count': total('reviews', Count('pk')),
+        'favorite_count': total('favorited_by', Count('pk')),
+    }
+
+
+def reconcile(model=RentAdvertisement, batch_size=1000):
+    """Fix counters that disagree with the source rows; returns how many ads changed."""
+    expected = expected_counters(model)
+    in_sync = Q(*(Q(**{field: F(f'expected_{field}')}) for field in COUNTER_FIELDS))
+    fixed = 0
+    last_pk = None
+    while True:
+        batch = model.objects.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return fixed
+        last_pk = pks[-1]
+        drifted = list(
+            model.objects.filter(pk__in=pks)
+            .annotate(**{f'expected_{field}': expression for field, expression in expected.items()})
+            .exclude(in_sync)
+            .values_list('pk', flat=True)
+        )
+        if drifted:
+            fixed += model.objects.filter(pk__in=drifted).update(**expected)
@@ -0,0 +1,96 @@
+"""
+Minimal geohash helpers for indexing advertisement coordinates.
+
+A geohash prefix is a lat/lng cell, so "all ads in a cell" is a range scan on
+an ordinary btree index over ``RentAdvertisement.geohash``.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+DECODE_MAP = {char: index for index, char in enumerate(BASE32)}
+# Sorts after every geohash character, so [cell, cell + END) spans a cell
+END = '{'
+MAX_PRECISION = 9
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude, longitude, precision=MAX_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """Return (min_lat, min_lng, max_lat, max_lng) of a cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = DECODE_MAP[char]
+        for shift in range(4, -1, -1):
+            interval = lng_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def cell_size_km(precision, latitude):
+    """Height and width of a cell in kilometres at the given latitude."""
+    lat_bits = precision * 5 // 2
+    lng_bits = precision * 5 - lat_bits
+    height = 180.0 / 2 ** lat_bits * KM_PER_DEGREE
+    width = 360.0 / 2 ** lng_bits * KM_PER_DEGREE * math.cos(math.radians(latitude))
+    return height, width
+
+
+def neighbors(geohash):
+    """The cell itself and the (up to) eight cells around it."""
+    min_lat, min_lng, max_lat, max_lng = bounds(geohash)
+    height = max_lat - min_lat
+    width = max_lng - min_lng
+    center_lat = (min_lat + max_lat) / 2
+    center_lng = (min_lng + max_lng) / 2
+    cells = set()
+    for dlat in (-1, 0, 1):
+        latitude = center_lat + dlat * height
+        if not -90 <= latitude <= 90:
+            continue
+        for dlng in (-1, 0, 1):
+            longitude = (center_lng + dlng * width + 180) % 360 - 180
+            cells.add(encode(latitude, longitude, len(geohash)))
+    return sorted(cells)
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Cells that together cover a circle: the finest precision whose cells are
+    at least radius_km across, plus neighbours. Returns [] when the circle is
+    too large for a prefix filter to help.
+    """
+    for precision in range(MAX_PRECISION, 0, -1):
+        if min(cell_size_km(precision, latitude)) >= radius_km:
+            return neighbors(encode(latitude, longitude, precision))
+    return []
@@ -0,0 +1,83 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rent_add.models import RentAdvertisement
+from rent_api.search import IcontainsSearchBackend, get_search_backend
+from users.models import CustomUser
+
+WORDS = [
+    'sunny', 'quiet', 'spacious', 'furnished', 'family', 'studio', 'duplex', 'penthouse',
+    'balcony', 'garden', 'parking', 'lift', 'generator', 'rooftop', 'lake', 'market',
+    'school', 'hospital', 'mosque', 'park', 'corner', 'renovated', 'modern', 'cozy',
+]
+LOCATIONS = ['Gulshan', 'Banani', 'Dhanmondi', 'Uttara', 'Mirpur', 'Mohammadpur', 'Bashundhara', 'Motijheel']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the full-text search backend against icontains search on synthetic ads. '
+        'Rows are inserted inside a transaction that is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma-separated table sizes to measure at')
+        parser.add_argument('--queries', default='gulshan,sunny balcony,renov',
+                            help='Comma-separated search strings')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        queries = [query.split() for query in options['queries'].split(',')]
+        backends = [('icontains', IcontainsSearchBackend()), ('fulltext', get_search_backend())]
+        random.seed(42)
+
+        with transaction.atomic():
+            owner = CustomUser.objects.create_user(email='bench-search@example.com', password=None)
+            created = 0
+            for size in sizes:
+                created = self.seed(owner, created, size, options['batch_size'])
+                for terms in queries:
+                    for name, backend in backends:
+                        elapsed, matches = self.measure(backend, terms, options['repeat'])
+                        self.stdout.write(
+                            f"rows={size:<9} backend={name:<10} query={' '.join(terms)!r:<18} "
+                            f"matches={matches:<8} page_ms={elapsed * 1000:.2f}"
+                        )
+            transaction.set_rollback(True)
+
+    def seed(self, owner, created, size, batch_size):
+        while created < size:
+            count = min(batch_size, size - created)
+            RentAdvertisement.objects.bulk_create([
+                RentAdvertisement(
+                    title=' '.join(random.sample(WORDS, 3)),
+                    description=' '.join(random.choices(WORDS, k=30)),
+                    location=f'{random.choice(LOCATIONS)}, Dhaka',
+                    price=random.randint(5000, 100000),
+                    bedrooms=random.randint(1, 5),
+                    bathrooms=random.randint(1, 3),
+                    status='approved',
+                    owner=owner,
+                )
+                for _ in range(count)
+            ], batch_size=batch_size)
+            created += count
+        return created
+
+    def measure(self, backend, terms, repeat):
+        queryset = backend.search(
+            RentAdvertisement.objects.filter(status='approved', is_available=True), terms
+        ).order_by('-search_rank', '-created_at')
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            # What a list request does: one page plus the paginator's count
+            list(queryset[:20])
+            matches = queryset.count()
+            timings.append(time.perf_counter() - started)
+        return sorted(timings)[len(timings) // 2], matches
@@ -0,0 +1,35 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from rent_add import transfer
+from rent_add.models import RentAdvertisement
+
+
+class Command(BaseCommand):
+    help = 'Export advertisements to CSV or JSON Lines, streaming them from the database in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Defaults to standard output')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Guessed from the file name by default')
+        parser.add_argument('--status', action='append', help='Only ads with this status; may be repeated')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or (transfer.detect_format(path) if path else 'jsonl')
+        advertisements = RentAdvertisement.objects.all()
+        if options['status']:
+            advertisements = advertisements.filter(status__in=options['status'])
+
+        started = time.perf_counter()
+        rows = transfer.export_rows(advertisements, options['chunk_size'])
+        if path:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                written = transfer.write_rows(stream, rows, format)
+        else:
+            written = transfer.write_rows(sys.stdout, rows, format)
+        elapsed = time.perf_counter() - started
+        # Progress goes to stderr, so exporting to stdout stays clean
+        self.stderr.write(f'Exported {written} advertisements in {elapsed:.1f}s ({written / elapsed if elapsed else 0:.0f} rows/s)')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from rent_add import view_counts
+
+
+class Command(BaseCommand):
+    help = 'Write buffered advertisement view counts to the database'
+
+    def handle(self, *args, **options):
+        flushed = view_counts.flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} buffered views'))
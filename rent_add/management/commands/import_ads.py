@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rent_add import transfer
+from rent_add.models import RentAdvertisement
+from rent_api.cache import bump_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Import advertisements from a CSV or JSON Lines file (see rent_add/transfer.py for the '
+        'columns), validating every row and inserting them in batches. Rejected rows are written '
+        'to a JSON Lines file next to the input.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Guessed from the file name by default')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--source', help='Name ids of rows without one are derived from (the file name by default)')
+        parser.add_argument('--resume', action='store_true', help='Skip the rows the checkpoint file covers')
+        parser.add_argument('--checkpoint', help='Defaults to <path>.checkpoint')
+        parser.add_argument('--rejected', help='Defaults to <path>.rejected.jsonl')
+        parser.add_argument('--skip-similar', action='store_true',
+                            help="Don't rebuild the similar-ads lists afterwards (run rebuild_similar_ads later)")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        format = options['format'] or transfer.detect_format(path)
+        source = options['source'] or os.path.basename(path)
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = self.read_checkpoint(checkpoint) if options['resume'] else 0
+        serializer = transfer.new_serializer()
+
+        created = existing = rejected = 0
+        started = time.perf_counter()
+        with open(path, newline='', encoding='utf-8') as stream, \
+                open(options['rejected'] or f'{path}.rejected.jsonl', 'a' if done else 'w') as rejects:
+            rows = ((number, row) for number, row in transfer.read_rows(stream, format) if number > done)
+            for batch in transfer.batched(rows, options['batch_size']):
+                batch_created, batch_existing, batch_rejected = transfer.import_batch(serializer, batch, source)
+                for rejection in batch_rejected:
+                    rejects.write(json.dumps(rejection) + '\n')
+                rejects.flush()
+                self.write_checkpoint(checkpoint, batch[-1][0])
+                created += batch_created
+                existing += batch_existing
+                rejected += len(batch_rejected)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'row {batch[-1][0]}: {created} created, {existing} already there, {rejected} rejected '
+                    f'({(created + existing + rejected) / elapsed:.0f} rows/s)'
+                )
+
+        if created:
+            if not options['skip_similar']:
+                transfer.finish_import()
+            bump_version(RentAdvertisement)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} advertisements in {elapsed:.1f}s; {existing} were already there, {rejected} rejected'
+        ))
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return json.load(checkpoint)['row']
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, path, row):
+        # Replaced in one step, so a crash leaves the old checkpoint or the new one
+        with open(f'{path}.tmp', 'w') as checkpoint:
+            json.dump({'row': row}, checkpoint)
+        os.replace(f'{path}.tmp', path)
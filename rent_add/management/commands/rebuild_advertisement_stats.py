@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from rent_add import statistics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily advertisement statistics rollup from the ads table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild days on or after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a YYYY-MM-DD date')
+        rows = statistics.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily statistics rows'))
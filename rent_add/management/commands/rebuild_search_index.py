@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from rent_add import search_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the advertisement full-text index (run after VACUUM on SQLite)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        search_index.install(connections[options['database']])
+        self.stdout.write(self.style.SUCCESS('Advertisement search index rebuilt'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from rent_add import similarity
+from rent_add.models import RentAdvertisement
+from rent_api.cache import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Recompute the similar-ads neighbours of every live advertisement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rows = similarity.rebuild(batch_size=options['batch_size'])
+        bump_version(RentAdvertisement)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} similar-ad rows'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from rent_add import counters
+from rent_add.models import RentAdvertisement
+from rent_api.cache import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_sum, rating_count and favorite_count from reviews and favorites'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile(batch_size=options['batch_size'])
+        if fixed:
+            bump_version(RentAdvertisement)
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters on {fixed} advertisements'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from rent_add import similarity
+
+
+class Command(BaseCommand):
+    help = 'Refresh the similar-ads lists of queued ads until stopped (or once with --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed = similarity.run_once(options['batch_size'])
+            if refreshed:
+                self.stdout.write(f'Refreshed similar ads of {refreshed} advertisements')
+            if options['once']:
+                return
+            connections.close_all()
+            time.sleep(options['interval'])
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from rent_add import primary_images
+from rent_add.models import RentAdvertisement
+from rent_api.cache import bump_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Leave every advertisement with at most one primary image and point its primary_image '
+        'at it (or at its first image)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        demoted, refreshed = primary_images.repair(batch_size=options['batch_size'])
+        bump_version(RentAdvertisement)
+        self.stdout.write(self.style.SUCCESS(
+            f'Demoted {demoted} duplicate primary images; refreshed {refreshed} advertisements'
+        ))
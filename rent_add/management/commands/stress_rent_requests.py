@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from rent_add import rent_requests
+from rent_add.models import RentAdvertisement, RentRequest
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Accept competing rent requests on one advertisement from parallel threads and '
+        'check that exactly one wins. Creates its own users and ad and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=20)
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        owner = CustomUser.objects.create_user(email='stress-owner@example.com', password=None)
+        requesters = CustomUser.objects.bulk_create([
+            CustomUser(email=f'stress-requester-{index}@example.com') for index in range(options['threads'])
+        ])
+        try:
+            failures = 0
+            for round_number in range(options['rounds']):
+                failures += self.run_round(round_number, owner, requesters)
+        finally:
+            CustomUser.objects.filter(pk__in=[owner.pk] + [user.pk for user in requesters]).delete()
+        if failures:
+            raise CommandError(f'{failures} rounds ended with more than one accepted request')
+
+    def run_round(self, round_number, owner, requesters):
+        advertisement = RentAdvertisement.objects.create(
+            title=f'Stress test {round_number}', description='', price=1000, location='Dhaka',
+            bedrooms=1, bathrooms=1, status='approved', owner=owner,
+        )
+        pending = RentRequest.objects.bulk_create([
+            RentRequest(advertisement=advertisement, user=user) for user in requesters
+        ])
+        outcomes = Counter()
+        outcomes_lock = threading.Lock()
+        barrier = threading.Barrier(len(pending))
+
+        def accept(rent_request):
+            barrier.wait()
+            try:
+                rent_requests.decide(rent_request, 'accept')
+                outcome = 'accepted'
+            except rent_requests.RentRequestError:
+                outcome = 'refused'
+            except Exception as exc:
+                outcome = type(exc).__name__
+            finally:
+                connections.close_all()
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=accept, args=[rent_request]) for rent_request in pending]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        statuses = Counter(RentRequest.objects.filter(advertisement=advertisement).values_list('status', flat=True))
+        advertisement.refresh_from_db()
+        self.stdout.write(
+            f'round {round_number}: {dict(outcomes)} requests={dict(statuses)} '
+            f'ad={advertisement.status} in {elapsed * 1000:.0f}ms'
+        )
+        advertisement.delete()
+        return int(statuses['accepted'] != 1 or statuses['pending'] != 0)
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from rent_add import search_index
+
+
+def install_search_index(apps, schema_editor):
+    search_index.install(schema_editor.connection)
+
+
+def remove_search_index(apps, schema_editor):
+    search_index.remove(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0002_alter_advertisementimage_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, remove_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+from rent_add import search_index
+from rent_add.geohash import encode
+
+
+def backfill_geohash(apps, schema_editor):
+    RentAdvertisement = apps.get_model('rent_add', 'RentAdvertisement')
+    located = RentAdvertisement.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    batch = []
+    for advertisement in located.only('id', 'latitude', 'longitude').iterator(chunk_size=1000):
+        advertisement.geohash = encode(float(advertisement.latitude), float(advertisement.longitude))
+        batch.append(advertisement)
+        if len(batch) == 1000:
+            RentAdvertisement.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    RentAdvertisement.objects.bulk_update(batch, ['geohash'])
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding the column rebuilds the table on SQLite, which drops the FTS triggers
+    search_index.install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0003_advertisement_search'),
+        ('rent_type', '0002_alter_category_icon'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentadvertisement',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(fields=['latitude', 'longitude'], name='rent_add_ad_lat_lng_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
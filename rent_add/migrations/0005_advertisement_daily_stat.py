@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:23
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.db import migrations, models
+
+from rent_add.statistics import KEY_FIELDS, stat_key
+
+
+def build_daily_stats(apps, schema_editor):
+    RentAdvertisement = apps.get_model('rent_add', 'RentAdvertisement')
+    AdvertisementDailyStat = apps.get_model('rent_add', 'AdvertisementDailyStat')
+    counts = Counter(
+        stat_key(*values)
+        for values in RentAdvertisement.objects.values_list(*KEY_FIELDS).iterator(chunk_size=5000)
+    )
+    AdvertisementDailyStat.objects.bulk_create([
+        AdvertisementDailyStat(date=date, category_id=category_id, location=location, status=status, count=count)
+        for (date, category_id, location, status), count in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0004_advertisement_geohash'),
+        ('rent_type', '0002_alter_category_icon'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdvertisementDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('location', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending Approval'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('rented', 'Rented'), ('expired', 'Expired')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='rent_type.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'category', 'location', 'status'), name='rent_add_daily_stat_unique'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('date', 'location', 'status'), name='rent_add_daily_stat_unique_uncategorized')],
+            },
+        ),
+        migrations.RunPython(build_daily_stats, migrations.RunPython.noop),
+    ]
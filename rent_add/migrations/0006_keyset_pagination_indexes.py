@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0005_advertisement_daily_stat'),
+        ('rent_type', '0002_alter_category_icon'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(fields=['created_at', 'id'], name='rent_add_ad_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(fields=['price', 'id'], name='rent_add_ad_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(fields=['area', 'id'], name='rent_add_ad_area_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(fields=['bedrooms', 'id'], name='rent_add_ad_bedrooms_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(fields=['views_count', 'id'], name='rent_add_ad_views_id_idx'),
+        ),
+    ]
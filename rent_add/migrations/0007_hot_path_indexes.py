@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0006_keyset_pagination_indexes'),
+        ('rent_type', '0002_alter_category_icon'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 'approved')), fields=['created_at', 'id'], name='rent_add_ad_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(condition=models.Q(('is_available', True), ('status', 'approved')), fields=['category', 'created_at'], name='rent_add_ad_live_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentadvertisement',
+            index=models.Index(fields=['owner', 'created_at'], name='rent_add_ad_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentrequest',
+            index=models.Index(fields=['advertisement', 'status'], name='rent_add_request_ad_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rentrequest',
+            index=models.Index(fields=['user', 'created_at'], name='rent_add_request_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['advertisement', 'created_at'], name='rent_add_review_ad_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', 'created_at'], name='rent_add_review_user_idx'),
+        ),
+    ]
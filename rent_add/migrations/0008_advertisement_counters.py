@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+from rent_add import counters, search_index
+
+
+def backfill_counters(apps, schema_editor):
+    counters.reconcile(apps.get_model('rent_add', 'RentAdvertisement'))
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding the columns rebuilds the table on SQLite, which drops the FTS triggers
+    search_index.install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentadvertisement',
+            name='favorite_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='rentadvertisement',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='rentadvertisement',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from rent_add import similarity
+
+
+def build_similar_ads(apps, schema_editor):
+    similarity.rebuild(
+        apps.get_model('rent_add', 'RentAdvertisement'), apps.get_model('rent_add', 'SimilarAdvertisement')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0008_advertisement_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarAdvertisement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('advertisement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_advertisements', to='rent_add.rentadvertisement')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='rent_add.rentadvertisement')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('advertisement', 'rank'), name='rent_add_similar_ad_rank_unique')],
+            },
+        ),
+        migrations.RunPython(build_similar_ads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0009_similar_advertisement'),
+        ('rent_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='advertisementimage',
+            name='stored_image',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rent_api.storedimage'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from rent_add import primary_images, search_index
+
+
+def repair_primary_images(apps, schema_editor):
+    # Duplicates must go before the constraint can be created
+    primary_images.repair(
+        apps.get_model('rent_add', 'RentAdvertisement'), apps.get_model('rent_add', 'AdvertisementImage')
+    )
+
+
+def reinstall_search_index(apps, schema_editor):
+    # Adding the column rebuilds the table on SQLite, which drops the FTS triggers
+    search_index.install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0010_image_pipeline'),
+        ('rent_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rentadvertisement',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rent_add.advertisementimage'),
+        ),
+        # Before the repair writes to the ads table: PostgreSQL won't ALTER a table with pending FK checks
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+        migrations.RunPython(repair_primary_images, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='advertisementimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_primary', True)), fields=('advertisement',), name='rent_add_one_primary_image'),
+        ),
+    ]
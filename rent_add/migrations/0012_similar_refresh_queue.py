@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0011_primary_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSimilarRefresh',
+            fields=[
+                ('advertisement_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('queued_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -1,13 +1,37 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Value, When
+from django.db.models.functions import Cast
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from rent_type.models import Category, Amenity
 from django.conf import settings 
 from cloudinary.models import CloudinaryField
+from rent_add.geohash import encode as encode_geohash
 
 # Create your models here.
 
+class RentAdvertisementQuerySet(models.QuerySet):
+    def with_average_rating(self):
+        # From the denormalized counters, so it costs nothing and can be ordered by
+        return self.annotate(average_rating=Case(
+            When(rating_count=0, then=Value(0.0)),
+            default=Cast('rating_sum', FloatField()) / F('rating_count'),
+            output_field=FloatField(),
+        ))
+
+    def for_listing(self, user=None):
+        # Everything the list serializer needs in one query: owner, category
+        # and primary image joined, the favorite flag annotated.
+        queryset = self.select_related(
+            'owner', 'category', 'primary_image__stored_image'
+        ).with_average_rating()
+        if user is not None and user.is_authenticated:
+            favorites = FavoriteAdvertisement.objects.filter(advertisement=OuterRef('pk'), user=user)
+            return queryset.annotate(is_favorited=Exists(favorites))
+        return queryset.annotate(is_favorited=Value(False))
+
+
 class RentAdvertisement(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending Approval'),
@@ -27,6 +51,8 @@ class RentAdvertisement(models.Model):
     location = models.CharField(max_length=200)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Derived from latitude/longitude on save; prefix range scans find ads in a map cell
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False, db_index=True)
     area = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     bedrooms = models.PositiveIntegerField()
     bathrooms = models.PositiveIntegerField()
@@ -43,13 +69,74 @@ class RentAdvertisement(models.Model):
     contact_phone = models.CharField(max_length=15, blank=True)
     contact_email = models.EmailField(blank=True)
     views_count = models.PositiveIntegerField(default=0)
+    # Kept in step with Review and FavoriteAdvertisement rows by rent_add/counters.py
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_count = models.IntegerField(default=0, editable=False)
+    favorite_count = models.IntegerField(default=0, editable=False)
+    # Kept in step with the ad's images by rent_add/primary_images.py
+    primary_image = models.ForeignKey(
+        'AdvertisementImage', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
+
+    objects = RentAdvertisementQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Bounding-box filters on the map
+            models.Index(fields=['latitude', 'longitude'], name='rent_add_ad_lat_lng_idx'),
+            # Keyset pagination: each sortable column plus the id tiebreaker
+            models.Index(fields=['created_at', 'id'], name='rent_add_ad_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='rent_add_ad_price_id_idx'),
+            models.Index(fields=['area', 'id'], name='rent_add_ad_area_id_idx'),
+            models.Index(fields=['bedrooms', 'id'], name='rent_add_ad_bedrooms_id_idx'),
+            models.Index(fields=['views_count', 'id'], name='rent_add_ad_views_id_idx'),
+            # The public list and similar-ads lookups only ever read live ads
+            models.Index(
+                fields=['created_at', 'id'], name='rent_add_ad_live_created_idx',
+                condition=models.Q(status='approved', is_available=True),
+            ),
+            models.Index(
+                fields=['category', 'created_at'], name='rent_add_ad_live_category_idx',
+                condition=models.Q(status='approved', is_available=True),
+            ),
+            models.Index(fields=['owner', 'created_at'], name='rent_add_ad_owner_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.location}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so signal handlers can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    # Only written with explicit update_fields or update()
+    DENORMALIZED_FIELDS = ('views_count', 'rating_sum', 'rating_count', 'favorite_count', 'primary_image')
+
+    def save(self, *args, **kwargs):
+        self.geohash = self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        elif update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # These move with F() updates and the images; an instance loaded earlier mustn't write them back
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def compute_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            return ''
+        return encode_geohash(float(self.latitude), float(self.longitude))
     
-    def increment_views(self):
-        self.views_count += 1
-        self.save(update_fields=['views_count'])
+    def increment_views(self, count=1):
+        # Atomic increment; detail hits go through rent_add.view_counts instead
+        RentAdvertisement.objects.filter(pk=self.pk).update(views_count=F('views_count') + count)
+        self.refresh_from_db(fields=['views_count'])
     
     def is_expired(self):
         # Ads expire after 30 days if not approved or extended
@@ -59,13 +146,33 @@ class RentAdvertisement(models.Model):
 
 class AdvertisementImage(models.Model):
     advertisement = models.ForeignKey(RentAdvertisement, on_delete=models.CASCADE, related_name='images')
+    # Uploads made before the image pipeline; newer ones are in stored_image
     image = CloudinaryField('image', blank=True, null=True)
+    stored_image = models.OneToOneField(
+        'rent_api.StoredImage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
     is_primary = models.BooleanField(default=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['advertisement'], condition=models.Q(is_primary=True), name='rent_add_one_primary_image',
+            ),
+        ]
     
     def __str__(self):
         return f"Image for {self.advertisement.title}"
 
+    def save(self, *args, **kwargs):
+        # The signal handlers demote the old primary image and move the ad's pointer
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            return super().delete(*args, **kwargs)
+
 class RentRequest(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -89,6 +196,10 @@ class RentRequest(models.Model):
     
     class Meta:
         unique_together = ['advertisement', 'user']
+        indexes = [
+            models.Index(fields=['advertisement', 'status'], name='rent_add_request_ad_status_idx'),
+            models.Index(fields=['user', 'created_at'], name='rent_add_request_user_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.advertisement.title}"
@@ -105,6 +216,12 @@ class FavoriteAdvertisement(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.advertisement.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
 class Review(models.Model):
     advertisement = models.ForeignKey(RentAdvertisement, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reviews')
@@ -116,6 +233,73 @@ class Review(models.Model):
     
     class Meta:
         unique_together = ['advertisement', 'user']
+        indexes = [
+            models.Index(fields=['advertisement', 'created_at'], name='rent_add_review_ad_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='rent_add_review_user_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.advertisement.title} - {self.rating} stars"
\ No newline at end of file
+        return f"{self.user.username} - {self.advertisement.title} - {self.rating} stars"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The rating as loaded, so an edit moves the ad's rating_sum by the difference
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class AdvertisementDailyStat(models.Model):
+    """
+    Daily rollup of advertisements by creation date, category, location and
+    current status, kept current by rent_add/statistics.py.
+    """
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    # First part of the ad's location, e.g. "Gulshan" for "Gulshan, Dhaka"
+    location = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=10, choices=RentAdvertisement.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'category', 'location', 'status'], name='rent_add_daily_stat_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'location', 'status'], condition=models.Q(category__isnull=True),
+                name='rent_add_daily_stat_unique_uncategorized',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.location} {self.status}: {self.count}"
+
+
+class SimilarAdvertisement(models.Model):
+    """
+    Precomputed nearest neighbours of an ad, best first, maintained by
+    rent_add/similarity.py.
+    """
+    advertisement = models.ForeignKey(RentAdvertisement, on_delete=models.CASCADE, related_name='similar_advertisements')
+    similar = models.ForeignKey(RentAdvertisement, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['advertisement', 'rank'], name='rent_add_similar_ad_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.advertisement_id} #{self.rank}: {self.similar_id}"
+
+
+class PendingSimilarRefresh(models.Model):
+    """An ad whose similar-ads list waits for a worker (see rent_add/similarity.py)."""
+    # Not a foreign key: an ad deleted while queued just drops out of the lists when refreshed
+    advertisement_id = models.UUIDField(primary_key=True)
+    queued_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.advertisement_id} queued at {self.queued_at}"
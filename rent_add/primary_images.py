@@ -0,0 +1,67 @@
+"""
+RentAdvertisement.primary_image: the image ad lists and rent requests show.
+
+It points at the ad's image marked is_primary, or at its first upload when
+none is. A partial unique constraint allows one is_primary image per ad.
+Saving an image as primary demotes the ad's current one first, under the
+ad's row lock, and saving or deleting an image re-points primary_image; both
+happen in the image's save transaction (rent_add/signals.py).
+uploads.add_images(), which inserts with bulk_create, does the same itself.
+``repair()`` (the repair_primary_images command, and migration 0011) fixes
+ads whose images were written before this or changed with queryset.update().
+"""
+from django.db.models import Count, OuterRef, Subquery
+
+from rent_add.models import AdvertisementImage, RentAdvertisement
+
+# Primary first, then the earliest upload
+IMAGE_ORDER = ('-is_primary', 'uploaded_at', 'id')
+
+
+def lock(advertisement_id):
+    list(RentAdvertisement.objects.select_for_update().filter(pk=advertisement_id).values_list('pk'))
+
+
+def demote_others(image):
+    """Clear is_primary on the ad's other images, before ``image`` is saved as primary."""
+    lock(image.advertisement_id)
+    AdvertisementImage.objects.filter(advertisement_id=image.advertisement_id, is_primary=True).exclude(
+        pk=image.pk
+    ).update(is_primary=False)
+
+
+def refresh(advertisement_ids, advertisement_model=RentAdvertisement, image_model=AdvertisementImage):
+    """Point each ad's primary_image at its primary, or else first, image."""
+    first = image_model.objects.filter(advertisement=OuterRef('pk')).order_by(*IMAGE_ORDER)
+    return advertisement_model.objects.filter(pk__in=advertisement_ids).update(
+        primary_image=Subquery(first.values('pk')[:1])
+    )
+
+
+def repair(advertisement_model=RentAdvertisement, image_model=AdvertisementImage, batch_size=1000):
+    """
+    Leave each ad with at most one is_primary image (its earliest, which is
+    the one lists showed) and refresh every ad's primary_image. Returns the
+    number of images demoted and of ads refreshed.
+    """
+    duplicated = list(
+        image_model.objects.filter(is_primary=True).order_by().values('advertisement_id')
+        .annotate(primaries=Count('pk')).filter(primaries__gt=1).values_list('advertisement_id', flat=True)
+    )
+    demoted = 0
+    for advertisement_id in duplicated:
+        primaries = image_model.objects.filter(advertisement_id=advertisement_id, is_primary=True)
+        keep = primaries.order_by('uploaded_at', 'id').values_list('pk', flat=True).first()
+        demoted += primaries.exclude(pk=keep).update(is_primary=False)
+
+    refreshed = 0
+    last_pk = None
+    while True:
+        batch = advertisement_model.objects.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return demoted, refreshed
+        last_pk = pks[-1]
+        refreshed += refresh(pks, advertisement_model, image_model)
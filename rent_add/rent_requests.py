@@ -0,0 +1,121 @@
+"""
+Accepting and rejecting rent requests.
+
+Every decision runs in a transaction holding a row lock on the request's
+advertisement (SELECT ... FOR UPDATE), and creating a request takes the same
+lock. Decisions and new requests for one ad therefore run one at a time,
+and two owners' tabs racing to accept can never both win. Accepting moves every other pending
+request on the ad to ``rejected`` in one UPDATE, and all the resulting
+notifications are queued with one notify_many() call.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from rent_add.models import RentAdvertisement, RentRequest
+from rent_user import notifications
+
+
+class RentRequestError(Exception):
+    """A decision that can't be applied, e.g. accepting on an already rented ad."""
+
+
+def lock_advertisements(advertisement_ids):
+    """Lock the ads in primary-key order, so overlapping batches can't deadlock."""
+    return {
+        advertisement.pk: advertisement
+        for advertisement in RentAdvertisement.objects.select_for_update().filter(
+            pk__in=set(advertisement_ids)
+        ).order_by('pk')
+    }
+
+
+def accepted_event(rent_request, advertisement):
+    return {
+        'user_id': rent_request.user_id,
+        'notification_type': 'request_accepted',
+        'message': f'Your rent request for "{advertisement.title}" has been accepted.',
+        'related_advertisement_id': advertisement.pk,
+        'related_request_id': rent_request.pk,
+        'dedupe_key': f'request_accepted:{rent_request.pk}',
+    }
+
+
+def rejected_event(rent_request_id, user_id, advertisement):
+    return {
+        'user_id': user_id,
+        'notification_type': 'request_rejected',
+        'message': f'Your rent request for "{advertisement.title}" has been rejected.',
+        'related_advertisement_id': advertisement.pk,
+        'related_request_id': rent_request_id,
+        'dedupe_key': f'request_rejected:{rent_request_id}',
+    }
+
+
+def _accept(rent_request, advertisement):
+    """Apply an acceptance while holding the ad's lock; returns notification events."""
+    if advertisement.status == 'rented' or RentRequest.objects.filter(
+        advertisement=advertisement, status='accepted'
+    ).exists():
+        raise RentRequestError('This advertisement already has an accepted rent request')
+    now = timezone.now()
+    if not RentRequest.objects.filter(pk=rent_request.pk, status='pending').update(status='accepted', updated_at=now):
+        raise RentRequestError('Only pending rent requests can be accepted')
+
+    competing = RentRequest.objects.filter(advertisement=advertisement, status='pending')
+    rejected = list(competing.values_list('pk', 'user_id'))
+    competing.update(status='rejected', updated_at=now)
+
+    advertisement.status = 'rented'
+    advertisement.is_available = False
+    advertisement.save(update_fields=['status', 'is_available', 'updated_at'])
+
+    rent_request.status = 'accepted'
+    return [accepted_event(rent_request, advertisement)] + [
+        rejected_event(rent_request_id, user_id, advertisement) for rent_request_id, user_id in rejected
+    ]
+
+
+def _reject(rent_request, advertisement):
+    if not RentRequest.objects.filter(pk=rent_request.pk, status='pending').update(
+        status='rejected', updated_at=timezone.now()
+    ):
+        raise RentRequestError('Only pending rent requests can be rejected')
+    rent_request.status = 'rejected'
+    return [rejected_event(rent_request.pk, rent_request.user_id, advertisement)]
+
+
+DECISIONS = {'accept': _accept, 'reject': _reject}
+
+
+def decide(rent_request, decision):
+    """Accept or reject one request; raises RentRequestError if it can't be."""
+    with transaction.atomic():
+        advertisement = lock_advertisements([rent_request.advertisement_id])[rent_request.advertisement_id]
+        events = DECISIONS[decision](rent_request, advertisement)
+        notifications.notify_many(events)
+
+
+def decide_many(rent_requests, decisions):
+    """
+    Apply (rent_request_id, 'accept' | 'reject') decisions in order, in one
+    transaction. ``rent_requests`` maps ids to the requests the caller may
+    decide on. Returns one result dict per decision. A failed decision is
+    reported and does not undo the others.
+    """
+    results = []
+    events = []
+    with transaction.atomic():
+        advertisements = lock_advertisements(rent_request.advertisement_id for rent_request in rent_requests.values())
+        for rent_request_id, decision in decisions:
+            rent_request = rent_requests.get(rent_request_id)
+            if rent_request is None:
+                results.append({'id': rent_request_id, 'error': 'Not found.'})
+                continue
+            try:
+                events += DECISIONS[decision](rent_request, advertisements[rent_request.advertisement_id])
+            except RentRequestError as exc:
+                results.append({'id': rent_request_id, 'error': str(exc)})
+            else:
+                results.append({'id': rent_request_id, 'status': rent_request.status})
+        notifications.notify_many(events)
+    return results
@@ -0,0 +1,108 @@
+"""
+Full-text index DDL for advertisements, used by rent_api/search.py.
+
+Neither index is a Django field. PostgreSQL gets a generated tsvector column
+with a GIN index; SQLite gets an external-content FTS5 table keyed on the
+ads table's rowid and kept in sync by triggers. SQLite migrations that
+rebuild the ads table drop those triggers and renumber rowids, in either
+direction, so ``install()`` (idempotent, and a full reindex on SQLite) runs
+after every migrate from a post_migrate receiver once the index's migration
+is applied. A migration that writes to the ads table after rebuilding it
+should still call it first, as should anyone who runs VACUUM (see the
+rebuild_search_index command).
+"""
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+from rent_add.models import RentAdvertisement
+
+# The migration that first installs the index
+MIGRATION = ('rent_add', '0003_advertisement_search')
+
+TABLE = RentAdvertisement._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+
+POSTGRES_INSTALL = [
+    f"""
+    ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    f"CREATE INDEX IF NOT EXISTS rent_add_ad_search_vector_gin ON {TABLE} USING gin (search_vector)",
+]
+
+POSTGRES_REMOVE = [
+    "DROP INDEX IF EXISTS rent_add_ad_search_vector_gin",
+    f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_REMOVE = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+SQLITE_INSTALL = SQLITE_REMOVE + [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, description, location,
+        content='{TABLE}', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, location)
+        VALUES (new.rowid, new.title, new.description, new.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, location)
+        VALUES ('delete', old.rowid, old.title, old.description, old.location);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF title, description, location ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, location)
+        VALUES ('delete', old.rowid, old.title, old.description, old.location);
+        INSERT INTO {FTS_TABLE}(rowid, title, description, location)
+        VALUES (new.rowid, new.title, new.description, new.location);
+    END
+    """,
+    # Index the rows that already exist
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+STATEMENTS = {
+    'postgresql': (POSTGRES_INSTALL, POSTGRES_REMOVE),
+    'sqlite': (SQLITE_INSTALL, SQLITE_REMOVE),
+}
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install(connection):
+    # Other databases use the icontains fallback and need nothing
+    if connection.vendor in STATEMENTS:
+        _execute(connection, STATEMENTS[connection.vendor][0])
+
+
+def remove(connection):
+    if connection.vendor in STATEMENTS:
+        _execute(connection, STATEMENTS[connection.vendor][1])
+
+
+def reinstall_after_migrate(sender, using, **kwargs):
+    connection = connections[using]
+    recorder = MigrationRecorder(connection)
+    if recorder.has_table() and MIGRATION in recorder.applied_migrations():
+        install(connection)
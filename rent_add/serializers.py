@@ -1,4 +1,7 @@
 
+from types import SimpleNamespace
+
+from django.db import transaction
 from rest_framework import serializers
 from users.models import CustomUser
 from rent_user.models import Notification, Message
@@ -6,6 +9,9 @@ from rent_add.models import RentAdvertisement, RentRequest ,AdvertisementImage,
 from rent_type.models import Category, Amenity
 from rent_user.serializers import UserSerializer
 from rent_type.serializers import AmenitySerializer, CategorySerializer
+from rent_api import images
+from rent_api.values import ValuesSerializer
+from rent_add import uploads
 
 
 
@@ -16,12 +22,36 @@ from rent_type.serializers import AmenitySerializer, CategorySerializer
 
 
 class AdvertisementImageSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField()
+    # Uploads go through the image pipeline (rent_api/images.py); reading back,
+    # ``image`` is the largest variant, next to its srcset and blurhash
+    image = serializers.ImageField(write_only=True)
     # image = serializers.ImageField(use_url=True)
     class Meta:
         model = AdvertisementImage
         fields = ['id', 'image', 'is_primary', 'uploaded_at']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.update(images.representation(instance.stored_image, legacy=instance.image))
+        return data
+
+    def create(self, validated_data):
+        validated_data['stored_image'] = images.stage(validated_data.pop('image'))
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if 'image' not in validated_data:
+            return super().update(instance, validated_data)
+        # A replacement goes through the pipeline too, and the old variants are deleted
+        previous = instance.stored_image
+        with transaction.atomic():
+            validated_data['stored_image'] = images.stage(validated_data.pop('image'))
+            validated_data['image'] = None
+            instance = super().update(instance, validated_data)
+            if previous is not None:
+                previous.delete()
+        return instance
+
 class RentAdvertisementListSerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     # primary_image = serializers.SerializerMethodField()
@@ -32,6 +62,7 @@ class RentAdvertisementListSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     review_count = serializers.SerializerMethodField()
+    distance = serializers.SerializerMethodField()
     
     class Meta:
         model = RentAdvertisement
@@ -39,32 +70,38 @@ class RentAdvertisementListSerializer(serializers.ModelSerializer):
             'id', 'title', 'price', 'location', 'area', 
             'bedrooms', 'bathrooms', 'category', 'category_name', 'owner', 
             'status', 'created_at', 'is_available', 'primary_image',
-            'is_favorited', 'average_rating', 'review_count', 'views_count'
+            'is_favorited', 'average_rating', 'review_count', 'views_count',
+            'distance'
         ]
     
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
-        if primary_image:
-            return AdvertisementImageSerializer(primary_image).data
-        first_image = obj.images.first()
-        if first_image:
-            return AdvertisementImageSerializer(first_image).data
-        return None
+        # Kept on the ad by rent_add/primary_images.py; for_listing() joins it in
+        if obj.primary_image_id is None:
+            return None
+        return AdvertisementImageSerializer(obj.primary_image).data
     
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.favorited_by.filter(user=user).exists()
         return False
     
     def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
+        if hasattr(obj, 'average_rating'):
+            return obj.average_rating or 0
+        if obj.rating_count:
+            return obj.rating_sum / obj.rating_count
         return 0
     
     def get_review_count(self, obj):
-        return obj.reviews.count()
+        return obj.rating_count
+
+    def get_distance(self, obj):
+        # Kilometres from the near= point, only set on near= queries
+        distance = getattr(obj, 'distance', None)
+        return round(distance, 3) if distance is not None else None
 
 class RentAdvertisementDetailSerializer(serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
@@ -94,22 +131,22 @@ class RentAdvertisementDetailSerializer(serializers.ModelSerializer):
         return False
     
     def get_average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
+        if hasattr(obj, 'average_rating'):
+            return obj.average_rating or 0
+        if obj.rating_count:
+            return obj.rating_sum / obj.rating_count
         return 0
     
     def get_review_count(self, obj):
-        return obj.reviews.count()
+        return obj.rating_count
     
     def get_similar_ads(self, obj):
-        # Get similar ads based on category and location
+        # Precomputed neighbours from rent_add/similarity.py, best first
         similar_ads = RentAdvertisement.objects.filter(
-            category=obj.category, 
-            location__icontains=obj.location.split(',')[0],  # First part of location
+            similar_to__advertisement=obj,
             status='approved',
             is_available=True
-        ).exclude(id=obj.id)[:4]
+        ).for_listing(self.context['request'].user).order_by('similar_to__rank')[:4]
         return RentAdvertisementListSerializer(similar_ads, many=True, context=self.context).data
 
 class RentAdvertisementCreateSerializer(serializers.ModelSerializer):
@@ -135,20 +172,56 @@ class RentAdvertisementCreateSerializer(serializers.ModelSerializer):
         # Add amenities
         advertisement.amenities.set(amenities_data)
         
-        # Add images
-        for image_data in images_data:
-            AdvertisementImage.objects.create(
-                advertisement=advertisement, 
-                **image_data
-            )
+        # Add images, all in one INSERT
+        primary = next((index for index, image_data in enumerate(images_data) if image_data.get('is_primary')), None)
+        uploads.add_images(advertisement, [image_data['image'] for image_data in images_data], primary)
         
         return advertisement
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField over a small table, read once rather than queried per value."""
+
+    def to_internal_value(self, data):
+        if not hasattr(self, 'instances'):
+            self.instances = {str(instance.pk): instance for instance in self.get_queryset()}
+        try:
+            return self.instances[str(data).strip()]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class OwnerField(serializers.Field):
+    """A user given by email or id, from the ``owners`` map in the context."""
+    default_error_messages = {'does_not_exist': 'No user with email or id "{value}".'}
+
+    def to_internal_value(self, data):
+        owner = self.context['owners'].get(str(data).strip().lower())
+        if owner is None:
+            self.fail('does_not_exist', value=data)
+        return owner
+
+    def to_representation(self, value):
+        return value.email
+
+
+class AdvertisementImportSerializer(RentAdvertisementCreateSerializer):
+    """A row of the import_ads command (rent_add/transfer.py); one instance validates every row."""
+    id = serializers.UUIDField(required=False)
+    owner = OwnerField()
+    category = PreloadedPrimaryKeyRelatedField(queryset=Category.objects.all(), allow_null=True, required=False)
+    amenities = PreloadedPrimaryKeyRelatedField(queryset=Amenity.objects.all(), many=True, required=False)
+
+    class Meta(RentAdvertisementCreateSerializer.Meta):
+        fields = ['id', 'owner'] + [
+            field for field in RentAdvertisementCreateSerializer.Meta.fields if field != 'images'
+        ] + ['status', 'is_available']
+
+
 class RentRequestSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     advertisement_title = serializers.CharField(source='advertisement.title', read_only=True)
-    # advertisement_image = serializers.SerializerMethodField()
-    advertisement_image = serializers.ImageField()
+    advertisement_image = serializers.SerializerMethodField()
+    # advertisement_image = serializers.ImageField()
 
     
     class Meta:
@@ -161,19 +234,22 @@ class RentRequestSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'status']
     
     def get_advertisement_image(self, obj):
-        primary_image = obj.advertisement.images.filter(is_primary=True).first()
-        if primary_image:
-            return AdvertisementImageSerializer(primary_image).data
-        first_image = obj.advertisement.images.first()
-        if first_image:
-            return AdvertisementImageSerializer(first_image).data
-        return None
+        if obj.advertisement.primary_image_id is None:
+            return None
+        return AdvertisementImageSerializer(obj.advertisement.primary_image).data
 
 class RentRequestUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = RentRequest
         fields = ['status', 'message']
 
+class RentRequestDecisionSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    action = serializers.ChoiceField(choices=['accept', 'reject'])
+
+class RentRequestBatchSerializer(serializers.Serializer):
+    decisions = RentRequestDecisionSerializer(many=True, allow_empty=False, max_length=500)
+
 class FavoriteAdvertisementSerializer(serializers.ModelSerializer):
     advertisement = RentAdvertisementListSerializer(read_only=True)
     
@@ -205,4 +281,68 @@ class ReviewSerializer(serializers.ModelSerializer):
                 advertisement=obj.advertisement, 
                 user=request.user
             ).exists()
-        return False
\ No newline at end of file
+        return False
+
+
+# Read-only fast paths for the list endpoints (rent_api/values.py); the JSON
+# is the same as the serializers above.
+
+STORED_IMAGE_COLUMNS = ['status', 'width', 'height', 'blurhash', 'variants']
+
+
+class AdvertisementImageValuesSerializer(ValuesSerializer):
+    serializer_class = AdvertisementImageSerializer
+    columns = ['image', 'stored_image'] + [f'stored_image__{column}' for column in STORED_IMAGE_COLUMNS]
+
+    def represent(self, row):
+        data = super().represent(row)
+        stored_image = None
+        if row[f'{self.prefix}stored_image'] is not None:
+            # images.representation() only reads these attributes
+            stored_image = SimpleNamespace(**{
+                column: row[f'{self.prefix}stored_image__{column}'] for column in STORED_IMAGE_COLUMNS
+            })
+        data.update(images.representation(stored_image, legacy=row[f'{self.prefix}image']))
+        return data
+
+
+class RentAdvertisementListValuesSerializer(ValuesSerializer):
+    """RentAdvertisementListSerializer over rows of a for_listing() queryset."""
+    serializer_class = RentAdvertisementListSerializer
+    nested = {'primary_image': AdvertisementImageValuesSerializer}
+    columns = ['is_favorited', 'average_rating', 'rating_count']
+    optional_columns = ['distance']
+
+    def get_is_favorited(self, row):
+        return row['is_favorited']
+
+    def get_average_rating(self, row):
+        return row['average_rating'] or 0
+
+    def get_review_count(self, row):
+        return row['rating_count']
+
+    def get_distance(self, row):
+        distance = row.get('distance')
+        return round(distance, 3) if distance is not None else None
+
+
+class FavoriteAdvertisementValuesSerializer(ValuesSerializer):
+    serializer_class = FavoriteAdvertisementSerializer
+    columns = ['advertisement']
+
+    def to_representation(self, instance):
+        rows = list(instance) if self.many else [instance]
+        # The ads are one more listing query, as with the Prefetch the view uses
+        advertisements = RentAdvertisement.objects.filter(
+            pk__in={row['advertisement'] for row in rows}
+        ).for_listing(self.context['request'].user)
+        self.advertisements = {
+            advertisement['id']: advertisement for advertisement in RentAdvertisementListValuesSerializer(
+                RentAdvertisementListValuesSerializer.values(advertisements), many=True, context=self.context
+            ).data
+        }
+        return super().to_representation(rows if self.many else instance)
+
+    def get_advertisement(self, row):
+        return self.advertisements.get(str(row['advertisement']))
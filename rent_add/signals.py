@@ -0,0 +1,121 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from rent_add.models import AdvertisementImage, RentAdvertisement, Review, FavoriteAdvertisement
+from rent_add import counters, primary_images, similarity, statistics
+
+
+@receiver(post_save, sender=RentAdvertisement)
+def update_daily_stats_on_save(sender, instance, created, **kwargs):
+    new_values = {field: getattr(instance, field) for field in statistics.KEY_FIELDS}
+    new_key = statistics.advertisement_key(new_values)
+    old_key = None if created else statistics.advertisement_key(getattr(instance, '_loaded_values', {}))
+    if created or (old_key is not None and old_key != new_key):
+        with transaction.atomic():
+            if old_key is not None:
+                statistics.adjust(old_key, -1)
+            statistics.adjust(new_key, 1)
+
+
+@receiver(post_save, sender=RentAdvertisement)
+def refresh_similar_ads_on_save(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if created or any(loaded.get(field) != getattr(instance, field) for field in similarity.FIELDS):
+        similarity.enqueue([instance.pk])
+
+
+@receiver(post_save, sender=RentAdvertisement)
+def remember_saved_values(sender, instance, **kwargs):
+    # Connected after the receivers above, which compare against the old values
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        **{field.attname: getattr(instance, field.attname) for field in sender._meta.concrete_fields},
+    }
+
+
+@receiver(pre_delete, sender=RentAdvertisement)
+def refresh_similar_ads_on_delete(sender, instance, **kwargs):
+    # The rows pointing at this ad cascade away; refill the lists they were in
+    referencing = list(instance.similar_to.values_list('advertisement_id', flat=True))
+    if referencing:
+        similarity.enqueue(referencing)
+
+
+@receiver(m2m_changed, sender=RentAdvertisement.amenities.through)
+def refresh_similar_ads_on_amenities(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        advertisement_ids = list(pk_set) if pk_set else []
+    else:
+        advertisement_ids = [instance.pk]
+    if advertisement_ids:
+        similarity.enqueue(advertisement_ids)
+
+
+@receiver(post_delete, sender=RentAdvertisement)
+def update_daily_stats_on_delete(sender, instance, **kwargs):
+    key = statistics.advertisement_key(getattr(instance, '_loaded_values', {}))
+    if key is None:
+        key = statistics.advertisement_key({field: getattr(instance, field) for field in statistics.KEY_FIELDS})
+    statistics.adjust(key, -1)
+
+
+@receiver(post_save, sender=Review)
+def update_rating_counters_on_save(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    old_advertisement_id, old_rating = loaded.get('advertisement_id'), loaded.get('rating')
+    if created:
+        counters.adjust(instance.advertisement_id, rating_sum=instance.rating, rating_count=1)
+    elif old_advertisement_id is None or old_rating is None:
+        # Saved without being loaded first; reconcile() catches any change
+        pass
+    elif old_advertisement_id != instance.advertisement_id:
+        counters.adjust(old_advertisement_id, rating_sum=-old_rating, rating_count=-1)
+        counters.adjust(instance.advertisement_id, rating_sum=instance.rating, rating_count=1)
+    else:
+        counters.adjust(instance.advertisement_id, rating_sum=instance.rating - old_rating)
+    instance._loaded_values = {**loaded, 'advertisement_id': instance.advertisement_id, 'rating': instance.rating}
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_counters_on_delete(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    counters.adjust(
+        loaded.get('advertisement_id', instance.advertisement_id),
+        rating_sum=-loaded.get('rating', instance.rating),
+        rating_count=-1,
+    )
+
+
+@receiver(post_save, sender=FavoriteAdvertisement)
+def update_favorite_count_on_save(sender, instance, created, **kwargs):
+    old_advertisement_id = getattr(instance, '_loaded_values', {}).get('advertisement_id')
+    if created:
+        counters.adjust(instance.advertisement_id, favorite_count=1)
+    elif old_advertisement_id is not None and old_advertisement_id != instance.advertisement_id:
+        counters.adjust(old_advertisement_id, favorite_count=-1)
+        counters.adjust(instance.advertisement_id, favorite_count=1)
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), 'advertisement_id': instance.advertisement_id}
+
+
+@receiver(post_delete, sender=FavoriteAdvertisement)
+def update_favorite_count_on_delete(sender, instance, **kwargs):
+    counters.adjust(
+        getattr(instance, '_loaded_values', {}).get('advertisement_id', instance.advertisement_id),
+        favorite_count=-1,
+    )
+
+
+@receiver(pre_save, sender=AdvertisementImage)
+def demote_previous_primary_image(sender, instance, **kwargs):
+    # Before the INSERT/UPDATE, or it would trip the one-primary constraint
+    if instance.is_primary:
+        primary_images.demote_others(instance)
+
+
+@receiver(post_save, sender=AdvertisementImage)
+@receiver(post_delete, sender=AdvertisementImage)
+def refresh_primary_image(sender, instance, **kwargs):
+    primary_images.refresh([instance.advertisement_id])
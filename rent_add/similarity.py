@@ -0,0 +1,263 @@
+"""
+Similar-ads index behind the detail endpoint's ``similar_ads``.
+
+Two live ads are compared on category, location words, price (within a
+factor of two), bedrooms and amenities. Only ads sharing a block, that is
+the same category or the same first location part, are compared, and within
+a block only the WINDOW nearest by price on either side. So a rebuild is
+linear in the number of ads rather than quadratic.
+
+The best TOP_K neighbours of each ad are stored as SimilarAdvertisement
+rows. ``rebuild()`` (the rebuild_similar_ads command) recomputes every list.
+``refresh()`` recomputes the lists of a few ads and their neighbours after
+they change. It runs off the request path: rent_add/signals.py calls
+``enqueue()``, which records the ads as PendingSimilarRefresh rows in the
+writer's transaction, and a worker drains them in batches, a background
+thread in each web process woken when that transaction commits or, with
+IN_PROCESS_WORKER off, the refresh_similar_ads command. A claimed batch is
+deleted from the queue before it is refreshed, so an ad changed meanwhile
+is queued again; a worker that dies mid-batch leaves those lists to the
+next change or rebuild. Queuing an ad that is already queued updates its
+row, so the row stays locked until the writer commits and workers skip it
+until then rather than refreshing from the data before the change.
+"""
+import heapq
+import logging
+import math
+import re
+import threading
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from rent_add.models import PendingSimilarRefresh, RentAdvertisement, SimilarAdvertisement
+from rent_add.statistics import location_key
+from rent_api.cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Ads refreshed per claimed batch
+    'BATCH_SIZE': 100,
+    'IN_PROCESS_WORKER': True,
+}
+
+TOP_K = 8
+WINDOW = 50
+WEIGHTS = {'category': 3.0, 'location': 3.0, 'price': 2.0, 'bedrooms': 1.0, 'amenities': 1.0}
+# Fields whose change can move an ad within the index
+FIELDS = ('category_id', 'location', 'price', 'bedrooms', 'status', 'is_available')
+LIVE = {'status': 'approved', 'is_available': True}
+
+_worker_lock = threading.Lock()
+_worker = None
+_wakeup = threading.Event()
+
+Features = namedtuple('Features', 'pk category_id location_key location_words price bedrooms amenities')
+
+
+def get_setting(name):
+    return getattr(settings, 'SIMILAR_ADS', {}).get(name, DEFAULTS[name])
+
+
+def features(pk, category_id, location, price, bedrooms, amenities=()):
+    return Features(
+        pk, category_id, location_key(location), frozenset(re.findall(r'\w+', (location or '').lower())),
+        float(price), bedrooms, frozenset(amenities),
+    )
+
+
+def jaccard(left, right):
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def score(left, right):
+    total = WEIGHTS['location'] * jaccard(left.location_words, right.location_words)
+    total += WEIGHTS['amenities'] * jaccard(left.amenities, right.amenities)
+    total += WEIGHTS['bedrooms'] * max(0.0, 1 - abs(left.bedrooms - right.bedrooms) / 3)
+    if left.category_id is not None and left.category_id == right.category_id:
+        total += WEIGHTS['category']
+    if left.price > 0 and right.price > 0:
+        total += WEIGHTS['price'] * max(0.0, 1 - abs(math.log(left.price / right.price)) / math.log(2))
+    return total
+
+
+def block_keys(ad):
+    if ad.category_id is not None:
+        yield ('category', ad.category_id)
+    if ad.location_key:
+        yield ('location', ad.location_key.lower())
+
+
+def top_neighbours(ad, candidates):
+    # Ties broken on the id so results don't depend on candidate order
+    scored = (
+        (score(ad, candidate), str(candidate.pk), candidate.pk)
+        for candidate in candidates if candidate.pk != ad.pk
+    )
+    return [(pk, value) for value, _, pk in heapq.nlargest(TOP_K, scored)]
+
+
+def load_features(advertisements):
+    """Features of each ad in a queryset, keyed by pk."""
+    rows = list(advertisements.values_list('pk', 'category_id', 'location', 'price', 'bedrooms'))
+    amenities = defaultdict(list)
+    through = advertisements.model.amenities.through
+    for advertisement_id, amenity_id in through.objects.filter(
+        rentadvertisement_id__in=advertisements.values('pk')
+    ).values_list('rentadvertisement_id', 'amenity_id'):
+        amenities[advertisement_id].append(amenity_id)
+    return {row[0]: features(*row, amenities[row[0]]) for row in rows}
+
+
+def similar_rows(similar_model, ad, neighbours):
+    return [
+        similar_model(advertisement_id=ad.pk, similar_id=pk, rank=rank, score=value)
+        for rank, (pk, value) in enumerate(neighbours)
+    ]
+
+
+def rebuild(advertisement_model=RentAdvertisement, similar_model=SimilarAdvertisement, batch_size=5000):
+    """Recompute every ad's neighbours; returns the number of rows written."""
+    corpus = load_features(advertisement_model.objects.filter(**LIVE).order_by())
+    blocks = defaultdict(list)
+    for ad in corpus.values():
+        for key in block_keys(ad):
+            blocks[key].append(ad)
+    positions = {}
+    for key, members in blocks.items():
+        members.sort(key=lambda member: (member.price, str(member.pk)))
+        positions[key] = {member.pk: index for index, member in enumerate(members)}
+
+    written = 0
+    with transaction.atomic():
+        similar_model.objects.all().delete()
+        rows = []
+        for ad in corpus.values():
+            candidates = {}
+            for key in block_keys(ad):
+                index = positions[key][ad.pk]
+                for candidate in blocks[key][max(0, index - WINDOW):index + WINDOW + 1]:
+                    candidates[candidate.pk] = candidate
+            rows.extend(similar_rows(similar_model, ad, top_neighbours(ad, candidates.values())))
+            if len(rows) >= batch_size:
+                written += len(similar_model.objects.bulk_create(rows))
+                rows = []
+        written += len(similar_model.objects.bulk_create(rows))
+    return written
+
+
+def candidates_for(ad):
+    """The WINDOW ads either side by price in each of the ad's blocks."""
+    live = RentAdvertisement.objects.filter(**LIVE).exclude(pk=ad.pk)
+    querysets = []
+    for kind, value in block_keys(ad):
+        if kind == 'category':
+            block = live.filter(category_id=value)
+        else:
+            block = live.filter(location__istartswith=value)
+        querysets.append(block.filter(price__gte=ad.price).order_by('price', 'pk')[:WINDOW])
+        querysets.append(block.filter(price__lt=ad.price).order_by('-price', '-pk')[:WINDOW])
+    pks = set()
+    for queryset in querysets:
+        pks.update(queryset.values_list('pk', flat=True))
+    candidates = load_features(RentAdvertisement.objects.filter(pk__in=pks))
+    # istartswith also matches longer names ("Dhaka" for "Dhakeshwari")
+    keys = set(block_keys(ad))
+    return [candidate for candidate in candidates.values() if keys & set(block_keys(candidate))]
+
+
+def refresh_one(advertisement_id):
+    """Recompute one ad's list; returns the ids whose lists may now be stale."""
+    ads = load_features(RentAdvertisement.objects.filter(pk=advertisement_id, **LIVE))
+    referencing = set(
+        SimilarAdvertisement.objects.filter(similar_id=advertisement_id).values_list('advertisement_id', flat=True)
+    )
+    with transaction.atomic():
+        SimilarAdvertisement.objects.filter(advertisement_id=advertisement_id).delete()
+        if not ads:
+            # No longer live: drop it from other lists too, they get refilled below
+            SimilarAdvertisement.objects.filter(similar_id=advertisement_id).delete()
+            return referencing
+        ad = next(iter(ads.values()))
+        neighbours = top_neighbours(ad, candidates_for(ad))
+        SimilarAdvertisement.objects.bulk_create(similar_rows(SimilarAdvertisement, ad, neighbours))
+    return referencing | {pk for pk, _ in neighbours}
+
+
+def refresh(advertisement_ids):
+    """Recompute the given ads' lists, then those of ads near them."""
+    advertisement_ids = set(advertisement_ids)
+    affected = set()
+    for advertisement_id in advertisement_ids:
+        affected |= refresh_one(advertisement_id)
+    for advertisement_id in affected - advertisement_ids:
+        refresh_one(advertisement_id)
+    # Written with delete() and bulk_create(), which send no signals
+    bump_version(RentAdvertisement)
+
+
+def enqueue(advertisement_ids):
+    """Queue ads for refresh(); a worker picks them up once the current transaction commits."""
+    advertisement_ids = set(advertisement_ids)
+    if not advertisement_ids:
+        return
+    queued_at = timezone.now()
+    PendingSimilarRefresh.objects.bulk_create(
+        [
+            PendingSimilarRefresh(advertisement_id=advertisement_id, queued_at=queued_at)
+            for advertisement_id in advertisement_ids
+        ],
+        update_conflicts=True, unique_fields=['advertisement_id'], update_fields=['queued_at'],
+    )
+    if get_setting('IN_PROCESS_WORKER'):
+        transaction.on_commit(_wake_worker)
+
+
+def claim(batch_size):
+    """Take up to batch_size queued ads off the queue and return their ids."""
+    with transaction.atomic():
+        queued = PendingSimilarRefresh.objects.order_by('queued_at')
+        if connections[queued.db].features.has_select_for_update_skip_locked:
+            # Concurrent workers take different batches
+            queued = queued.select_for_update(skip_locked=True)
+        advertisement_ids = list(queued.values_list('advertisement_id', flat=True)[:batch_size])
+        PendingSimilarRefresh.objects.filter(advertisement_id__in=advertisement_ids).delete()
+    return advertisement_ids
+
+
+def run_once(batch_size=None):
+    """Refresh every queued ad; returns how many were taken off the queue."""
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    refreshed = 0
+    while advertisement_ids := claim(batch_size):
+        refresh(advertisement_ids)
+        refreshed += len(advertisement_ids)
+    return refreshed
+
+
+def _work_forever():
+    while True:
+        _wakeup.wait()
+        _wakeup.clear()
+        try:
+            run_once()
+        except Exception:
+            logger.exception('In-process similar-ads worker failed')
+        finally:
+            # The worker thread has its own connection; don't leave it open between runs
+            connections.close_all()
+
+
+def _wake_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_work_forever, name='similar-ads-worker', daemon=True)
+                _worker.start()
+    _wakeup.set()
@@ -0,0 +1,75 @@
+"""
+Maintenance of the AdvertisementDailyStat rollup.
+
+Every ad contributes 1 to the row for (creation date, category, location,
+status). Signals (rent_add/signals.py) move that 1 between rows as ads are
+created, edited and deleted. ``rebuild()``, run by the
+rebuild_advertisement_stats command, recomputes a date range from the ads
+table. That repairs drift from queryset.update() calls and category deletes.
+"""
+from collections import Counter
+from datetime import datetime, time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from rent_add.models import RentAdvertisement, AdvertisementDailyStat
+
+KEY_FIELDS = ('created_at', 'category_id', 'location', 'status')
+
+
+def location_key(location):
+    return (location or '').split(',')[0].strip()[:100]
+
+
+def stat_key(created_at, category_id, location, status):
+    return (timezone.localdate(created_at), category_id, location_key(location), status)
+
+
+def advertisement_key(values):
+    """Rollup key from a mapping of field values, or None if any is missing."""
+    if not all(field in values for field in KEY_FIELDS):
+        return None
+    return stat_key(*(values[field] for field in KEY_FIELDS))
+
+
+def adjust(key, delta):
+    date, category_id, location, status = key
+    rows = AdvertisementDailyStat.objects.filter(
+        date=date, category_id=category_id, location=location, status=status
+    )
+    if rows.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            AdvertisementDailyStat.objects.create(
+                date=date, category_id=category_id, location=location, status=status, count=delta
+            )
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(count=F('count') + delta)
+
+
+def rebuild(since=None):
+    """Recompute the rollup for ads created on or after ``since`` (all when None)."""
+    advertisements = RentAdvertisement.objects.order_by()
+    stats = AdvertisementDailyStat.objects.all()
+    if since is not None:
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        advertisements = advertisements.filter(created_at__gte=start)
+        stats = stats.filter(date__gte=since)
+
+    counts = Counter(
+        stat_key(*values)
+        for values in advertisements.values_list(*KEY_FIELDS).iterator(chunk_size=5000)
+    )
+    with transaction.atomic():
+        stats.delete()
+        AdvertisementDailyStat.objects.bulk_create([
+            AdvertisementDailyStat(
+                date=date, category_id=category_id, location=location, status=status, count=count
+            )
+            for (date, category_id, location, status), count in counts.items()
+        ], batch_size=1000)
+    return len(counts)
@@ -1,3 +1,930 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock, skipUnless
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from users.models import CustomUser
+from rent_type.models import Amenity, Category
+from rent_add.models import (
+    RentAdvertisement, AdvertisementImage, FavoriteAdvertisement, Review, AdvertisementDailyStat,
+    SimilarAdvertisement, RentRequest, PendingSimilarRefresh,
+)
+from rent_add import counters, primary_images, rent_requests, search_index, similarity, statistics, transfer, view_counts
+from rent_user.models import NotificationJob
 
 # Create your tests here.
+
+
+def clear_caches():
+    for each in caches.all():
+        each.clear()
+
+
+def create_user(email, **extra_fields):
+    return CustomUser.objects.create_user(
+        email=email, password='pass12345', first_name='Test', last_name='User', **extra_fields
+    )
+
+
+def create_advertisement(owner, category=None, **extra_fields):
+    fields = {
+        'title': 'Flat',
+        'description': 'A nice flat',
+        'price': '1000.00',
+        'location': 'Dhaka, Bangladesh',
+        'bedrooms': 2,
+        'bathrooms': 1,
+        'status': 'approved',
+    }
+    fields.update(extra_fields)
+    return RentAdvertisement.objects.create(owner=owner, category=category, **fields)
+
+
+@override_settings(SIMILAR_ADS={'IN_PROCESS_WORKER': False})
+class AdvertisementListQueryCountTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Apartment')
+        self.owner = create_user('owner@example.com')
+        self.viewer = create_user('viewer@example.com')
+
+    def add_advertisements(self, count):
+        # Cached lists are invalidated on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(count):
+                ad = create_advertisement(self.owner, self.category, title=f'Flat {index}')
+                AdvertisementImage.objects.create(advertisement=ad, is_primary=False)
+                AdvertisementImage.objects.create(advertisement=ad, is_primary=True)
+                Review.objects.create(advertisement=ad, user=self.viewer, rating=4)
+                FavoriteAdvertisement.objects.create(advertisement=ad, user=self.viewer)
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/advertisements/', {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.client.force_authenticate(self.viewer)
+        self.add_advertisements(2)
+        small_page_queries, _ = self.count_list_queries()
+        self.add_advertisements(8)
+        large_page_queries, response = self.count_list_queries()
+
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(small_page_queries, large_page_queries)
+
+    def test_annotated_fields_match_related_rows(self):
+        self.client.force_authenticate(self.viewer)
+        self.add_advertisements(1)
+        _, response = self.count_list_queries()
+        item = response.data['results'][0]
+
+        ad = RentAdvertisement.objects.get()
+        primary = ad.images.get(is_primary=True)
+        self.assertEqual(item['primary_image']['id'], primary.id)
+        self.assertTrue(item['is_favorited'])
+        self.assertEqual(item['average_rating'], 4)
+        self.assertEqual(item['review_count'], 1)
+        self.assertEqual(item['category_name'], 'Apartment')
+
+    def test_anonymous_listing_is_not_favorited(self):
+        self.add_advertisements(1)
+        _, response = self.count_list_queries()
+        self.assertFalse(response.data['results'][0]['is_favorited'])
+
+
+@override_settings(VIEW_COUNT_BUFFER={'DEDUPE_WINDOW': 60, 'FLUSH_INTERVAL': 0})
+class BufferedViewCountTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        self.ad = create_advertisement(self.owner)
+        self.url = f'/api/v1/advertisements/{self.ad.pk}/'
+
+    def test_detail_hits_do_not_write_to_the_database(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['views_count'], 1)
+        writes = [q for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(writes, [])
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views_count, 0)
+
+    def test_flush_applies_buffered_hits(self):
+        self.client.get(self.url, REMOTE_ADDR='10.0.0.1')
+        self.client.get(self.url, REMOTE_ADDR='10.0.0.2')
+        self.client.force_authenticate(self.owner)
+        self.client.get(self.url)
+
+        self.assertEqual(view_counts.flush(), 3)
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views_count, 3)
+        self.assertEqual(view_counts.pending_views(self.ad.pk), 0)
+        self.assertEqual(view_counts.flush(), 0)
+
+    def test_evicted_registrations_do_not_stop_flushing(self):
+        self.client.get(self.url, REMOTE_ADDR='10.0.0.1')
+        buffer = view_counts.get_cache()
+        buffer.delete(view_counts._slot_key(buffer.get(f'{view_counts.KEY_PREFIX}:slots')))
+        other = create_advertisement(self.owner)
+        self.client.get(f'/api/v1/advertisements/{other.pk}/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(view_counts.flush(), 1)
+
+        # Once the lost registration expires, the next hit registers the ad again
+        buffer.delete(view_counts._dirty_key(str(self.ad.pk)))
+        self.client.get(self.url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(view_counts.flush(), 2)
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views_count, 2)
+
+    def test_repeated_hits_from_same_viewer_count_once(self):
+        for _ in range(3):
+            self.client.get(self.url, REMOTE_ADDR='10.0.0.1')
+        view_counts.flush()
+        self.ad.refresh_from_db()
+        self.assertEqual(self.ad.views_count, 1)
+
+
+@override_settings(SIMILAR_ADS={'IN_PROCESS_WORKER': False}, VIEW_COUNT_BUFFER={'FLUSH_INTERVAL': 0})
+class AdvertisementResponseCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        self.viewer = create_user('viewer@example.com')
+        self.ad = create_advertisement(self.owner)
+        self.url = '/api/v1/advertisements/'
+
+    def test_repeated_anonymous_list_is_served_from_cache(self):
+        self.client.get(self.url, {'ordering': '-price', 'page': 1})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'page': 1, 'ordering': '-price', 'search': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_conditional_get_returns_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_favorite_flags_are_merged_per_user(self):
+        FavoriteAdvertisement.objects.create(user=self.viewer, advertisement=self.ad)
+        self.client.force_authenticate(self.viewer)
+        self.assertTrue(self.client.get(self.url).data['results'][0]['is_favorited'])
+
+        self.client.force_authenticate(None)
+        self.assertFalse(self.client.get(self.url).data['results'][0]['is_favorited'])
+
+    def test_saving_an_advertisement_invalidates_cached_responses(self):
+        self.client.get(self.url)
+        self.ad.title = 'Renamed flat'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.ad.save()
+            # Not before the write commits
+            self.assertEqual(self.client.get(self.url).data['results'][0]['title'], 'Flat')
+        self.assertTrue(callbacks)
+        self.assertEqual(self.client.get(self.url).data['results'][0]['title'], 'Renamed flat')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(advertisement=self.ad, user=self.viewer, rating=5)
+        self.assertEqual(self.client.get(self.url).data['results'][0]['review_count'], 1)
+
+    def test_amenity_and_owner_changes_invalidate_cached_ads(self):
+        amenity = Amenity.objects.create(name='Lift')
+        self.ad.amenities.add(amenity)
+        detail = f'{self.url}{self.ad.pk}/'
+        self.client.get(detail)
+        with self.captureOnCommitCallbacks(execute=True):
+            amenity.name = 'Elevator'
+            amenity.save()
+        self.assertEqual([item['name'] for item in self.client.get(detail).data['amenities']], ['Elevator'])
+
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.first_name = 'Renamed'
+            self.owner.save()
+        self.assertEqual(self.client.get(self.url).data['results'][0]['owner']['first_name'], 'Renamed')
+
+        # Logging in only touches last_login
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.login(email='owner@example.com', password='pass12345'))
+        self.client.logout()
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+
+@override_settings(SIMILAR_ADS={'IN_PROCESS_WORKER': False})
+class AdvertisementSearchTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        self.in_title = create_advertisement(
+            self.owner, title='Sunny Gulshan apartment', description='Quiet street', location='Dhaka'
+        )
+        self.in_description = create_advertisement(
+            self.owner, title='Family flat', description='Close to Gulshan lake', location='Dhaka'
+        )
+        create_advertisement(self.owner, title='Studio', description='Near the beach', location='Chittagong')
+
+    def search(self, term, **params):
+        response = self.client.get('/api/v1/advertisements/', {'search': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_results_are_sorted_by_relevance(self):
+        self.assertEqual(self.search('gulshan'), [str(self.in_title.pk), str(self.in_description.pk)])
+
+    def test_prefix_and_multiple_terms(self):
+        self.assertEqual(len(self.search('gul')), 2)
+        self.assertEqual(self.search('gulshan lake'), [str(self.in_description.pk)])
+        self.assertEqual(self.search('chitta'), [str(RentAdvertisement.objects.get(title='Studio').pk)])
+
+    def test_explicit_ordering_overrides_relevance(self):
+        self.in_title.price = '5000.00'
+        self.in_title.save()
+        self.assertEqual(
+            self.search('gulshan', ordering='price'), [str(self.in_description.pk), str(self.in_title.pk)]
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        self.in_title.title = 'Banani penthouse'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.in_title.save()
+        self.assertEqual(self.search('banani'), [str(self.in_title.pk)])
+        self.assertEqual(self.search('sunny'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.in_title.delete()
+        self.assertEqual(self.search('banani'), [])
+
+    def test_index_is_reinstalled_after_migrate(self):
+        # What a migration rebuilding the ads table leaves behind on SQLite
+        search_index.remove(connection)
+        emit_post_migrate_signal(verbosity=0, interactive=False, db=connection.alias)
+        self.assertEqual(self.search('gulshan'), [str(self.in_title.pk), str(self.in_description.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_advertisement(self.owner, title='Gulshan duplex', description='Roof', location='Dhaka')
+        self.assertEqual(len(self.search('gulshan')), 3)
+
+    def test_operators_in_user_input_are_ignored(self):
+        self.assertEqual(self.search('"gulshan" OR NOT'), [])
+        self.assertEqual(len(self.search('gulshan*')), 2)
+
+
+class AdvertisementGeoFilterTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        self.gulshan = create_advertisement(self.owner, title='Gulshan', latitude='23.792500', longitude='90.407800')
+        self.dhanmondi = create_advertisement(self.owner, title='Dhanmondi', latitude='23.746100', longitude='90.374200')
+        self.chittagong = create_advertisement(self.owner, title='Chittagong', latitude='22.356900', longitude='91.783200')
+        create_advertisement(self.owner, title='Unknown location')
+
+    def titles(self, **params):
+        response = self.client.get('/api/v1/advertisements/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['title'] for item in response.data['results']]
+
+    def test_geohash_is_maintained_on_save(self):
+        self.assertEqual(self.gulshan.geohash[:5], 'wh0r3')
+        self.gulshan.latitude = None
+        self.gulshan.save(update_fields=['latitude'])
+        self.gulshan.refresh_from_db()
+        self.assertEqual(self.gulshan.geohash, '')
+
+    def test_near_filters_by_radius_and_sorts_by_distance(self):
+        self.assertEqual(self.titles(near='23.7925,90.4078', radius_km=3), ['Gulshan'])
+        self.assertEqual(self.titles(near='23.7600,90.3800', radius_km=10), ['Dhanmondi', 'Gulshan'])
+        self.assertEqual(len(self.titles(near='23.7925,90.4078', radius_km=300)), 3)
+
+        response = self.client.get('/api/v1/advertisements/', {'near': '23.7925,90.4078', 'radius_km': 10})
+        distances = [item['distance'] for item in response.data['results']]
+        self.assertEqual(distances[0], 0)
+        self.assertAlmostEqual(distances[1], 6.1, delta=0.3)
+
+    def test_bbox_filter(self):
+        self.assertEqual(
+            sorted(self.titles(bbox='23.70,90.30,23.80,90.45')), ['Dhanmondi', 'Gulshan']
+        )
+
+    def test_invalid_coordinates_are_rejected(self):
+        response = self.client.get('/api/v1/advertisements/', {'near': 'dhaka'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_clusters_count_ads_per_cell(self):
+        response = self.client.get('/api/v1/advertisements/clusters/', {'precision': 2})
+        self.assertEqual(response.status_code, 200)
+        counts = {cell['cell']: cell['count'] for cell in response.data}
+        self.assertEqual(sum(counts.values()), 3)
+        self.assertEqual(counts['wh'], 2)
+
+
+class AdvertisementStatisticsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = create_user('admin@example.com', is_staff=True)
+        self.client.force_authenticate(self.admin)
+        self.apartment = Category.objects.create(name='Apartment')
+        self.owner = create_user('owner@example.com')
+        self.gulshan = create_advertisement(self.owner, self.apartment, location='Gulshan, Dhaka')
+        create_advertisement(self.owner, self.apartment, location='Gulshan, Dhaka', status='pending')
+        create_advertisement(self.owner, location='Banani, Dhaka', status='rented')
+
+    def rollup(self):
+        return sorted(AdvertisementDailyStat.objects.filter(count__gt=0).values_list(
+            'date', 'category_id', 'location', 'status', 'count'
+        ))
+
+    def test_summary_uses_two_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/statistics/')
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(response.data['all_time'], {
+            'total': 3, 'approved': 1, 'pending': 1, 'rejected': 0, 'rented': 1,
+        })
+        self.assertEqual(response.data['current_month']['total'], 3)
+        self.assertEqual(response.data['popular_categories'][0], {'name': 'Apartment', 'count': 2})
+
+    def test_rollup_follows_changes_and_matches_rebuild(self):
+        self.gulshan.status = 'rented'
+        self.gulshan.category = None
+        self.gulshan.save()
+        RentAdvertisement.objects.filter(status='pending').get().delete()
+
+        incremental = self.rollup()
+        statistics.rebuild()
+        self.assertEqual(incremental, self.rollup())
+        self.assertEqual(sum(row[-1] for row in incremental), 2)
+
+    def test_breakdown_and_timeseries(self):
+        response = self.client.get('/api/v1/statistics/breakdown/', {'by': 'location'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['location'], 'Gulshan')
+        self.assertEqual(response.data[0]['total'], 2)
+        self.assertEqual(response.data[0]['pending'], 1)
+
+        response = self.client.get('/api/v1/statistics/breakdown/', {'by': 'category'})
+        self.assertEqual({row['category']: row['total'] for row in response.data}, {'Apartment': 2, None: 1})
+
+        response = self.client.get('/api/v1/statistics/timeseries/')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['total'], 3)
+        self.assertEqual(response.data[0]['rented'], 1)
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get('/api/v1/statistics/timeseries/', {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AdvertisementKeysetPaginationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        areas = ['50.00', None, '70.00', '50.00', None, '90.00', '60.00']
+        prices = ['1000.00', '2000.00', '1000.00', '3000.00', '2000.00', '1000.00', '500.00']
+        self.ads = [
+            create_advertisement(self.owner, title=f'Flat {index}', area=area, price=price)
+            for index, (area, price) in enumerate(zip(areas, prices))
+        ]
+
+    def walk(self, **params):
+        response = self.client.get('/api/v1/advertisements/', {'cursor': '', 'page_size': 2, **params})
+        pages = []
+        while True:
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            if not response.data['next']:
+                return pages, response
+            response = self.client.get(response.data['next'])
+
+    def expected(self, *ordering):
+        return [str(pk) for pk in RentAdvertisement.objects.order_by(*ordering).values_list('pk', flat=True)]
+
+    def test_walks_every_row_once_in_order(self):
+        pages, _ = self.walk()
+        self.assertEqual(sum(pages, []), self.expected('-created_at', '-id'))
+        self.assertTrue(all(len(page) == 2 for page in pages[:-1]))
+
+    def test_ties_and_nulls_in_ordering_field(self):
+        pages, _ = self.walk(ordering='price')
+        self.assertEqual(sum(pages, []), self.expected('price', 'id'))
+        pages, _ = self.walk(ordering='-area')
+        ids = sum(pages, [])
+        self.assertEqual(len(ids), len(set(ids)), 7)
+        self.assertEqual(ids, [str(pk) for pk in RentAdvertisement.objects.order_by(
+            F('area').desc(nulls_last=True), '-id').values_list('pk', flat=True)])
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get('/api/v1/advertisements/', {'cursor': '', 'page_size': 3, 'ordering': '-area'})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        third = self.client.get(second.data['next'])
+        back = self.client.get(third.data['previous'])
+        self.assertEqual(back.data['results'], second.data['results'])
+        back = self.client.get(back.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/v1/advertisements/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_is_unchanged_and_can_estimate_count(self):
+        response = self.client.get('/api/v1/advertisements/', {'page_size': 5})
+        self.assertEqual(response.data['count'], 7)
+        self.assertNotIn('count_estimated', response.data)
+        response = self.client.get('/api/v1/advertisements/', {'page_size': 5, 'count': 'estimated'})
+        # SQLite has no planner row estimates, so the exact count is used
+        self.assertEqual(response.data['count'], 7)
+        self.assertTrue(response.data['count_estimated'])
+
+    def test_estimated_count_reads_the_postgresql_plan(self):
+        # What QuerySet.explain(format='json') returns on PostgreSQL
+        plan = json.dumps({'Plan': {'Node Type': 'Seq Scan', 'Plan Rows': 4200}})
+        with mock.patch('rent_api.pagination.connections') as connections, \
+                mock.patch('django.db.models.query.QuerySet.explain', return_value=plan):
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            response = self.client.get('/api/v1/advertisements/', {'page_size': 5, 'count': 'estimated'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 4200)
+        self.assertTrue(response.data['count_estimated'])
+
+
+class AdvertisementCounterTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        self.reviewer = create_user('reviewer@example.com')
+        self.other = create_user('other@example.com')
+        self.advertisement = create_advertisement(self.owner, title='Reviewed')
+        self.unreviewed = create_advertisement(self.owner, title='Unreviewed')
+
+    def counters(self, advertisement=None):
+        advertisement = advertisement or self.advertisement
+        advertisement.refresh_from_db()
+        return advertisement.rating_sum, advertisement.rating_count, advertisement.favorite_count
+
+    def test_reviews_move_rating_counters(self):
+        review = Review.objects.create(advertisement=self.advertisement, user=self.reviewer, rating=4)
+        Review.objects.create(advertisement=self.advertisement, user=self.other, rating=5)
+        self.assertEqual(self.counters(), (9, 2, 0))
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 2
+        review.save()
+        self.assertEqual(self.counters(), (7, 2, 0))
+
+        review.delete()
+        self.assertEqual(self.counters(), (5, 1, 0))
+
+    def test_favorites_move_favorite_count(self):
+        favorite = FavoriteAdvertisement.objects.create(user=self.reviewer, advertisement=self.advertisement)
+        FavoriteAdvertisement.objects.create(user=self.other, advertisement=self.advertisement)
+        self.assertEqual(self.counters(), (0, 0, 2))
+        favorite.delete()
+        self.assertEqual(self.counters(), (0, 0, 1))
+
+    def test_reconcile_repairs_drift(self):
+        Review.objects.create(advertisement=self.advertisement, user=self.reviewer, rating=3)
+        FavoriteAdvertisement.objects.create(user=self.reviewer, advertisement=self.advertisement)
+        RentAdvertisement.objects.update(rating_sum=100, rating_count=7, favorite_count=9)
+        self.assertEqual(counters.reconcile(batch_size=1), 2)
+        self.assertEqual(self.counters(), (3, 1, 1))
+        self.assertEqual(self.counters(self.unreviewed), (0, 0, 0))
+        self.assertEqual(counters.reconcile(), 0)
+
+    def test_saving_a_stale_advertisement_keeps_the_counters(self):
+        stale = RentAdvertisement.objects.get(pk=self.advertisement.pk)
+        Review.objects.create(advertisement=self.advertisement, user=self.reviewer, rating=5)
+        FavoriteAdvertisement.objects.create(user=self.reviewer, advertisement=self.advertisement)
+        self.advertisement.increment_views(7)
+
+        stale.title = 'Retitled'
+        stale.save()
+        self.assertEqual(self.counters(), (5, 1, 1))
+        self.assertEqual((self.advertisement.views_count, self.advertisement.title), (7, 'Retitled'))
+
+        # The owner's PATCH saves the instance the view loaded
+        self.client.force_authenticate(self.owner)
+        response = self.client.patch(
+            f'/api/v1/advertisements/{self.advertisement.pk}/', {'title': 'Renamed'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.counters(), (5, 1, 1))
+        self.assertEqual(self.advertisement.views_count, 7)
+
+    def test_average_rating_is_served_from_counters_and_orderable(self):
+        Review.objects.create(advertisement=self.advertisement, user=self.reviewer, rating=4)
+        Review.objects.create(advertisement=self.advertisement, user=self.other, rating=5)
+        response = self.client.get('/api/v1/advertisements/', {'ordering': '-average_rating'})
+        self.assertEqual(
+            [(item['title'], item['average_rating'], item['review_count']) for item in response.data['results']],
+            [('Reviewed', 4.5, 2), ('Unreviewed', 0, 0)],
+        )
+        response = self.client.get(f'/api/v1/advertisements/{self.advertisement.pk}/')
+        self.assertEqual((response.data['average_rating'], response.data['review_count']), (4.5, 2))
+
+
+@override_settings(SIMILAR_ADS={'IN_PROCESS_WORKER': False})
+class SimilarAdvertisementTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        self.flats = Category.objects.create(name='Flat')
+        self.offices = Category.objects.create(name='Office')
+        self.ad = create_advertisement(self.owner, self.flats, title='Ad', location='Gulshan, Dhaka', price='20000')
+        self.close = create_advertisement(self.owner, self.flats, title='Close', location='Gulshan, Dhaka', price='21000')
+        self.far = create_advertisement(self.owner, self.flats, title='Far', location='Uttara, Dhaka', price='90000')
+        self.office = create_advertisement(self.owner, self.offices, title='Office', location='Banani, Dhaka', price='20000')
+        self.rented = create_advertisement(
+            self.owner, self.flats, title='Rented', location='Gulshan, Dhaka', price='20000', status='rented'
+        )
+
+    def neighbours(self, advertisement):
+        return list(SimilarAdvertisement.objects.filter(advertisement=advertisement)
+                    .order_by('rank').values_list('similar__title', flat=True))
+
+    def test_rebuild_ranks_live_ads_sharing_a_block(self):
+        similarity.rebuild()
+        # "Office" shares neither category nor first location part with "Ad"
+        self.assertEqual(self.neighbours(self.ad), ['Close', 'Far'])
+        self.assertEqual(self.neighbours(self.rented), [])
+
+    def test_changes_are_queued_and_refreshed_by_the_worker(self):
+        similarity.rebuild()
+        # rebuild() covered the ads setUp queued
+        PendingSimilarRefresh.objects.all().delete()
+        newcomer = create_advertisement(
+            self.owner, self.flats, title='Newcomer', location='Gulshan, Dhaka', price='20100'
+        )
+        # The write only queues the ad; the lists are refreshed off the request path
+        self.assertTrue(PendingSimilarRefresh.objects.filter(advertisement_id=newcomer.pk).exists())
+        self.assertEqual(self.neighbours(newcomer), [])
+        self.assertEqual(similarity.run_once(), 1)
+        self.assertFalse(PendingSimilarRefresh.objects.exists())
+        self.assertEqual(self.neighbours(newcomer), ['Ad', 'Close', 'Far'])
+        self.assertEqual(self.neighbours(self.ad)[0], 'Newcomer')
+
+        newcomer.status = 'rented'
+        newcomer.save()
+        call_command('refresh_similar_ads', '--once', stdout=io.StringIO())
+        self.assertEqual(self.neighbours(self.ad), ['Close', 'Far'])
+        self.assertEqual(self.neighbours(newcomer), [])
+
+    def test_queuing_a_queued_ad_moves_its_row(self):
+        PendingSimilarRefresh.objects.all().delete()
+        similarity.enqueue([self.ad.pk])
+        first = PendingSimilarRefresh.objects.get().queued_at
+        similarity.enqueue([self.ad.pk, self.close.pk])
+        queued = dict(PendingSimilarRefresh.objects.values_list('advertisement_id', 'queued_at'))
+        self.assertEqual(set(queued), {self.ad.pk, self.close.pk})
+        # An update takes the row lock the writer holds until it commits
+        self.assertGreater(queued[self.ad.pk], first)
+
+    def test_detail_reads_neighbours_in_constant_queries(self):
+        similarity.rebuild()
+        response = self.client.get(f'/api/v1/advertisements/{self.ad.pk}/')
+        self.assertEqual([item['title'] for item in response.data['similar_ads']], ['Close', 'Far'])
+
+        for index in range(6):
+            create_advertisement(self.owner, self.flats, title=f'More {index}', location='Gulshan, Dhaka')
+        similarity.rebuild()
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/v1/advertisements/{self.ad.pk}/')
+        self.assertEqual(len(response.data['similar_ads']), 4)
+        similar_queries = [query for query in queries.captured_queries if 'rent_add_similaradvertisement' in query['sql']]
+        self.assertEqual(len(similar_queries), 1)
+
+
+@override_settings(NOTIFICATION_QUEUE={'IN_PROCESS_WORKER': False})
+class RentRequestDecisionTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        self.advertisement = create_advertisement(self.owner, title='Flat')
+        self.requesters = [create_user(f'requester{index}@example.com') for index in range(3)]
+        self.requests = [
+            RentRequest.objects.create(advertisement=self.advertisement, user=user) for user in self.requesters
+        ]
+        self.client.force_authenticate(self.owner)
+
+    def statuses(self):
+        return [RentRequest.objects.get(pk=rent_request.pk).status for rent_request in self.requests]
+
+    def test_accept_rents_the_ad_and_rejects_competitors(self):
+        response = self.client.post(f'/api/v1/rent-requests/{self.requests[0].pk}/accept/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.statuses(), ['accepted', 'rejected', 'rejected'])
+        self.advertisement.refresh_from_db()
+        self.assertEqual((self.advertisement.status, self.advertisement.is_available), ('rented', False))
+        self.assertEqual(
+            sorted(NotificationJob.objects.values_list('notification_type', 'user_id')),
+            sorted([('request_accepted', self.requesters[0].pk)]
+                   + [('request_rejected', user.pk) for user in self.requesters[1:]]),
+        )
+
+        response = self.client.post(f'/api/v1/rent-requests/{self.requests[1].pk}/accept/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.statuses(), ['accepted', 'rejected', 'rejected'])
+
+    def test_stale_tabs_cannot_accept_twice(self):
+        # The race ConcurrentRentRequestAcceptTests runs with real threads where
+        # there are row locks: every tab loaded its request before anyone decided
+        tabs = [RentRequest.objects.get(pk=rent_request.pk) for rent_request in self.requests]
+        rejecting_tab = RentRequest.objects.get(pk=self.requests[2].pk)
+
+        # Rejected in another tab; still pending in this one, so only the
+        # conditional UPDATE can refuse it
+        rent_requests.decide(rejecting_tab, 'reject')
+        with self.assertRaisesMessage(rent_requests.RentRequestError, 'Only pending rent requests can be accepted'):
+            rent_requests.decide(tabs[2], 'accept')
+        self.advertisement.refresh_from_db()
+        self.assertEqual(self.advertisement.status, 'approved')
+
+        rent_requests.decide(tabs[0], 'accept')
+        for tab in (tabs[1], RentRequest.objects.get(pk=self.requests[0].pk), tabs[0]):
+            with self.assertRaises(rent_requests.RentRequestError):
+                rent_requests.decide(tab, 'accept')
+        self.assertEqual(self.statuses(), ['accepted', 'rejected', 'rejected'])
+        self.assertEqual(RentRequest.objects.filter(status='accepted').count(), 1)
+
+    def test_only_the_ad_owner_can_decide(self):
+        self.client.force_authenticate(self.requesters[1])
+        response = self.client.post(f'/api/v1/rent-requests/{self.requests[0].pk}/accept/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.statuses(), ['pending', 'pending', 'pending'])
+
+    def test_batch_reports_each_decision(self):
+        stranger_ad = create_advertisement(self.requesters[0], title='Not yours')
+        foreign = RentRequest.objects.create(advertisement=stranger_ad, user=self.requesters[1])
+        response = self.client.post('/api/v1/rent-requests/batch/', {'decisions': [
+            {'id': str(self.requests[0].pk), 'action': 'reject'},
+            {'id': str(self.requests[1].pk), 'action': 'accept'},
+            {'id': str(self.requests[2].pk), 'action': 'accept'},
+            {'id': str(foreign.pk), 'action': 'accept'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['results'], [
+            {'id': self.requests[0].pk, 'status': 'rejected'},
+            {'id': self.requests[1].pk, 'status': 'accepted'},
+            {'id': self.requests[2].pk, 'error': 'This advertisement already has an accepted rent request'},
+            {'id': foreign.pk, 'error': 'Not found.'},
+        ])
+        self.assertEqual(self.statuses(), ['rejected', 'accepted', 'rejected'])
+        self.assertEqual(RentRequest.objects.get(pk=foreign.pk).status, 'pending')
+        self.assertEqual(NotificationJob.objects.count(), 3)
+
+
+@skipUnless(connection.features.has_select_for_update, 'needs row locks (SELECT ... FOR UPDATE)')
+@override_settings(NOTIFICATION_QUEUE={'IN_PROCESS_WORKER': False}, SIMILAR_ADS={'IN_PROCESS_WORKER': False})
+class ConcurrentRentRequestAcceptTests(TransactionTestCase):
+    def test_parallel_accepts_rent_the_ad_once(self):
+        owner = create_user('owner@example.com')
+        advertisement = create_advertisement(owner)
+        pending = [
+            RentRequest.objects.create(advertisement=advertisement, user=create_user(f'requester{index}@example.com'))
+            for index in range(8)
+        ]
+        barrier = threading.Barrier(len(pending))
+        outcomes = []
+
+        def accept(rent_request):
+            barrier.wait()
+            try:
+                rent_requests.decide(rent_request, 'accept')
+                outcomes.append('accepted')
+            except rent_requests.RentRequestError:
+                outcomes.append('refused')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=[rent_request]) for rent_request in pending]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(outcomes), ['accepted'] + ['refused'] * 7)
+        self.assertEqual(RentRequest.objects.filter(advertisement=advertisement, status='accepted').count(), 1)
+
+
+def image_upload(name='photo.jpg', size=(400, 300), format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (40, 120, 200)).save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+class AdvertisementImageBatchUploadTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        pipeline = override_settings(
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+                'images': {
+                    'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                    'OPTIONS': {'location': os.path.join(directory, 'images')},
+                },
+            },
+            IMAGE_PIPELINE={'STAGING_DIR': os.path.join(directory, 'staging'), 'IN_PROCESS_WORKER': False},
+        )
+        pipeline.enable()
+        self.addCleanup(pipeline.disable)
+        self.client = APIClient()
+        self.owner = create_user('owner@example.com')
+        self.advertisement = create_advertisement(self.owner)
+        self.url = f'/api/v1/advertisements/{self.advertisement.pk}/images/batch/'
+
+    def upload(self, files, **data):
+        return self.client.post(self.url, {'images': files, **data}, format='multipart')
+
+    def test_batch_is_inserted_at_once_and_reports_bad_files(self):
+        existing = AdvertisementImage.objects.create(advertisement=self.advertisement, is_primary=True)
+        self.client.force_authenticate(self.owner)
+        files = [image_upload('a.jpg'), image_upload('b.png', format='PNG'), SimpleUploadedFile('c.jpg', b'text')]
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.upload(files, primary=1)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([image['status'] for image in response.data['images']], ['pending', 'pending'])
+        self.assertEqual([(error['index'], error['name']) for error in response.data['errors']], [(2, 'c.jpg')])
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+
+        primary = AdvertisementImage.objects.get(advertisement=self.advertisement, is_primary=True)
+        self.assertEqual(primary.pk, response.data['images'][1]['id'])
+        existing.refresh_from_db()
+        self.assertFalse(existing.is_primary)
+
+    def test_first_image_becomes_primary_when_there_is_none(self):
+        self.client.force_authenticate(self.owner)
+        response = self.upload([image_upload(), image_upload()])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([image['is_primary'] for image in response.data['images']], [True, False])
+
+    def test_nothing_usable_is_a_bad_request(self):
+        self.client.force_authenticate(self.owner)
+        response = self.upload([SimpleUploadedFile('notes.txt', b'text')])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AdvertisementImage.objects.exists())
+
+    def test_only_the_owner_can_upload(self):
+        self.client.force_authenticate(create_user('someone@example.com'))
+        response = self.upload([image_upload()])
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(AdvertisementImage.objects.exists())
+
+
+class PrimaryImageTests(TestCase):
+    def setUp(self):
+        self.owner = create_user('owner@example.com')
+        self.advertisement = create_advertisement(self.owner)
+
+    def primary_image_id(self):
+        return RentAdvertisement.objects.values_list('primary_image', flat=True).get(pk=self.advertisement.pk)
+
+    def test_pointer_follows_saves_and_deletes(self):
+        first = AdvertisementImage.objects.create(advertisement=self.advertisement)
+        self.assertEqual(self.primary_image_id(), first.pk)
+
+        second = AdvertisementImage.objects.create(advertisement=self.advertisement, is_primary=True)
+        third = AdvertisementImage.objects.create(advertisement=self.advertisement, is_primary=True)
+        self.assertEqual(self.primary_image_id(), third.pk)
+        self.assertEqual(list(self.advertisement.images.filter(is_primary=True)), [third])
+
+        third.delete()
+        self.assertEqual(self.primary_image_id(), first.pk)
+        second.delete()
+        first.delete()
+        self.assertIsNone(self.primary_image_id())
+
+    def test_one_primary_image_per_advertisement(self):
+        AdvertisementImage.objects.create(advertisement=self.advertisement, is_primary=True)
+        other = AdvertisementImage.objects.create(advertisement=self.advertisement)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AdvertisementImage.objects.filter(pk=other.pk).update(is_primary=True)
+
+    def test_saving_a_stale_advertisement_keeps_the_pointer(self):
+        stale = RentAdvertisement.objects.get(pk=self.advertisement.pk)
+        image = AdvertisementImage.objects.create(advertisement=self.advertisement)
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.primary_image_id(), image.pk)
+
+    def test_repair(self):
+        image = AdvertisementImage.objects.create(advertisement=self.advertisement, is_primary=True)
+        RentAdvertisement.objects.update(primary_image=None)
+        self.assertEqual(primary_images.repair(), (0, 1))
+        self.assertEqual(self.primary_image_id(), image.pk)
+
+    def test_rent_request_list_reads_the_pointer(self):
+        client = APIClient()
+        renter = create_user('renter@example.com')
+        client.force_authenticate(renter)
+
+        def add_requests(count):
+            for _ in range(count):
+                advertisement = create_advertisement(self.owner)
+                AdvertisementImage.objects.create(advertisement=advertisement, is_primary=True)
+                RentRequest.objects.create(advertisement=advertisement, user=renter)
+
+        def list_requests():
+            with CaptureQueriesContext(connection) as context:
+                response = client.get('/api/v1/rent-requests/')
+            self.assertEqual(response.status_code, 200)
+            return len(context.captured_queries), response.data
+
+        add_requests(1)
+        few_queries, _ = list_requests()
+        add_requests(4)
+        many_queries, results = list_requests()
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(item['advertisement_image']['is_primary'] for item in results))
+
+
+class AdvertisementImportExportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.owner = create_user('owner@example.com')
+        self.category = Category.objects.create(name='Flat')
+        self.amenities = [Amenity.objects.create(name='Lift'), Amenity.objects.create(name='Parking')]
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def export(self, name, format):
+        with open(self.path(name), 'w', newline='') as stream:
+            return transfer.write_rows(stream, transfer.export_rows(RentAdvertisement.objects.all()), format)
+
+    def import_ads(self, name, *args):
+        call_command('import_ads', self.path(name), *args, stdout=io.StringIO())
+
+    def test_round_trip(self):
+        for format in ('csv', 'jsonl'):
+            with self.subTest(format=format):
+                advertisement = create_advertisement(self.owner, category=self.category, latitude='23.810000')
+                advertisement.amenities.set(self.amenities)
+                self.assertEqual(self.export(f'ads.{format}', format), 1)
+                RentAdvertisement.objects.all().delete()
+
+                self.import_ads(f'ads.{format}')
+
+                imported = RentAdvertisement.objects.get()
+                self.assertEqual(imported.pk, advertisement.pk)
+                self.assertEqual((imported.owner, imported.category), (self.owner, self.category))
+                self.assertEqual(set(imported.amenities.all()), set(self.amenities))
+                self.assertEqual(imported.geohash, advertisement.geohash)
+                imported.delete()
+
+    def test_rejected_rows_are_reported_and_reruns_add_nothing(self):
+        rows = [
+            {'owner': 'owner@example.com', 'title': 'Flat', 'description': 'Nice', 'price': '900.00',
+             'location': 'Dhaka', 'bedrooms': 1, 'bathrooms': 1, 'amenities': [self.amenities[0].pk]},
+            {'owner': 'nobody@example.com', 'title': 'Flat', 'description': 'Nice', 'price': '900.00',
+             'location': 'Dhaka', 'bedrooms': 1, 'bathrooms': 1},
+        ]
+        with open(self.path('ads.jsonl'), 'w') as stream:
+            stream.writelines(json.dumps(row) + '\n' for row in rows)
+            stream.write('{not json\n')
+
+        self.import_ads('ads.jsonl', '--batch-size', '2')
+        self.import_ads('ads.jsonl')
+        self.import_ads('ads.jsonl', '--resume')
+
+        advertisement = RentAdvertisement.objects.get()
+        self.assertEqual(list(advertisement.amenities.all()), [self.amenities[0]])
+        with open(self.path('ads.jsonl.rejected.jsonl')) as rejects:
+            rejected = [json.loads(line) for line in rejects]
+        self.assertEqual([rejection['row'] for rejection in rejected], [2, 3])
+        self.assertIn('owner', rejected[0]['errors'])
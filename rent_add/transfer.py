@@ -0,0 +1,207 @@
+"""
+Streaming import and export of advertisements (import_ads / export_ads).
+
+Files are CSV or JSON Lines, read and written a row at a time, so memory
+stays flat however large they are. In CSV, ``amenities`` holds amenity ids
+separated by ``;``, empty cells count as missing, and text that a
+spreadsheet would read as a formula (a phone number like +8801..., say) is
+written behind a ``'``, which reading takes off again.
+
+An import validates each row with one AdvertisementImportSerializer, which
+reads categories and amenities once and looks owners up once per batch.
+Valid rows are written per batch in one transaction: a bulk_create for the
+ads, one for their amenity links, and one statistics update per rollup key.
+Rows without an ``id`` get one derived from the source name and row number,
+and ids already in the table are skipped, so running an import again never
+duplicates ads. The command also records each committed batch in a
+checkpoint file, and --resume skips the rows it covers.
+
+An export walks the table with iterator(chunk_size=...) and reads the
+amenity links a chunk at a time.
+"""
+import csv
+import json
+import uuid
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from rent_add import similarity, statistics
+from rent_add.models import RentAdvertisement
+from rent_add.serializers import AdvertisementImportSerializer
+from users.models import CustomUser
+
+FIELDS = [
+    'id', 'owner', 'title', 'description', 'price', 'location', 'latitude', 'longitude', 'area',
+    'bedrooms', 'bathrooms', 'category', 'amenities', 'available_from', 'minimum_lease', 'deposit',
+    'contact_phone', 'contact_email', 'status', 'is_available',
+]
+AMENITY_SEPARATOR = ';'
+# CSV cells starting with these are written behind a '
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Ids of rows imported without one are uuid5(IMPORT_NAMESPACE, '<source>:<row number>')
+IMPORT_NAMESPACE = uuid.UUID('7d1c2f0e-5b8a-4c1e-9f3d-2a6b8e4c0d15')
+
+
+def detect_format(path):
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def quote_formula(value):
+    """Text a spreadsheet would run as a formula, such as =HYPERLINK(...), behind a '."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def unquote_formula(value):
+    if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def read_rows(stream, format):
+    """(row number, row) pairs; a row that can't be parsed is given as the ValueError."""
+    if format == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), 1):
+            row = {
+                field: unquote_formula(value) for field, value in row.items() if field and value not in ('', None)
+            }
+            if 'amenities' in row:
+                row['amenities'] = [part for part in row['amenities'].split(AMENITY_SEPARATOR) if part.strip()]
+            yield number, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+
+
+def row_id(source, number):
+    return uuid.uuid5(IMPORT_NAMESPACE, f'{source}:{number}')
+
+
+def load_owners(values):
+    """{lowercased email or str(id): user} for the owners a batch names."""
+    emails, ids = set(), set()
+    for value in values:
+        value = str(value).strip()
+        try:
+            ids.add(uuid.UUID(value))
+        except ValueError:
+            emails.add(value.lower())
+    owners = {}
+    if emails or ids:
+        for user in CustomUser.objects.filter(Q(email__in=emails) | Q(pk__in=ids)).only('pk', 'email'):
+            owners[user.email.lower()] = owners[str(user.pk)] = user
+    return owners
+
+
+def new_serializer():
+    return AdvertisementImportSerializer(context={'owners': {}})
+
+
+def import_batch(serializer, batch, source):
+    """
+    Validate and write one batch of (row number, row) pairs. Returns the
+    number of ads created, the number skipped as already imported, and the
+    rejected rows as [{'row', 'errors'}].
+    """
+    serializer.context['owners'] = load_owners(
+        row['owner'] for _, row in batch if isinstance(row, dict) and row.get('owner')
+    )
+    valid, rejected, seen = [], [], set()
+    for number, row in batch:
+        if isinstance(row, ValueError):
+            rejected.append({'row': number, 'errors': {'non_field_errors': [f'Invalid JSON: {row}']}})
+            continue
+        try:
+            data = serializer.run_validation(row)
+        except serializers.ValidationError as exc:
+            rejected.append({'row': number, 'errors': exc.detail})
+            continue
+        data['id'] = data.get('id') or row_id(source, number)
+        if data['id'] in seen:
+            rejected.append({'row': number, 'errors': {'id': ['Repeats an earlier row.']}})
+            continue
+        seen.add(data['id'])
+        valid.append(data)
+
+    with transaction.atomic():
+        existing = set(RentAdvertisement.objects.filter(pk__in=seen).values_list('pk', flat=True))
+        advertisements, links = [], []
+        for data in valid:
+            if data['id'] in existing:
+                continue
+            amenities = data.pop('amenities', [])
+            advertisement = RentAdvertisement(**data)
+            # save() isn't called, so derive what it would
+            advertisement.geohash = advertisement.compute_geohash()
+            advertisements.append(advertisement)
+            links += [(advertisement.pk, amenity.pk) for amenity in amenities]
+        RentAdvertisement.objects.bulk_create(advertisements)
+        through = RentAdvertisement.amenities.through
+        through.objects.bulk_create([
+            through(rentadvertisement_id=advertisement_id, amenity_id=amenity_id)
+            for advertisement_id, amenity_id in links
+        ])
+        rollup = Counter(
+            statistics.stat_key(ad.created_at, ad.category_id, ad.location, ad.status) for ad in advertisements
+        )
+        for key, count in rollup.items():
+            statistics.adjust(key, count)
+    return len(advertisements), len(existing), rejected
+
+
+def finish_import():
+    """What bulk_create skipped for the whole import: the similar-ads lists."""
+    similarity.rebuild()
+
+
+def export_rows(queryset, chunk_size=2000):
+    """A dict of FIELDS for each ad in the queryset, in primary key order."""
+    value_fields = [field for field in FIELDS if field not in ('owner', 'amenities')]
+    rows = queryset.order_by('pk').values(*value_fields, 'owner__email').iterator(chunk_size=chunk_size)
+    through = RentAdvertisement.amenities.through
+    for chunk in batched(rows, chunk_size):
+        amenities = defaultdict(list)
+        for advertisement_id, amenity_id in through.objects.filter(
+            rentadvertisement_id__in=[row['id'] for row in chunk]
+        ).order_by('amenity_id').values_list('rentadvertisement_id', 'amenity_id'):
+            amenities[advertisement_id].append(amenity_id)
+        for row in chunk:
+            row['owner'] = row.pop('owner__email')
+            row['amenities'] = amenities[row['id']]
+            yield {field: row[field] for field in FIELDS}
+
+
+def write_rows(stream, rows, format):
+    """Write rows to a text stream; returns how many."""
+    written = 0
+    if format == 'csv':
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                **{field: quote_formula(value) for field, value in row.items()},
+                'amenities': AMENITY_SEPARATOR.join(str(pk) for pk in row['amenities']),
+            })
+            written += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            written += 1
+    return written
@@ -0,0 +1,61 @@
+"""
+Adding several images to an advertisement at once.
+
+Each file is checked on its own, so one that isn't an image is reported by
+its index and the rest still go in. The good ones are staged for the image
+pipeline (rent_api/images.py) and inserted with one bulk_create, in a
+transaction that holds the advertisement's row lock while it decides which
+image is primary, so two batches for the same ad can't both set one.
+Resizing and uploading the variants then happens in the pipeline's bounded
+worker pool, outside the request.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.fields import get_error_detail
+
+from rent_add import primary_images
+from rent_add.models import AdvertisementImage, RentAdvertisement
+from rent_api import images
+from rent_api.cache import bump_version
+
+# Files accepted per request
+MAX_FILES = 30
+
+
+def validate(files):
+    """Split uploads into [(index, file)] of images and a list of per-file errors."""
+    field = serializers.ImageField()
+    valid, errors = [], []
+    for index, upload in enumerate(files):
+        try:
+            valid.append((index, field.run_validation(upload)))
+        except (serializers.ValidationError, DjangoValidationError) as exc:
+            detail = exc.detail if isinstance(exc, serializers.ValidationError) else get_error_detail(exc)
+            errors.append({'index': index, 'name': getattr(upload, 'name', ''), 'errors': detail})
+    return valid, errors
+
+
+def add_images(advertisement, uploads, primary=None):
+    """
+    Attach uploads to the ad and return the new AdvertisementImages.
+    ``primary`` is the position in ``uploads`` of the image to make primary;
+    without one, the first upload is made primary if the ad has none yet.
+    """
+    if not uploads:
+        return []
+    with transaction.atomic():
+        primary_images.lock(advertisement.pk)
+        current = AdvertisementImage.objects.filter(advertisement=advertisement, is_primary=True)
+        if primary is not None:
+            current.update(is_primary=False)
+        elif not current.exists():
+            primary = 0
+        created = AdvertisementImage.objects.bulk_create([
+            AdvertisementImage(advertisement=advertisement, stored_image=stored, is_primary=index == primary)
+            for index, stored in enumerate(images.stage_many(uploads))
+        ])
+        primary_images.refresh([advertisement.pk])
+    # bulk_create and update() send no signals, for the response cache or anyone else
+    bump_version(RentAdvertisement)
+    return created
@@ -0,0 +1,195 @@
+"""
+Write-behind buffer for advertisement view counts.
+
+Detail hits are collected in the Django cache and flushed in bulk as
+``F('views_count') + n`` updates, so a GET never writes to the database.
+With the default local-memory cache the buffer is per process and is
+flushed by a background timer; with a shared cache (Redis, Memcached) the
+``flush_view_counts`` management command can flush it from anywhere.
+
+An ad with buffered hits is registered once under a numbered slot, and a
+flush drains the slots since the last one. Cache entries can be evicted,
+so a flush moves past slots it can't find, and registrations expire after
+REGISTRATION_TIMEOUT: an ad whose slot was lost registers again on its
+next hit instead of never being flushed.
+"""
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from django.db.models import F
+
+from rent_add.models import RentAdvertisement
+from rent_api.cache import bump_version
+
+KEY_PREFIX = 'ad-views'
+
+DEFAULTS = {
+    'CACHE': 'default',
+    # Seconds during which repeated hits by the same user/IP count once (0 disables)
+    'DEDUPE_WINDOW': 30 * 60,
+    # Seconds between background flushes in this process (0 disables the timer)
+    'FLUSH_INTERVAL': 30,
+    # Seconds an ad stays registered for a flush; longer than the flush interval
+    'REGISTRATION_TIMEOUT': 10 * 60,
+}
+
+_timer_lock = threading.Lock()
+_timer = None
+
+
+def get_setting(name):
+    return getattr(settings, 'VIEW_COUNT_BUFFER', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting('CACHE')]
+
+
+def _count_key(advertisement_id):
+    return f'{KEY_PREFIX}:count:{advertisement_id}'
+
+
+def _dirty_key(advertisement_id):
+    return f'{KEY_PREFIX}:dirty:{advertisement_id}'
+
+
+def _slot_key(slot):
+    return f'{KEY_PREFIX}:slot:{slot}'
+
+
+def _incr(cache, key, delta=1):
+    # incr() fails on missing keys, so seed the key first
+    cache.add(key, 0, None)
+    return cache.incr(key, delta)
+
+
+def _register(cache, advertisement_id):
+    # Once per ad until flushed; flush() clears the marker before draining,
+    # so hits that arrive during a flush register it again
+    timeout = get_setting('REGISTRATION_TIMEOUT')
+    if cache.add(_dirty_key(advertisement_id), 1, timeout):
+        slot = _incr(cache, f'{KEY_PREFIX}:slots')
+        cache.set(_slot_key(slot), str(advertisement_id), timeout)
+
+
+def get_viewer_key(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded_for:
+        return f"ip:{forwarded_for.split(',')[0].strip()}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def record_view(advertisement_id, request=None):
+    """Buffer one view of an advertisement. Returns False for deduplicated hits."""
+    cache = get_cache()
+    window = get_setting('DEDUPE_WINDOW')
+    if request is not None and window:
+        seen_key = f'{KEY_PREFIX}:seen:{advertisement_id}:{get_viewer_key(request)}'
+        if not cache.add(seen_key, 1, window):
+            return False
+
+    _incr(cache, _count_key(advertisement_id))
+    _register(cache, advertisement_id)
+
+    _ensure_flush_timer()
+    return True
+
+
+def pending_views(advertisement_id):
+    """Views buffered for an advertisement that have not been flushed yet."""
+    return get_cache().get(_count_key(advertisement_id), 0)
+
+
+def flush():
+    """Write buffered views to the database. Returns the number of views flushed."""
+    cache = get_cache()
+    lock_key = f'{KEY_PREFIX}:flush-lock'
+    if not cache.add(lock_key, 1, 60):
+        return 0
+
+    try:
+        flushed_slot = cache.get(f'{KEY_PREFIX}:flushed', 0)
+        last_slot = cache.get(f'{KEY_PREFIX}:slots', 0)
+        if last_slot < flushed_slot:
+            # The slot counter was evicted and numbering started again
+            flushed_slot = 0
+        slots = list(range(flushed_slot + 1, last_slot + 1))
+        registered = cache.get_many([_slot_key(slot) for slot in slots])
+
+        # A missing slot was evicted, expired or is still being written; its
+        # ad registers again once its marker expires, so don't wait for it
+        advertisement_ids = [registered[key] for key in map(_slot_key, slots) if key in registered]
+        flushed_slot = last_slot
+
+        drained = {}
+        for advertisement_id in set(advertisement_ids):
+            cache.delete(_dirty_key(advertisement_id))
+            count = cache.get(_count_key(advertisement_id), 0)
+            if count:
+                # decr() keeps hits that arrive between get() and here
+                cache.decr(_count_key(advertisement_id), count)
+                drained[advertisement_id] = count
+
+        try:
+            _apply(drained)
+        except Exception:
+            for advertisement_id, count in drained.items():
+                _incr(cache, _count_key(advertisement_id), count)
+                _register(cache, advertisement_id)
+            raise
+        finally:
+            cache.delete_many([_slot_key(slot) for slot in slots])
+            cache.set(f'{KEY_PREFIX}:flushed', flushed_slot, None)
+    finally:
+        cache.delete(lock_key)
+
+    return sum(drained.values())
+
+
+def _apply(drained):
+    # One UPDATE per distinct increment instead of one per advertisement
+    by_count = defaultdict(list)
+    for advertisement_id, count in drained.items():
+        by_count[count].append(advertisement_id)
+
+    with transaction.atomic():
+        for count, advertisement_ids in by_count.items():
+            RentAdvertisement.objects.filter(pk__in=advertisement_ids).update(
+                views_count=F('views_count') + count
+            )
+
+    if drained:
+        # update() skips post_save, so invalidate cached ad responses here
+        bump_version(RentAdvertisement)
+
+
+def _flush_periodically(interval):
+    global _timer
+    try:
+        flush()
+    finally:
+        # The timer thread has its own connection; don't leave it open between runs
+        connections.close_all()
+        with _timer_lock:
+            _timer = threading.Timer(interval, _flush_periodically, args=[interval])
+            _timer.daemon = True
+            _timer.start()
+
+
+def _ensure_flush_timer():
+    global _timer
+    interval = get_setting('FLUSH_INTERVAL')
+    if not interval or _timer is not None:
+        return
+    with _timer_lock:
+        if _timer is None:
+            _timer = threading.Timer(interval, _flush_periodically, args=[interval])
+            _timer.daemon = True
+            _timer.start()
+            atexit.register(flush)
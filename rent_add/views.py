@@ -1,35 +1,41 @@
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework import generics, status, filters, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Avg, F
+from django.db.models import Q, Count, Avg, F, Prefetch, Sum
+from django.db.models.functions import Coalesce, Substr
+from django.utils.dateparse import parse_date
 from django.utils import timezone
 from datetime import timedelta
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+import uuid
 from rent_api.permissions import IsOwnerOrAdmin
+from rent_add import geohash, rent_requests, uploads, view_counts
+from rent_user import notifications
 
 #import model from other apps
 
 from rent_add.models import (
     RentAdvertisement, 
-    RentRequest, FavoriteAdvertisement, Review,AdvertisementImage
+    RentRequest, FavoriteAdvertisement, Review,AdvertisementImage, AdvertisementDailyStat
 )
 
 from rent_type.models import (
-    Category
+    Category, Amenity
     
 )
-
-from rent_user.models import (
-     Notification
-)
+from users.models import CustomUser
 
 from rent_add.serializers import (
      RentAdvertisementListSerializer, RentRequestUpdateSerializer,
     FavoriteAdvertisementCreateSerializer,FavoriteAdvertisementSerializer,AdvertisementImageSerializer,
-    ReviewSerializer,RentAdvertisementCreateSerializer,RentAdvertisementDetailSerializer,RentRequestSerializer )
+    ReviewSerializer,RentAdvertisementCreateSerializer,RentAdvertisementDetailSerializer,RentRequestSerializer,
+    RentRequestBatchSerializer, RentAdvertisementListValuesSerializer, FavoriteAdvertisementValuesSerializer )
 # from rent_type.serializers import CategorySerializer, AmenitySerializer
 # from rent_user.serializers import( UserSerializer, NotificationSerializer,
 # MessageSerializer, MessageCreateSerializer,RentRequestSerializer )  
@@ -37,17 +43,38 @@ from rent_add.serializers import (
 
 
 from rent_api.permissions import IsOwnerOrReadOnly, IsAdvertisementOwner
-from rent_api.filters import RentAdvertisementFilter
-from rent_api.pagination import CustomPagination
+from rent_api.filters import RentAdvertisementFilter, RelevanceOrderingFilter
+from rent_api.search import AdvertisementSearchFilter
+from rent_api.pagination import KeysetPagination
+from rent_api.cache import CachedResponseMixin
+from rent_api.performance import PerformanceMixin
+from rent_api.values import ValuesListMixin
+
 
+def _collect_favoritable(data, found):
+    # Every serialized ad in a response carries 'id' and 'is_favorited'
+    if isinstance(data, dict):
+        if 'is_favorited' in data and 'id' in data:
+            found.append(data)
+        for value in data.values():
+            _collect_favoritable(value, found)
+    elif isinstance(data, list):
+        for value in data:
+            _collect_favoritable(value, found)
+    return found
 
-class RentAdvertisementViewSet(viewsets.ModelViewSet):
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+
+class RentAdvertisementViewSet(PerformanceMixin, CachedResponseMixin, ValuesListMixin, viewsets.ModelViewSet):
+    filter_backends = [DjangoFilterBackend, AdvertisementSearchFilter, RelevanceOrderingFilter]
     filterset_class = RentAdvertisementFilter
     search_fields = ['title', 'description', 'location']
-    ordering_fields = ['price', 'created_at', 'area', 'bedrooms', 'views_count']
+    ordering_fields = ['price', 'created_at', 'area', 'bedrooms', 'views_count', 'distance', 'average_rating']
     ordering = ['-created_at']
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
+    values_serializer_class = RentAdvertisementListValuesSerializer
+    # Ads show their category, amenities and owner
+    cache_models = (RentAdvertisement, Category, Amenity, CustomUser)
+    cache_varies_on_staff = True
     
     def get_queryset(self):
         if self.request.user.is_staff:
@@ -59,7 +86,12 @@ class RentAdvertisementViewSet(viewsets.ModelViewSet):
         
         # For detail view, we want to include all ads (permissions handled elsewhere)
         if self.action == 'retrieve':
-            return RentAdvertisement.objects.all()
+            return RentAdvertisement.objects.prefetch_related(
+                Prefetch('images', queryset=AdvertisementImage.objects.select_related('stored_image'))
+            )
+
+        if self.action == 'list':
+            return queryset.for_listing(self.request.user)
             
         return queryset
     
@@ -90,17 +122,64 @@ class RentAdvertisementViewSet(viewsets.ModelViewSet):
         serializer.save(owner=self.request.user)
     
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        instance.increment_views()
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            # Buffered and flushed in bulk, so detail GETs never write to the database
+            advertisement_id = str(uuid.UUID(str(kwargs['pk'])))
+            view_counts.record_view(advertisement_id, request)
+            if response.status_code == status.HTTP_200_OK:
+                response.data['views_count'] += view_counts.pending_views(advertisement_id)
+        return response
+
+    def personalize_cached_data(self, request, data):
+        # Cached bodies are shared by all users, so favorite flags are merged in here
+        advertisements = _collect_favoritable(data, [])
+        favorited = set()
+        if request.user.is_authenticated and advertisements:
+            favorited = {
+                str(advertisement_id) for advertisement_id in FavoriteAdvertisement.objects.filter(
+                    user=request.user,
+                    advertisement__in=[advertisement['id'] for advertisement in advertisements],
+                ).values_list('advertisement_id', flat=True)
+            }
+        for advertisement in advertisements:
+            advertisement['is_favorited'] = str(advertisement['id']) in favorited
+        return ','.join(sorted(favorited))
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_advertisements(self, request):
-        ads = RentAdvertisement.objects.filter(owner=request.user)
-        page = self.paginate_queryset(ads)
-        serializer = RentAdvertisementListSerializer(page, many=True, context={'request': request})
-        return self.get_paginated_response(serializer.data)
+        ads = RentAdvertisement.objects.filter(owner=request.user).for_listing(request.user).order_by('-created_at')
+        return self.get_values_response(self.values_serializer_class.values(ads))
+    
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        # Ad counts per geohash cell for zoomed-out map views; honours the same
+        # filters as the list (typically bbox=south,west,north,east).
+        try:
+            precision = int(request.query_params.get('precision', 5))
+        except ValueError:
+            precision = 0
+        if not 1 <= precision <= geohash.MAX_PRECISION:
+            raise ValidationError({'precision': f'Must be between 1 and {geohash.MAX_PRECISION}.'})
+
+        cells = self.filter_queryset(self.get_queryset()).exclude(geohash='').annotate(
+            cell=Substr('geohash', 1, precision)
+        ).order_by().values('cell').annotate(
+            count=Count('pk'),
+            latitude=Avg('latitude'),
+            longitude=Avg('longitude'),
+        ).order_by('cell')
+
+        return Response([
+            {
+                'cell': cell['cell'],
+                'count': cell['count'],
+                'latitude': round(float(cell['latitude']), 6),
+                'longitude': round(float(cell['longitude']), 6),
+                'bounds': geohash.bounds(cell['cell']),
+            }
+            for cell in cells
+        ])
     
     @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
     def approve(self, request, pk=None):
@@ -108,8 +187,8 @@ class RentAdvertisementViewSet(viewsets.ModelViewSet):
         advertisement.status = 'approved'
         advertisement.save()
         
-        # Create notification for the owner
-        Notification.objects.create(
+        # Notify the owner
+        notifications.notify(
             user=advertisement.owner,
             notification_type='ad_approved',
             message=f'Your advertisement "{advertisement.title}" has been approved and is now live.',
@@ -124,8 +203,8 @@ class RentAdvertisementViewSet(viewsets.ModelViewSet):
         advertisement.status = 'rejected'
         advertisement.save()
         
-        # Create notification for the owner
-        Notification.objects.create(
+        # Notify the owner
+        notifications.notify(
             user=advertisement.owner,
             notification_type='ad_rejected',
             message=f'Your advertisement "{advertisement.title}" has been rejected.',
@@ -163,12 +242,18 @@ class RentAdvertisementViewSet(viewsets.ModelViewSet):
         favorite.delete()
         return Response({'status': 'removed from favorites'})
 
-class RentRequestViewSet(viewsets.ModelViewSet):
+class RentRequestViewSet(PerformanceMixin, viewsets.ModelViewSet):
     serializer_class = RentRequestSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return RentRequest.objects.filter(user=self.request.user)
+        if self.action in ['accept', 'reject']:
+            # Decisions are made by the owner of the advertisement, not the requester
+            return RentRequest.objects.filter(advertisement__owner=self.request.user)
+        # The ad's image comes from its primary_image pointer, joined in here
+        return RentRequest.objects.filter(user=self.request.user).select_related(
+            'user', 'advertisement__primary_image__stored_image'
+        )
     
     def get_serializer_class(self):
         if self.action in ['update', 'partial_update']:
@@ -177,90 +262,61 @@ class RentRequestViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         advertisement_id = self.request.data.get('advertisement')
-        advertisement = RentAdvertisement.objects.get(id=advertisement_id)
-        
-        # Check if advertisement is available for rent requests
-        if advertisement.status != 'approved' or not advertisement.is_available:
-            return Response(
-                {'error': 'This advertisement is not available for rent requests'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Check if user already sent a request
-        if RentRequest.objects.filter(advertisement=advertisement, user=self.request.user).exists():
-            return Response(
-                {'error': 'You have already sent a rent request for this advertisement'}, 
-                status=status.HTTP_400_BAD_REQUEST
+        with transaction.atomic():
+            # Same lock as accept/reject, so no request slips in while the ad is being rented
+            advertisement = get_object_or_404(RentAdvertisement.objects.select_for_update(), id=advertisement_id)
+            
+            # Check if advertisement is available for rent requests
+            if advertisement.status != 'approved' or not advertisement.is_available:
+                raise ValidationError({'error': 'This advertisement is not available for rent requests'})
+            
+            # Check if user already sent a request
+            if RentRequest.objects.filter(advertisement=advertisement, user=self.request.user).exists():
+                raise ValidationError({'error': 'You have already sent a rent request for this advertisement'})
+            
+            rent_request = serializer.save(user=self.request.user, advertisement=advertisement)
+            
+            # Notify the advertisement owner
+            notifications.notify(
+                user=advertisement.owner,
+                notification_type='rent_request',
+                message=f'{self.request.user.username} has sent a rent request for your advertisement "{advertisement.title}".',
+                related_advertisement=advertisement,
+                related_request=rent_request,
+                dedupe_key=f'rent_request:{rent_request.pk}'
             )
-        
-        rent_request = serializer.save(user=self.request.user, advertisement=advertisement)
-        
-        # Create notification for the advertisement owner
-        Notification.objects.create(
-            user=advertisement.owner,
-            notification_type='rent_request',
-            message=f'{self.request.user.username} has sent a rent request for your advertisement "{advertisement.title}".',
-            related_advertisement=advertisement,
-            related_request=rent_request
-        )
     
     @action(detail=True, methods=['post'], permission_classes=[IsAdvertisementOwner])
     def accept(self, request, pk=None):
         rent_request = self.get_object()
-        
-        # Check if the advertisement already has an accepted request
-        if RentRequest.objects.filter(
-            advertisement=rent_request.advertisement, 
-            status='accepted'
-        ).exists():
-            return Response(
-                {'error': 'This advertisement already has an accepted rent request'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        rent_request.status = 'accepted'
-        rent_request.save()
-        
-        # Mark advertisement as rented and unavailable for further requests
-        advertisement = rent_request.advertisement
-        advertisement.status = 'rented'
-        advertisement.is_available = False
-        advertisement.save()
-        
-        # Reject all other pending requests for this advertisement
-        RentRequest.objects.filter(
-            advertisement=advertisement, 
-            status='pending'
-        ).update(status='rejected')
-        
-        # Create notification for the requester
-        Notification.objects.create(
-            user=rent_request.user,
-            notification_type='request_accepted',
-            message=f'Your rent request for "{advertisement.title}" has been accepted.',
-            related_advertisement=advertisement,
-            related_request=rent_request
-        )
-        
+        try:
+            # Locks the ad, rents it out and rejects every competing request
+            rent_requests.decide(rent_request, 'accept')
+        except rent_requests.RentRequestError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'status': 'rent request accepted'})
     
     @action(detail=True, methods=['post'], permission_classes=[IsAdvertisementOwner])
     def reject(self, request, pk=None):
         rent_request = self.get_object()
-        rent_request.status = 'rejected'
-        rent_request.save()
-        
-        # Create notification for the requester
-        Notification.objects.create(
-            user=rent_request.user,
-            notification_type='request_rejected',
-            message=f'Your rent request for "{rent_request.advertisement.title}" has been rejected.',
-            related_advertisement=rent_request.advertisement,
-            related_request=rent_request
-        )
-        
+        try:
+            rent_requests.decide(rent_request, 'reject')
+        except rent_requests.RentRequestError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'status': 'rent request rejected'})
 
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Accept or reject many requests on the caller's ads in one call."""
+        serializer = RentRequestBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        decisions = [(decision['id'], decision['action']) for decision in serializer.validated_data['decisions']]
+        owned = RentRequest.objects.filter(
+            pk__in=[rent_request_id for rent_request_id, _ in decisions], advertisement__owner=request.user
+        )
+        results = rent_requests.decide_many({rent_request.pk: rent_request for rent_request in owned}, decisions)
+        return Response({'results': results})
+
 
 
 # class FavoriteAdvertisementViewSet(viewsets.ModelViewSet):
@@ -292,14 +348,17 @@ class RentRequestViewSet(viewsets.ModelViewSet):
 #         serializer.save(user=self.request.user, advertisement=advertisement)
 
 
-class FavoriteAdvertisementViewSet(viewsets.ModelViewSet):
+class FavoriteAdvertisementViewSet(PerformanceMixin, ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [IsAdminUser]
     serializer_class = FavoriteAdvertisementSerializer
+    values_serializer_class = FavoriteAdvertisementValuesSerializer
     lookup_field = 'advertisement__id'  # allows access via advertisement ID
 
     def get_queryset(self):
         # Only favorites of the current user
-        return FavoriteAdvertisement.objects.filter(user=self.request.user)
+        return FavoriteAdvertisement.objects.filter(user=self.request.user).prefetch_related(
+            Prefetch('advertisement', queryset=RentAdvertisement.objects.for_listing(self.request.user))
+        )
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -328,7 +387,7 @@ class FavoriteAdvertisementViewSet(viewsets.ModelViewSet):
 
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(PerformanceMixin, viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
     
@@ -351,33 +410,43 @@ class ReviewViewSet(viewsets.ModelViewSet):
         
         review = serializer.save(user=self.request.user, advertisement=advertisement)
         
-        # Create notification for the advertisement owner
-        Notification.objects.create(
+        # Notify the advertisement owner
+        notifications.notify(
             user=advertisement.owner,
             notification_type='new_review',
             message=f'{self.request.user.username} has reviewed your advertisement "{advertisement.title}".',
-            related_advertisement=advertisement
+            related_advertisement=advertisement,
+            dedupe_key=f'new_review:{review.pk}'
         )
 
 
 
+STATISTICS_STATUSES = ['approved', 'pending', 'rejected', 'rented']
+
+
+def _status_counts(prefix, period=Q()):
+    counts = {f'{prefix}_total': Count('pk', filter=period)}
+    for ad_status in STATISTICS_STATUSES:
+        counts[f'{prefix}_{ad_status}'] = Count('pk', filter=period & Q(status=ad_status))
+    return counts
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def advertisement_statistics(request):
     # Current month statistics
     current_month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    current_month_ads = RentAdvertisement.objects.filter(created_at__gte=current_month_start)
     
     # Last month statistics
     last_month_end = current_month_start - timedelta(days=1)
     last_month_start = last_month_end.replace(day=1)
-    last_month_ads = RentAdvertisement.objects.filter(
-        created_at__gte=last_month_start, 
-        created_at__lte=last_month_end
-    )
     
-    # Total statistics
-    total_ads = RentAdvertisement.objects.count()
+    # Every count in one pass over the table using conditional aggregation
+    counts = RentAdvertisement.objects.aggregate(
+        **_status_counts('current_month', Q(created_at__gte=current_month_start)),
+        **_status_counts('last_month', Q(created_at__gte=last_month_start, created_at__lte=last_month_end)),
+        **_status_counts('all_time'),
+    )
     
     # Popular categories
     popular_categories = Category.objects.annotate(
@@ -385,34 +454,139 @@ def advertisement_statistics(request):
     ).order_by('-ad_count')[:5]
     
     data = {
-        'current_month': {
-            'total': current_month_ads.count(),
-            'approved': current_month_ads.filter(status='approved').count(),
-            'pending': current_month_ads.filter(status='pending').count(),
-            'rejected': current_month_ads.filter(status='rejected').count(),
-            'rented': current_month_ads.filter(status='rented').count(),
-        },
-        'last_month': {
-            'total': last_month_ads.count(),
-            'approved': last_month_ads.filter(status='approved').count(),
-            'pending': last_month_ads.filter(status='pending').count(),
-            'rejected': last_month_ads.filter(status='rejected').count(),
-            'rented': last_month_ads.filter(status='rented').count(),
-        },
-        'all_time': {
-            'total': total_ads,
-            'approved': RentAdvertisement.objects.filter(status='approved').count(),
-            'pending': RentAdvertisement.objects.filter(status='pending').count(),
-            'rejected': RentAdvertisement.objects.filter(status='rejected').count(),
-            'rented': RentAdvertisement.objects.filter(status='rented').count(),
-        },
-        'popular_categories': [
-            {'name': cat.name, 'count': cat.ad_count} for cat in popular_categories
-        ]
+        period: {
+            'total': counts[f'{period}_total'],
+            **{ad_status: counts[f'{period}_{ad_status}'] for ad_status in STATISTICS_STATUSES},
+        }
+        for period in ['current_month', 'last_month', 'all_time']
     }
+    data['popular_categories'] = [
+        {'name': cat.name, 'count': cat.ad_count} for cat in popular_categories
+    ]
     
     return Response(data)
 
-class AdvertisementImageViewSet(viewsets.ModelViewSet):
-    queryset = AdvertisementImage.objects.all()
-    serializer_class = AdvertisementImageSerializer
\ No newline at end of file
+
+def _statistics_range(request):
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD, both inclusive; defaults to the last 30 days
+    end = request.query_params.get('end')
+    start = request.query_params.get('start')
+    try:
+        end = parse_date(end) if end else timezone.localdate()
+        start = parse_date(start) if start else end - timedelta(days=29)
+    except ValueError:
+        start = end = None
+    if start is None or end is None or start > end:
+        raise ValidationError({'error': 'start and end must be YYYY-MM-DD dates with start <= end'})
+    return AdvertisementDailyStat.objects.filter(date__range=(start, end))
+
+
+def _rollup_counts(stats, *group_by):
+    counts = {'total': Sum('count')}
+    for ad_status, _ in RentAdvertisement.STATUS_CHOICES:
+        counts[ad_status] = Coalesce(Sum('count', filter=Q(status=ad_status)), 0)
+    return stats.values(*group_by).annotate(**counts).filter(total__gt=0)
+
+
+STATISTICS_BREAKDOWNS = {
+    'status': 'status',
+    'category': 'category__name',
+    'location': 'location',
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def advertisement_statistics_breakdown(request):
+    # Ads created in a date range, grouped by ?by=category|location|status
+    group_by = request.query_params.get('by', 'category')
+    if group_by not in STATISTICS_BREAKDOWNS:
+        raise ValidationError({'by': f'Must be one of {", ".join(STATISTICS_BREAKDOWNS)}'})
+    field = STATISTICS_BREAKDOWNS[group_by]
+
+    rows = _rollup_counts(_statistics_range(request), field).order_by('-total', field)
+    return Response([
+        {group_by: row.pop(field), **row} for row in rows
+    ])
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def advertisement_statistics_timeseries(request):
+    # Ads created per day in a date range, split by current status
+    rows = _rollup_counts(_statistics_range(request), 'date').order_by('date')
+    return Response(list(rows))
+
+class AdvertisementImageViewSet(PerformanceMixin, viewsets.ModelViewSet):
+    serializer_class = AdvertisementImageSerializer
+
+    def get_queryset(self):
+        return AdvertisementImage.objects.filter(
+            advertisement_id=self.get_advertisement_id()
+        ).select_related('stored_image')
+
+    def get_advertisement_id(self):
+        try:
+            return uuid.UUID(str(self.kwargs['advertisement_pk']))
+        except ValueError:
+            raise Http404
+
+    def get_advertisement(self):
+        # Only the owner (or an admin) changes an ad's images
+        advertisement = get_object_or_404(RentAdvertisement, pk=self.get_advertisement_id())
+        if advertisement.owner != self.request.user and not self.request.user.is_staff:
+            raise PermissionDenied('You can only change images of your own advertisements')
+        return advertisement
+
+    def perform_create(self, serializer):
+        serializer.save(advertisement=self.get_advertisement())
+
+    def perform_update(self, serializer):
+        self.get_advertisement()
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        self.get_advertisement()
+        instance.delete()
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def batch(self, request, advertisement_pk=None):
+        """
+        Several images in one multipart request, as repeated ``images`` parts;
+        ``primary`` optionally names the (zero-based) file to make primary.
+        Files that aren't images are reported in ``errors`` by index.
+        """
+        advertisement = self.get_advertisement()
+        files = request.FILES.getlist('images')
+        if not files:
+            raise ValidationError({'images': ['No files were submitted.']})
+        if len(files) > uploads.MAX_FILES:
+            raise ValidationError({'images': [f'At most {uploads.MAX_FILES} files can be uploaded at once.']})
+        primary = request.data.get('primary')
+        if primary not in (None, ''):
+            try:
+                primary = int(primary)
+            except ValueError:
+                raise ValidationError({'primary': ['A valid integer is required.']})
+            if not 0 <= primary < len(files):
+                raise ValidationError({'primary': ['Must be the index of one of the files.']})
+        else:
+            primary = None
+
+        valid, errors = uploads.validate(files)
+        positions = [index for index, _ in valid]
+        created = uploads.add_images(
+            advertisement,
+            [upload for _, upload in valid],
+            positions.index(primary) if primary in positions else None,
+        )
+        if not created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            'images': AdvertisementImageSerializer(created, many=True).data,
+            'errors': errors,
+        }, status=response_status)
\ No newline at end of file
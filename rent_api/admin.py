@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import StoredImage
+
+
+@admin.register(StoredImage)
+class StoredImageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'status', 'width', 'height', 'attempts', 'created_at', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['staged_path', 'width', 'height', 'blurhash', 'variants', 'attempts', 'last_error', 'created_at', 'updated_at']
+    list_per_page = 50
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RentApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rent_api'
+
+    def ready(self):
+        # Connect the response-cache invalidation receivers
+        from rent_api import signals  # noqa: F401
@@ -0,0 +1,372 @@
+"""
+API benchmark harness (the bench_api command).
+
+``endpoints()`` lists a GET request for every list, retrieve and GET action
+route the routers in rent_api/urls.py register, plus the ad list with the
+search, ordering and map filters the site uses. Detail routes take the first
+row their list returned, and the nested routes an approved ad of the
+benchmark user's with the most rent requests, so the user sees all of them.
+
+A transport sends each request ``repeat`` times after ``warmup`` untimed
+runs: ClientTransport through the Django test client in this process, with
+queries counted by CaptureQueriesContext; HttpTransport against a running
+server with a JWT for the user, reading the query count from the
+Server-Timing header PerformanceMiddleware adds (rent_api/performance.py).
+Results are plain JSON, so a later run can be compared with ``compare()``.
+
+``compare_serializers()`` (the bench_serializers command) times the DRF
+serializers of the list endpoints with a fast path against their
+ValuesSerializers (rent_api/values.py) on pages of rows, and checks that
+both render the same JSON. ``compare_json()`` (the bench_json command) does
+the same for DRF's JSONRenderer and JSONParser against FastJSONRenderer and
+FastJSONParser (rent_api/fast_json.py).
+"""
+import io
+import json
+import math
+import re
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Prefetch
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from rent_add.models import AdvertisementImage, FavoriteAdvertisement, RentAdvertisement, RentRequest, Review
+from rent_add.serializers import (
+    FavoriteAdvertisementSerializer, FavoriteAdvertisementValuesSerializer, RentAdvertisementListSerializer,
+    RentAdvertisementListValuesSerializer,
+)
+from rent_api import fast_json, urls
+from rent_user.models import Message, Notification
+from rent_user.serializers import (
+    MessageSerializer, MessageValuesSerializer, NotificationSerializer, NotificationValuesSerializer,
+)
+from users.models import CustomUser
+
+# Extra query strings benchmarked on top of each route's plain request
+QUERIES = {
+    'advertisement-list': ['search=sunny balcony', 'ordering=-price', 'bbox=23.70,90.30,23.90,90.50'],
+}
+DB_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def benchmark_user():
+    """The owner of the approved ad with the most rent requests."""
+    advertisement = (
+        RentAdvertisement.objects.filter(status='approved').annotate(requests=Count('rent_requests'))
+        .order_by('-requests', 'pk').select_related('owner').first()
+    )
+    return advertisement.owner if advertisement else None
+
+
+def sample_advertisement(user):
+    return (
+        RentAdvertisement.objects.filter(owner=user, status='approved').annotate(requests=Count('rent_requests'))
+        .order_by('-requests', 'pk').values_list('pk', flat=True).first()
+    )
+
+
+def routes():
+    """(router, basename, route name, detail, lookup kwarg) of every GET route."""
+    for router in (urls.router, urls.advertisements_router):
+        for _, viewset, basename in router.registry:
+            lookup = viewset.lookup_url_kwarg or viewset.lookup_field
+            for route in router.get_routes(viewset):
+                if 'get' in router.get_method_map(viewset, route.mapping):
+                    yield router, basename, route.name.format(basename=basename), route.detail, lookup
+
+
+def first_id(body):
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = data.get('results')
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        return data[0].get('id')
+    return None
+
+
+def endpoints(transport, advertisement_id):
+    """(name, path) pairs to benchmark; details use an id from their list's first page."""
+    found, sample_ids = [], {}
+    for router, basename, name, detail, lookup in routes():
+        kwargs = {}
+        if getattr(router, 'parent_regex', None):
+            kwargs = {kwarg: advertisement_id for kwarg in re.findall(r'\(\?P<(\w+)>', router.parent_regex)}
+        if detail:
+            if sample_ids.get(basename) is None:
+                continue
+            kwargs[lookup] = sample_ids[basename]
+        path = reverse(name, kwargs=kwargs)
+        if name == f'{basename}-list':
+            sample_ids[basename] = first_id(transport.get(path)[1])
+        found.append((name, path))
+        found += [(f'{name}?{query}', f'{path}?{query}') for query in QUERIES.get(name, [])]
+    return found
+
+
+class ClientTransport:
+    def __init__(self, user, cold=False):
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.cold = cold
+
+    def get(self, path):
+        """(status, body, seconds, queries) of one request."""
+        if self.cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(path)
+            elapsed = time.perf_counter() - started
+        return response.status_code, response.content, elapsed, len(queries)
+
+
+class HttpTransport:
+    def __init__(self, base_url, user, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Authorization': f'JWT {AccessToken.for_user(user)}', 'Accept': 'application/json'}
+        self.timeout = timeout
+
+    def get(self, path):
+        request = urllib.request.Request(self.base_url + path, headers=self.headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, body, headers = response.status, response.read(), response.headers
+        except urllib.error.HTTPError as error:
+            status, body, headers = error.code, error.read(), error.headers
+        elapsed = time.perf_counter() - started
+        match = DB_QUERIES.search(headers.get('Server-Timing', ''))
+        return status, body, elapsed, int(match.group(1)) if match else None
+
+
+def percentile(ordered, fraction):
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+
+def measure(transport, name, path, repeat, warmup=2, concurrency=1):
+    for _ in range(warmup):
+        transport.get(path)
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(lambda _: transport.get(path), range(repeat)))
+    else:
+        samples = [transport.get(path) for _ in range(repeat)]
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for _, _, elapsed, _ in samples)
+    queries = [count for _, _, _, count in samples if count is not None]
+    return {
+        'name': name,
+        'path': path,
+        'requests': repeat,
+        'statuses': sorted({status for status, _, _, _ in samples}),
+        'bytes': len(samples[-1][1]),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'queries': round(sum(queries) / len(queries), 1) if queries else None,
+        'throughput_rps': round(repeat / wall, 1),
+    }
+
+
+def dataset():
+    return {
+        model._meta.label: model.objects.count()
+        for model in (
+            CustomUser, RentAdvertisement, AdvertisementImage, Review, FavoriteAdvertisement, RentRequest,
+            Message, Notification,
+        )
+    }
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(transport, user, repeat=20, warmup=2, concurrency=1, only=None, log=lambda result: None):
+    results = []
+    for name, path in endpoints(transport, sample_advertisement(user)):
+        if only and not re.search(only, name):
+            continue
+        result = measure(transport, name, path, repeat, warmup, concurrency)
+        log(result)
+        results.append(result)
+    return {
+        'meta': {
+            'started_at': timezone.now().isoformat(),
+            'revision': revision(),
+            'transport': type(transport).__name__,
+            'database': connection.vendor,
+            'user': user.email,
+            'repeat': repeat,
+            'concurrency': concurrency,
+            'dataset': dataset(),
+        },
+        'endpoints': results,
+    }
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Per endpoint in both runs: p50/p95 and query count, before and after,
+    and whether it regressed (p95 more than ``threshold`` slower, or more
+    queries).
+    """
+    before = {endpoint['name']: endpoint for endpoint in baseline['endpoints']}
+    rows = []
+    for endpoint in results['endpoints']:
+        old = before.get(endpoint['name'])
+        if old is None:
+            continue
+        more_queries = None not in (old['queries'], endpoint['queries']) and endpoint['queries'] > old['queries']
+        rows.append({
+            'name': endpoint['name'],
+            'p50_ms': (old['p50_ms'], endpoint['p50_ms']),
+            'p95_ms': (old['p95_ms'], endpoint['p95_ms']),
+            'queries': (old['queries'], endpoint['queries']),
+            'regressed': endpoint['p95_ms'] > old['p95_ms'] * (1 + threshold) or more_queries,
+        })
+    return rows
+
+
+def serializer_cases(user):
+    """(name, queryset as its view reads it, DRF serializer, ValuesSerializer) per list with a fast path."""
+    return [
+        (
+            'advertisements', RentAdvertisement.objects.for_listing(user).order_by('-created_at', '-pk'),
+            RentAdvertisementListSerializer, RentAdvertisementListValuesSerializer,
+        ),
+        (
+            'messages', Message.objects.select_related('sender', 'recipient', 'advertisement').order_by('-created_at', '-id'),
+            MessageSerializer, MessageValuesSerializer,
+        ),
+        (
+            'notifications', Notification.objects.order_by('-created_at', '-id'),
+            NotificationSerializer, NotificationValuesSerializer,
+        ),
+        (
+            'favorites', FavoriteAdvertisement.objects.prefetch_related(
+                Prefetch('advertisement', queryset=RentAdvertisement.objects.for_listing(user))
+            ).order_by('-created_at', '-id'),
+            FavoriteAdvertisementSerializer, FavoriteAdvertisementValuesSerializer,
+        ),
+    ]
+
+
+def time_page(fetch, serialize, repeat, warmup):
+    """Median fetch and serialize milliseconds of a page, its queries and its data."""
+    for _ in range(warmup):
+        serialize(fetch())
+    fetch_times, serialize_times = [], []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            rows = fetch()
+            fetched = time.perf_counter()
+            data = serialize(rows)
+            fetch_times.append((fetched - started) * 1000)
+            serialize_times.append((time.perf_counter() - fetched) * 1000)
+    return {
+        'rows': len(rows),
+        'fetch_ms': round(percentile(sorted(fetch_times), 0.5), 3),
+        'serialize_ms': round(percentile(sorted(serialize_times), 0.5), 3),
+        'queries': len(queries),
+    }, data
+
+
+def compare_serializers(user, page_size=100, repeat=20, warmup=2):
+    request = Request(APIRequestFactory().get('/'))
+    request.user = user
+    context = {'request': request}
+    renderer = JSONRenderer()
+    results = []
+    for name, queryset, serializer_class, values_class in serializer_cases(user):
+        drf, drf_data = time_page(
+            lambda: list(queryset[:page_size]),
+            lambda page: serializer_class(page, many=True, context=context).data,
+            repeat, warmup,
+        )
+        values, values_data = time_page(
+            lambda: list(values_class.values(queryset)[:page_size]),
+            lambda page: values_class(page, many=True, context=context).data,
+            repeat, warmup,
+        )
+        drf_total = drf['fetch_ms'] + drf['serialize_ms']
+        values_total = values['fetch_ms'] + values['serialize_ms']
+        results.append({
+            'name': name,
+            'drf': drf,
+            'values': values,
+            'speedup': round(drf_total / values_total, 2) if values_total else None,
+            'identical': renderer.render(drf_data) == renderer.render(values_data),
+        })
+    return results
+
+
+def json_payloads(user, page_size=100):
+    """(name, data): an ad list page as the API returns it, and raw rows with Decimals, UUIDs and datetimes."""
+    advertisements = RentAdvertisement.objects.for_listing(user).order_by('-created_at', '-pk')
+    page = RentAdvertisementListValuesSerializer(
+        list(RentAdvertisementListValuesSerializer.values(advertisements)[:page_size]), many=True
+    ).data
+    return [
+        ('advertisement page', {'next': None, 'previous': None, 'results': page}),
+        ('advertisement rows', list(RentAdvertisement.objects.order_by('-created_at', '-pk').values()[:page_size])),
+    ]
+
+
+def throughput(function, argument, repeat):
+    """Median seconds of ``function(argument)``."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - started)
+    return percentile(sorted(timings), 0.5)
+
+
+def compare_json(payloads, repeat=50):
+    """Per payload: render and parse times of DRF's classes and the fast ones, and whether the bytes match."""
+    drf_renderer, fast_renderer = JSONRenderer(), fast_json.FastJSONRenderer()
+    drf_parser, fast_parser = JSONParser(), fast_json.FastJSONParser()
+    results = []
+    for name, data in payloads:
+        content = drf_renderer.render(data)
+        seconds = {
+            'drf_render': throughput(drf_renderer.render, data, repeat),
+            'fast_render': throughput(fast_renderer.render, data, repeat),
+            'drf_parse': throughput(lambda body: drf_parser.parse(io.BytesIO(body)), content, repeat),
+            'fast_parse': throughput(lambda body: fast_parser.parse(io.BytesIO(body)), content, repeat),
+        }
+        results.append({
+            'name': name,
+            'bytes': len(content),
+            **{f'{key}_ms': round(value * 1000, 3) for key, value in seconds.items()},
+            **{f'{key}_mb_s': round(len(content) / value / 1e6, 1) for key, value in seconds.items() if value},
+            'identical': fast_renderer.render(data) == content,
+            'parsed_identical': fast_parser.parse(io.BytesIO(content)) == drf_parser.parse(io.BytesIO(content)),
+        })
+    return results
@@ -0,0 +1,127 @@
+"""
+Shared response cache for public read endpoints.
+
+Responses are cached per viewset action and normalized query string, and the
+key embeds a version stamp for every model the response depends on. Saving
+or deleting one of those models bumps its stamp when the transaction
+commits (see rent_api/signals.py), so stale entries are never read again
+and simply expire.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+VERSION_PREFIX = 'api-cache:version'
+RESPONSE_PREFIX = 'api-cache:response'
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 300,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'API_RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting('CACHE')]
+
+
+def _version_key(model):
+    return f'{VERSION_PREFIX}:{model._meta.label_lower}'
+
+
+def bump_version(model):
+    # Versions are change timestamps, which doubles as Last-Modified. Bumped
+    # once the write commits, or a reader could cache the old rows under the
+    # new version before it does
+    key = _version_key(model)
+    transaction.on_commit(lambda: get_cache().set(key, time.time(), None))
+
+
+def get_versions(models):
+    cache = get_cache()
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def normalize_query_params(query_params):
+    # Same filters in a different order (or with blank values) share an entry
+    items = []
+    for name in sorted(query_params):
+        values = [value for value in query_params.getlist(name) if value != '']
+        if values:
+            items.append(f"{name}={','.join(values)}")
+    return '&'.join(items)
+
+
+class CachedResponseMixin:
+    """
+    Serve ``list`` and ``retrieve`` from the shared response cache.
+
+    ``cache_models`` lists the models the response is built from. Per-user
+    values must not be baked into the cached body; override
+    ``personalize_cached_data`` to merge them in after the lookup.
+    """
+    cache_models = ()
+    # Set when staff users get a different queryset than everyone else
+    cache_varies_on_staff = False
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request, versions):
+        audience = 'staff' if self.cache_varies_on_staff and request.user.is_staff else 'public'
+        parts = [
+            ','.join(f'{name}={value}' for name, value in sorted(self.kwargs.items())),
+            normalize_query_params(request.query_params),
+            ','.join(str(versions[key]) for key in sorted(versions)),
+        ]
+        digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+        return f'{RESPONSE_PREFIX}:{self.__class__.__name__}:{self.action}:{audience}:{digest}'
+
+    def personalize_cached_data(self, request, data):
+        """Merge per-user values into ``data``; return a string identifying them."""
+        return ''
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        cache = get_cache()
+        versions = get_versions(self.cache_models)
+        key = self.get_response_cache_key(request, versions)
+
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(key, data, get_setting('TIMEOUT'))
+
+        signature = self.personalize_cached_data(request, data)
+        etag = '"%s"' % hashlib.md5(f'{key}|{signature}'.encode()).hexdigest()
+        last_modified = int(max(versions.values())) if versions else None
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(data)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,132 @@
+"""
+Streaming exports of users, advertisements, rent requests and reviews.
+
+An export is NDJSON (one JSON object per line) or CSV with a header row.
+Rows are read with values().iterator(chunk_size=CHUNK_SIZE), through a
+server-side cursor on PostgreSQL, and encoded one at a time into chunks of
+about BUFFER_SIZE bytes for a StreamingHttpResponse. No model instances
+are built and no more than a database chunk is held, so memory stays flat
+however many rows there are, and the first bytes go out once the first
+chunk is read rather than after the whole table.
+
+Admins export every row. Other users export the ads they own and the rent
+requests and reviews on them; the users export is for admins only.
+Advertisements use rent_add/transfer.py's rows, so an export can be fed
+back to import_ads. In NDJSON, decimals and datetimes are written as
+export_ads writes them (DjangoJSONEncoder); in CSV, empty cells are nulls,
+lists are joined with ``;`` and text that a spreadsheet would read as a
+formula is prefixed with ``'``, as export_ads does and import_ads undoes.
+"""
+import csv
+from typing import Callable, NamedTuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from rent_add import transfer
+from rent_add.models import RentAdvertisement, RentRequest, Review
+from rent_api import fast_json
+from users.models import CustomUser
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+USER_FIELDS = [
+    'id', 'email', 'first_name', 'last_name', 'phone_number', 'role', 'is_verified', 'is_active', 'is_staff',
+    'created_at', 'last_login',
+]
+RENT_REQUEST_FIELDS = [
+    'id', 'advertisement', 'user', 'user_email', 'status', 'message', 'move_in_date', 'lease_duration',
+    'created_at', 'updated_at',
+]
+REVIEW_FIELDS = [
+    'id', 'advertisement', 'user', 'user_email', 'rating', 'comment', 'is_verified', 'created_at', 'updated_at',
+]
+
+
+class Export(NamedTuple):
+    fields: list
+    # (queryset of what the user may export, chunk size) -> rows
+    rows: Callable
+    # user -> queryset of what they may export
+    queryset: Callable
+    admin_only: bool = False
+
+
+def value_rows(fields):
+    def rows(queryset, chunk_size):
+        columns = [field for field in fields if field != 'user_email']
+        expressions = {'user_email': F('user__email')} if 'user_email' in fields else {}
+        return queryset.order_by('pk').values(*columns, **expressions).iterator(chunk_size=chunk_size)
+    return rows
+
+
+def owned(model, owner):
+    def queryset(user):
+        if user.is_staff:
+            return model.objects.all()
+        return model.objects.filter(**{owner: user})
+    return queryset
+
+
+EXPORTS = {
+    'users': Export(USER_FIELDS, value_rows(USER_FIELDS), lambda user: CustomUser.objects.all(), admin_only=True),
+    'advertisements': Export(transfer.FIELDS, transfer.export_rows, owned(RentAdvertisement, 'owner')),
+    'rent-requests': Export(
+        RENT_REQUEST_FIELDS, value_rows(RENT_REQUEST_FIELDS), owned(RentRequest, 'advertisement__owner')
+    ),
+    'reviews': Export(REVIEW_FIELDS, value_rows(REVIEW_FIELDS), owned(Review, 'advertisement__owner')),
+}
+
+
+class Echo:
+    # csv.writer hands each line to write() and returns what it returns
+    def write(self, line):
+        return line
+
+
+def csv_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return transfer.AMENITY_SEPARATOR.join(str(item) for item in value)
+    return transfer.quote_formula(value)
+
+
+def encode(rows, fields, format):
+    """Each row as a line of bytes, after a header row for CSV."""
+    if format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields).encode()
+        for row in rows:
+            yield writer.writerow([csv_cell(row[field]) for field in fields]).encode()
+        return
+    for row in rows:
+        yield fast_json.dumps(row, DjangoJSONEncoder) + b'\n'
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """Lines joined into chunks of about ``size`` bytes, so the server isn't written to per row."""
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def stream(name, user, format, statuses=(), chunk_size=CHUNK_SIZE):
+    """The body of export ``name`` for ``user``, as chunks of bytes."""
+    export = EXPORTS[name]
+    queryset = export.queryset(user)
+    if statuses and 'status' in export.fields:
+        queryset = queryset.filter(status__in=statuses)
+    return buffered(encode(export.rows(queryset, chunk_size), export.fields, format))
@@ -0,0 +1,86 @@
+"""
+JSON renderer and parser for the API, on orjson when it is installed.
+
+FastJSONRenderer writes the same bytes as DRF's JSONRenderer with its
+default settings (compact, UTF-8, U+2028/U+2029 escaped). orjson handles
+strings, numbers, booleans, None, dicts, lists, tuples and UUIDs itself
+and hands everything else (datetimes, Decimals, lazy strings, sets, ...)
+to DRF's JSONEncoder.default, so those come out as DRF writes them.
+Indented output (the ``indent`` media type parameter), non-default
+COMPACT_JSON, UNICODE_JSON or STRICT_JSON settings and anything orjson
+rejects, such as integers beyond 64 bits, are left to JSONRenderer, as is
+everything when orjson isn't installed. What still differs: floats below
+1e-4 or from 1e16 up are written 0.00001 and 1e16 rather than 1e-05 and
+1e+16, and NaN and infinities become null where JSONRenderer raises.
+
+FastJSONParser reads UTF-8 bodies with orjson; other charsets, and bodies
+orjson rejects, go to JSONParser, so invalid JSON gets DRF's error.
+Integers beyond 64 bits come back as floats.
+
+Both are the defaults in REST_FRAMEWORK; a viewset can pick them, or DRF's
+own, with ``renderer_classes`` and ``parser_classes``.
+"""
+import codecs
+import io
+import json
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# What orjson would render differently from DRF's encoder goes through it
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+_default = encoders.JSONEncoder().default
+
+
+def escape(content):
+    # Valid JSON but not valid JavaScript, so JSONRenderer escapes them
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+def dumps(data, encoder_class=encoders.JSONEncoder):
+    """``data`` as bytes, as JSONRenderer writes it with the default settings and ``encoder_class``."""
+    if orjson is not None:
+        default = _default if encoder_class is encoders.JSONEncoder else encoder_class().default
+        try:
+            return escape(orjson.dumps(data, default=default, option=OPTIONS))
+        except TypeError:
+            pass
+    return escape(json.dumps(
+        data, cls=encoder_class, ensure_ascii=False, allow_nan=False, separators=(',', ':')
+    ).encode())
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or not self.compact or self.ensure_ascii or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return escape(orjson.dumps(data, default=self.encoder_class().default, option=OPTIONS))
+        except TypeError:
+            # orjson.JSONEncodeError; JSONRenderer renders it or raises DRF's own error
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONParser(parsers.JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -1,6 +1,39 @@
 # filters.py
+import math
+import operator
+from functools import reduce
+
 import django_filters
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from  rent_add.models import RentAdvertisement
+from rent_add import geohash
+
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 500
+
+
+def parse_coordinates(value, name, count):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count or not all(math.isfinite(number) for number in numbers):
+        raise ValidationError({name: f'Expected {count} comma-separated numbers.'})
+    return numbers
+
+
+def distance_km(latitude, longitude):
+    # Haversine great-circle distance from a point, in kilometres
+    ad_latitude = Cast(F('latitude'), FloatField())
+    ad_longitude = Cast(F('longitude'), FloatField())
+    half_dlat = Radians(ad_latitude - latitude) / 2
+    half_dlng = Radians(ad_longitude - longitude) / 2
+    a = Power(Sin(half_dlat), 2) + math.cos(math.radians(latitude)) * Cos(Radians(ad_latitude)) * Power(Sin(half_dlng), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
 
 class RentAdvertisementFilter(django_filters.FilterSet):
     min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
@@ -11,6 +44,10 @@ class RentAdvertisementFilter(django_filters.FilterSet):
     max_bathrooms = django_filters.NumberFilter(field_name='bathrooms', lookup_expr='lte')
     min_area = django_filters.NumberFilter(field_name='area', lookup_expr='gte')
     max_area = django_filters.NumberFilter(field_name='area', lookup_expr='lte')
+    # near=lat,lng&radius_km=5 and bbox=south,west,north,east
+    near = django_filters.CharFilter(method='filter_near')
+    radius_km = django_filters.NumberFilter(method='filter_radius')
+    bbox = django_filters.CharFilter(method='filter_bbox')
     
     class Meta:
         model = RentAdvertisement
@@ -18,4 +55,55 @@ class RentAdvertisementFilter(django_filters.FilterSet):
             'category', 'bedrooms', 'bathrooms', 'price', 'area',
             'min_price', 'max_price', 'min_bedrooms', 'max_bedrooms',
             'min_bathrooms', 'max_bathrooms', 'min_area', 'max_area'
-        ]
\ No newline at end of file
+        ]
+
+    def filter_near(self, queryset, name, value):
+        latitude, longitude = parse_coordinates(value, name, 2)
+        radius = float(self.form.cleaned_data.get('radius_km') or DEFAULT_RADIUS_KM)
+        if not 0 < radius <= MAX_RADIUS_KM:
+            raise ValidationError({'radius_km': f'Must be between 0 and {MAX_RADIUS_KM}.'})
+
+        # Geohash cells narrow the candidates with index range scans, the bounding
+        # box trims the cell corners, and the exact distance settles the rest.
+        cells = geohash.covering_cells(latitude, longitude, radius)
+        if cells:
+            queryset = queryset.filter(reduce(operator.or_, (
+                Q(geohash__gte=cell, geohash__lt=cell + geohash.END) for cell in cells
+            )))
+        lat_delta = radius / geohash.KM_PER_DEGREE
+        lng_delta = radius / (geohash.KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        return queryset.filter(
+            latitude__range=(latitude - lat_delta, latitude + lat_delta),
+            longitude__range=(longitude - lng_delta, longitude + lng_delta),
+        ).annotate(distance=distance_km(latitude, longitude)).filter(distance__lte=radius)
+
+    def filter_radius(self, queryset, name, value):
+        # Read by filter_near
+        return queryset
+
+    def filter_bbox(self, queryset, name, value):
+        south, west, north, east = parse_coordinates(value, name, 4)
+        if south > north or west > east:
+            raise ValidationError({name: 'Expected south,west,north,east.'})
+        return queryset.filter(latitude__range=(south, north), longitude__range=(west, east))
+
+
+class RelevanceOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that sorts search results by relevance and ``near`` results
+    by distance unless the client asks for an explicit ordering. Must run
+    after the search and filterset backends.
+    """
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        # The SQLite backend adds the rank as an extra() select, not an annotation
+        ranked = 'search_rank' in queryset.query.annotations or 'search_rank' in queryset.query.extra
+        if not params and ranked:
+            return ['-search_rank', *self.get_default_ordering(view)]
+        if not params and 'distance' in queryset.query.annotations:
+            return ['distance', *self.get_default_ordering(view)]
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and 'distance' not in queryset.query.annotations:
+            # ordering=distance only makes sense together with near=
+            ordering = [term for term in ordering if term.lstrip('-') != 'distance'] or self.get_default_ordering(view)
+        return ordering
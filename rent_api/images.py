@@ -0,0 +1,357 @@
+"""
+Image pipeline for advertisement photos and profile pictures.
+
+In the request an upload is only validated, written to a staging directory
+and recorded as a pending StoredImage. Once the transaction commits, a
+small pool of worker threads decodes it once with Pillow, applies the EXIF
+orientation and drops the EXIF data (GPS position included), and encodes a
+WebP and a JPEG at each of WIDTHS up to the original's width, plus a
+blurhash placeholder. The variants are saved to the ``images`` storage
+(Cloudinary in production, the local filesystem in development and tests;
+see STORAGES), and their URLs are kept on the row, so serializers build a
+``srcset`` without asking the storage anything.
+
+With IN_PROCESS_WORKER off, the process_images command does the work. It
+also takes over images whose worker died (still processing after LEASE
+seconds) and, with --retry-failed, images that failed.
+"""
+import io
+import logging
+import math
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import storages
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from rent_add.models import RentAdvertisement
+from rent_api.cache import bump_version
+from rent_api.models import StoredImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Alias in STORAGES the variants are saved to
+    'STORAGE': 'images',
+    # Where uploads wait for the pipeline; MEDIA_ROOT/staging when unset
+    'STAGING_DIR': None,
+    'WIDTHS': (320, 640, 1280, 1920),
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    # Width of the variant serializers offer as ``thumbnail``
+    'THUMBNAIL_WIDTH': 640,
+    # Images with more pixels fail instead of being decoded
+    'MAX_PIXELS': 50_000_000,
+    'WORKERS': 2,
+    'IN_PROCESS_WORKER': True,
+    # Seconds an image may stay 'processing' before process_images takes it over
+    'LEASE': 600,
+    'MAX_ATTEMPTS': 3,
+}
+
+ENCODERS = {
+    'webp': ('WEBP', 'webp', {'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'optimize': True, 'progressive': True}),
+}
+
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'IMAGE_PIPELINE', {}).get(name, DEFAULTS[name])
+
+
+def get_storage():
+    return storages[get_setting('STORAGE')]
+
+
+def staging_dir():
+    return get_setting('STAGING_DIR') or os.path.join(settings.MEDIA_ROOT, 'staging')
+
+
+def stage(upload):
+    """Keep an uploaded file for the pipeline; returns its pending StoredImage."""
+    image = StoredImage.objects.create(staged_path=write_staged(upload))
+    schedule(image.pk)
+    return image
+
+
+def stage_many(uploads):
+    """stage() for several uploads, with one INSERT."""
+    stored = StoredImage.objects.bulk_create([StoredImage(staged_path=write_staged(upload)) for upload in uploads])
+    for image in stored:
+        schedule(image.pk)
+    return stored
+
+
+def write_staged(upload):
+    directory = staging_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{uuid.uuid4().hex}.upload')
+    if hasattr(upload, 'temporary_file_path'):
+        # Uploads over FILE_UPLOAD_MAX_MEMORY_SIZE were streamed to disk already
+        file_move_safe(upload.temporary_file_path(), path)
+    else:
+        with open(path, 'wb') as staged:
+            for chunk in upload.chunks():
+                staged.write(chunk)
+    return path
+
+
+def schedule(image_id):
+    """Hand an image to the worker pool once the current transaction commits."""
+    if get_setting('IN_PROCESS_WORKER'):
+        transaction.on_commit(lambda: get_executor().submit(_process_in_worker, image_id))
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(get_setting('WORKERS'), thread_name_prefix='image-pipeline')
+    return _executor
+
+
+def _process_in_worker(image_id):
+    try:
+        process(image_id)
+    except Exception:
+        logger.exception('Image pipeline failed on image %s', image_id)
+    finally:
+        # Pool threads outlive the request; don't leave their connections open
+        connections.close_all()
+
+
+def claimable(retry_failed=False):
+    stale = timezone.now() - timedelta(seconds=get_setting('LEASE'))
+    ready = Q(status='pending') | Q(status='processing', updated_at__lt=stale)
+    if retry_failed:
+        ready |= Q(status='failed', attempts__lt=get_setting('MAX_ATTEMPTS'))
+    return ready
+
+
+def process(image_id, retry_failed=False):
+    """Make and save the variants of one image; returns False if it wasn't there to take."""
+    # A conditional UPDATE, so an image is processed by one worker at a time
+    claimed = StoredImage.objects.filter(claimable(retry_failed), pk=image_id).update(
+        status='processing', attempts=F('attempts') + 1, updated_at=timezone.now()
+    )
+    if not claimed:
+        return False
+    image = StoredImage.objects.get(pk=image_id)
+    try:
+        with open(image.staged_path, 'rb') as staged:
+            width, height, blurhash, encoded = render(staged.read())
+        variants = save_variants(image.pk, encoded)
+    except Exception as exc:
+        logger.warning('Could not process image %s: %r', image.pk, exc)
+        StoredImage.objects.filter(pk=image.pk).update(
+            status='failed', last_error=repr(exc), updated_at=timezone.now()
+        )
+        bump_version(RentAdvertisement)
+        return True
+    updated = StoredImage.objects.filter(pk=image.pk).update(
+        status='ready', width=width, height=height, blurhash=blurhash, variants=variants,
+        staged_path='', last_error='', updated_at=timezone.now(),
+    )
+    if not updated:
+        # Deleted while it was being processed
+        delete_files(variants)
+    remove_staged(image.staged_path)
+    # update() sends no signal; cached ad responses carry the image's variants
+    bump_version(RentAdvertisement)
+    return True
+
+
+def render(data):
+    """
+    Decode an image once and encode every variant. Returns the width and
+    height of the largest variant, the blurhash, and a list of
+    {'width', 'height', 'format', 'content'} dicts, smallest first.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        if source.width * source.height > get_setting('MAX_PIXELS'):
+            raise ValueError(f'{source.width}x{source.height} pixels is more than MAX_PIXELS')
+        widest = max(get_setting('WIDTHS'))
+        if source.width > widest:
+            # JPEGs decode straight to a fraction of their size, as long as it stays wider than needed
+            source.draft('RGB', (widest, math.ceil(source.height * widest / source.width)))
+        image = flatten(ImageOps.exif_transpose(source))
+
+    width, height = image.size
+    variants = []
+    for variant_width in sorted({min(candidate, width) for candidate in get_setting('WIDTHS')}):
+        variant_height = max(1, round(height * variant_width / width))
+        resized = image if variant_width == width else image.resize(
+            (variant_width, variant_height), Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+        for format in get_setting('FORMATS'):
+            pil_format, _, options = ENCODERS[format]
+            buffer = io.BytesIO()
+            # Nothing from the source's info (EXIF, XMP, comments) is passed on
+            resized.save(buffer, pil_format, quality=get_setting('QUALITY'), **options)
+            variants.append({
+                'width': variant_width, 'height': variant_height, 'format': format, 'content': buffer.getvalue(),
+            })
+    return variants[-1]['width'], variants[-1]['height'], encode_blurhash(image), variants
+
+
+def flatten(image):
+    """RGB, with anything transparent put on white."""
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def save_variants(image_id, encoded):
+    storage = get_storage()
+    variants = []
+    try:
+        for variant in encoded:
+            _, extension, _ = ENCODERS[variant['format']]
+            name = storage.save(f"images/{image_id}/{variant['width']}.{extension}", ContentFile(variant['content']))
+            variants.append({
+                'width': variant['width'], 'height': variant['height'], 'format': variant['format'],
+                'name': name, 'url': storage.url(name),
+            })
+    except Exception:
+        delete_files(variants)
+        raise
+    return variants
+
+
+def delete_files(variants):
+    storage = get_storage()
+    for variant in variants:
+        # Synthetic images (rent_api/synthetic.py) point elsewhere and have no file
+        if not variant['name']:
+            continue
+        try:
+            storage.delete(variant['name'])
+        except Exception:
+            logger.warning('Could not delete image variant %s', variant['name'], exc_info=True)
+
+
+def remove_staged(path):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def process_pending(retry_failed=False):
+    """Process every image that is waiting; returns how many were taken."""
+    processed = 0
+    for image_id in StoredImage.objects.filter(claimable(retry_failed)).order_by('pk').values_list('pk', flat=True):
+        processed += process(image_id, retry_failed)
+    return processed
+
+
+def _base83(value, length):
+    return ''.join(BASE83[value // 83 ** (length - 1 - index) % 83] for index in range(length))
+
+
+def _to_linear(value):
+    value /= 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _to_srgb(value):
+    value = min(max(value, 0), 1)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+_LINEAR = [_to_linear(value) for value in range(256)]
+
+
+def encode_blurhash(image, x_components=4, y_components=3):
+    """The blurhash (https://blurha.sh) of an RGB image, from a 32 pixel wide copy."""
+    small = image.resize((32, max(1, round(32 * image.height / image.width))), Image.Resampling.BILINEAR)
+    width, height = small.size
+    pixels = [_LINEAR[value] for value in small.tobytes()]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == j == 0 else 2
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            red = green = blue = 0.0
+            for y in range(height):
+                cos_y = normalisation * math.cos(math.pi * j * y / height)
+                row = y * width * 3
+                for x in range(width):
+                    basis = cos_y * cos_x[x]
+                    offset = row + x * 3
+                    red += basis * pixels[offset]
+                    green += basis * pixels[offset + 1]
+                    blue += basis * pixels[offset + 2]
+            scale = 1 / (width * height)
+            factors.append((red * scale, green * scale, blue * scale))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = _base83(x_components - 1 + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_maximum = max(0, min(82, int(max(abs(value) for factor in ac for value in factor) * 166 - 0.5)))
+        maximum = (quantised_maximum + 1) / 166
+    else:
+        quantised_maximum, maximum = 0, 1
+    blurhash += _base83(quantised_maximum, 1)
+    blurhash += _base83((_to_srgb(dc[0]) << 16) + (_to_srgb(dc[1]) << 8) + _to_srgb(dc[2]), 4)
+    for factor in ac:
+        red, green, blue = (
+            max(0, min(18, int(math.copysign(abs(value / maximum) ** 0.5, value) * 9 + 9.5))) for value in factor
+        )
+        blurhash += _base83(red * 19 * 19 + green * 19 + blue, 2)
+    return blurhash
+
+
+def srcset(image, format):
+    """``'<url> <width>w, ...'`` over an image's variants in one format."""
+    if image is None:
+        return ''
+    return ', '.join(f"{variant['url']} {variant['width']}w" for variant in image.variants if variant['format'] == format)
+
+
+def variant_url(image, width=None, format='jpeg'):
+    """The narrowest variant at least ``width`` wide (the widest without one), or None."""
+    variants = [variant for variant in image.variants if variant['format'] == format] if image else []
+    for variant in variants:
+        if width and variant['width'] >= width:
+            return variant['url']
+    return variants[-1]['url'] if variants else None
+
+
+def representation(image, legacy=None):
+    """
+    What serializers show of an image: ``image`` is the largest JPEG, or the
+    URL of ``legacy``, a Cloudinary original uploaded before the pipeline.
+    """
+    legacy_url = getattr(legacy, 'url', None) if legacy else None
+    return {
+        'image': variant_url(image) or legacy_url,
+        'status': image.status if image else None,
+        'width': image.width if image else None,
+        'height': image.height if image else None,
+        'blurhash': image.blurhash if image else '',
+        'srcset': {format: srcset(image, format) for format in get_setting('FORMATS')},
+        'thumbnail': variant_url(image, get_setting('THUMBNAIL_WIDTH')) or legacy_url,
+    }
@@ -0,0 +1,87 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from rent_api import benchmark
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every GET route of the API routers (see rent_api/benchmark.py) through the test '
+        'client, or a running server with --url, and report latency percentiles, queries per request '
+        'and throughput. Fill the database with generate_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server, e.g. http://localhost:8000/')
+        parser.add_argument('--user', help='Email of the user to act as (by default an owner with many requests)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel requests (--url only)')
+        parser.add_argument('--only', help='Regular expression the endpoint names must match')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before each request (test client only)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare with the results in this JSON file')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='p95 slowdown, as a fraction, that counts as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = CustomUser.objects.filter(email=options['user']).first()
+        else:
+            user = benchmark.benchmark_user()
+        if user is None:
+            raise CommandError('No such user, or no approved ads to benchmark; run generate_data first')
+        if options['url']:
+            if options['cold']:
+                raise CommandError('--cold only works with the test client')
+            transport = benchmark.HttpTransport(options['url'], user)
+        else:
+            if options['concurrency'] > 1:
+                raise CommandError('--concurrency needs --url')
+            transport = benchmark.ClientTransport(user, cold=options['cold'])
+
+        self.stdout.write(f"{'endpoint':<58} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>7} {'req/s':>8}")
+        # The test client's host, and no sampled request logs in the middle of the table
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            API_PERFORMANCE={**getattr(settings, 'API_PERFORMANCE', {}), 'LOG_SAMPLE_RATE': 0},
+        ):
+            results = benchmark.run(
+                transport, user, repeat=options['repeat'], warmup=options['warmup'],
+                concurrency=options['concurrency'], only=options['only'], log=self.report,
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                rows = benchmark.compare(results, json.load(baseline), options['threshold'])
+            self.compare(rows)
+            regressed = [row['name'] for row in rows if row['regressed']]
+            if regressed and options['fail_on_regression']:
+                raise CommandError(f"{len(regressed)} endpoints regressed: {', '.join(regressed)}")
+
+    def report(self, result):
+        statuses = ','.join(str(status) for status in result['statuses'])
+        line = (
+            f"{result['name']:<58} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+            f"{result['queries'] if result['queries'] is not None else '-':>7} {result['throughput_rps']:>8.1f}"
+        )
+        if result['statuses'] != [200]:
+            line += f'  (HTTP {statuses})'
+        self.stdout.write(line)
+
+    def compare(self, rows):
+        self.stdout.write(f"\n{'endpoint':<58} {'p50 ms':>17} {'p95 ms':>17} {'queries':>13}")
+        for row in rows:
+            line = f"{row['name']:<58} " + ' '.join(
+                f'{before:>7} -> {after:<7}' for before, after in (row['p50_ms'], row['p95_ms'])
+            ) + f" {row['queries'][0]!s:>5} -> {row['queries'][1]!s:<5}"
+            self.stdout.write(self.style.ERROR(line) if row['regressed'] else line)
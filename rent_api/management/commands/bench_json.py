@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rent_api import benchmark, fast_json
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSONRenderer and JSONParser with FastJSONRenderer and FastJSONParser "
+        '(rent_api/fast_json.py) on an advertisement list page and on raw rows, and check they write '
+        'the same bytes. Fill the database with generate_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user to act as (by default an owner with many requests)')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = CustomUser.objects.filter(email=options['user']).first()
+        else:
+            user = benchmark.benchmark_user()
+        if user is None:
+            raise CommandError('No such user, or no approved ads to benchmark; run generate_data first')
+
+        backend = f'orjson {fast_json.orjson.__version__}' if fast_json.orjson else 'the standard library'
+        self.stdout.write(f'Fast classes are using {backend}')
+        results = benchmark.compare_json(benchmark.json_payloads(user, options['page_size']), options['repeat'])
+        self.stdout.write(f"{'payload':<20} {'bytes':>8} {'step':<7} {'drf ms':>8} {'fast ms':>8} {'drf MB/s':>9} {'fast MB/s':>9}")
+        for result in results:
+            for step in ('render', 'parse'):
+                self.stdout.write(
+                    f"{result['name']:<20} {result['bytes']:>8} {step:<7} {result[f'drf_{step}_ms']:>8.3f} "
+                    f"{result[f'fast_{step}_ms']:>8.3f} {result.get(f'drf_{step}_mb_s', '-'):>9} "
+                    f"{result.get(f'fast_{step}_mb_s', '-'):>9}"
+                )
+        different = [result['name'] for result in results if not (result['identical'] and result['parsed_identical'])]
+        if different:
+            raise CommandError(f"The fast classes give different results for: {', '.join(different)}")
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rent_api import benchmark
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the DRF serializers of the advertisement, message, notification and favorite lists against '
+        'their .values() fast paths (rent_api/values.py) on pages of rows, and check both render the same '
+        'JSON. Fill the database with generate_data first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user to act as (by default an owner with many requests)')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = CustomUser.objects.filter(email=options['user']).first()
+        else:
+            user = benchmark.benchmark_user()
+        if user is None:
+            raise CommandError('No such user, or no approved ads to benchmark; run generate_data first')
+
+        results = benchmark.compare_serializers(
+            user, page_size=options['page_size'], repeat=options['repeat'], warmup=options['warmup']
+        )
+        self.stdout.write(
+            f"{'list':<15} {'rows':>5} {'path':<7} {'fetch ms':>9} {'serialize ms':>13} {'queries':>8} {'speedup':>8}"
+        )
+        for result in results:
+            for path in ('drf', 'values'):
+                row = result[path]
+                speedup = f"{result['speedup']}x" if path == 'values' and result['speedup'] else ''
+                self.stdout.write(
+                    f"{result['name']:<15} {row['rows']:>5} {path:<7} {row['fetch_ms']:>9.3f} "
+                    f"{row['serialize_ms']:>13.3f} {row['queries']:>8} {speedup:>8}"
+                )
+        different = [result['name'] for result in results if not result['identical']]
+        if different:
+            raise CommandError(f"The fast path renders different JSON for: {', '.join(different)}")
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rent_add.models import RentAdvertisement
+from rent_api import query_plans
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot API queries and fail if any of them scans a whole table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the user whose pages to explain (default: any user)')
+        parser.add_argument('--advertisement', help='Advertisement id to explain (default: the newest live ad)')
+        parser.add_argument('--analyze', action='store_true', help='Run ANALYZE first')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan, not just failures')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.all()
+        user = users.filter(email=options['user']).first() if options['user'] else users.first()
+        advertisements = RentAdvertisement.objects.order_by('-created_at')
+        if options['advertisement']:
+            advertisement = advertisements.filter(pk=options['advertisement']).first()
+        else:
+            advertisement = advertisements.filter(status='approved', is_available=True).first()
+        if user is None or advertisement is None:
+            raise CommandError('Need at least one user and one advertisement to explain against')
+
+        if options['analyze']:
+            query_plans.analyze()
+
+        failures = []
+        for name, queryset in query_plans.hot_queries(user, advertisement).items():
+            tables, plan = query_plans.sequential_scans(queryset)
+            if tables:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: sequential scan on {', '.join(tables)}"))
+            else:
+                self.stdout.write(f'{name}: ok')
+            if tables or options['verbose_plans']:
+                self.stdout.write(plan)
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries fall back to sequential scans: {', '.join(failures)}")
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rent_api import synthetic
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with synthetic users, ads, images, reviews, favorites, rent requests, '
+        'messages and notifications for benchmarking (see rent_api/synthetic.py). The same --seed '
+        'gives the same data; each seed can be generated once per database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        for name, default in synthetic.DEFAULTS.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--skip-similar', action='store_true',
+                            help="Don't rebuild the similar-ads lists (run rebuild_similar_ads later)")
+
+    def handle(self, *args, **options):
+        if CustomUser.objects.filter(email=synthetic.email(options['seed'], 0)).exists():
+            raise CommandError(f"Seed {options['seed']} has already been generated here; pick another --seed")
+        started = time.perf_counter()
+        written = synthetic.generate(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            similar=not options['skip_similar'],
+            log=lambda message: self.stdout.write(f'{time.perf_counter() - started:7.1f}s  {message}'),
+            **{name: options[name] for name in synthetic.DEFAULTS},
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(written.values())} rows in {time.perf_counter() - started:.1f}s: '
+            + ', '.join(f'{count} {what}' for what, count in written.items())
+        ))
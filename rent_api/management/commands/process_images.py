@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from rent_api import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Make the variants of every uploaded image still waiting for them, including images '
+        'whose worker stopped part way; with --retry-failed also retry images that failed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        processed = images.process_pending(options['retry_failed'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} images in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f}/s)'
+        ))
@@ -1,3 +1,32 @@
 from django.db import models
 
-# Create your models here.
+
+class StoredImage(models.Model):
+    """An uploaded image and the sized variants rent_api/images.py made of it."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    # The upload as received, until the pipeline has made its variants
+    staged_path = models.CharField(max_length=500, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    blurhash = models.CharField(max_length=64, blank=True)
+    # [{'width', 'height', 'format', 'name', 'url'}, ...], smallest first
+    variants = models.JSONField(default=list, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='rent_api_image_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Image {self.pk} ({self.status})"
@@ -1,7 +1,232 @@
 # pagination.py
+import base64
+import json
+import operator
+from collections import OrderedDict
+from functools import reduce
+
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """Row estimate from the planner's statistics; exact count where there are none."""
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        # Django dumps each element of psycopg's parsed plan list, so this is the
+        # {"Plan": ...} object itself; the raw EXPLAIN output is a list around it
+        if isinstance(plan, list):
+            plan = plan[0]
+        return int(plan['Plan']['Plan Rows'])
+    return queryset.count()
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
 
 class CustomPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+    # ?count=estimated skips the exact COUNT(*) on large tables
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_estimated = request.query_params.get(self.count_query_param) == 'estimated'
+        if self.count_estimated:
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count_estimated:
+            response.data['count_estimated'] = True
+        return response
+
+
+class KeysetPagination(CustomPagination):
+    """
+    Cursor pagination over the queryset's ordering plus the primary key.
+
+    Pages are fetched with a WHERE on the last row's ordering values instead
+    of OFFSET, and no COUNT(*) is run, so deep pages cost the same as the
+    first one given an index on (ordering field, id). Clients opt in by
+    sending ``?cursor=`` (empty for the first page) and follow the
+    ``next``/``previous`` links; without it the view falls back to
+    ``fallback`` ('page' for page-number pagination, None for no pagination,
+    'cursor' for the first keyset page).
+    """
+    cursor_query_param = 'cursor'
+    max_cursor_page_size = 500
+    default_ordering = ('-created_at',)
+    fallback = 'page'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params and self.fallback != 'cursor':
+            if self.fallback == 'page':
+                return super().paginate_queryset(queryset, request, view)
+            self.keys = None
+            return None
+
+        self.keys = self.get_keys(queryset)
+        if self.keys is None:
+            # Ordered by something keyset can't compare (e.g. an extra() select)
+            return super().paginate_queryset(queryset, request, view)
+
+        if queryset._fields is not None:
+            # .values() rows (rent_api/values.py) only carry the fields asked for
+            queryset = queryset.values(*queryset._fields, *(
+                name for name, *_ in self.keys if name not in queryset._fields
+            ))
+
+        self.request = request
+        self.page_size = self.get_cursor_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.get_order_by(reverse))
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position, reverse))
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows:
+            if has_more or reverse:
+                self.next_position = self.get_position(rows[-1])
+            if (has_more and reverse) or (position is not None and not reverse):
+                self.previous_position = self.get_position(rows[0])
+        return rows
+
+    def get_paginated_response(self, data):
+        if getattr(self, 'keys', None) is None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_cursor_link(self.next_position, reverse=False)),
+            ('previous', self.get_cursor_link(self.previous_position, reverse=True)),
+            ('results', data),
+        ]))
+
+    def get_cursor_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_cursor_page_size)
+
+    def get_keys(self, queryset):
+        """(name, descending, nullable, field) for each ordering term, pk last."""
+        ordering = list(queryset.query.order_by) or list(self.default_ordering)
+        model = queryset.model
+        keys = []
+        for term in ordering:
+            if not isinstance(term, str):
+                return None
+            name = term.lstrip('-')
+            if name in ('pk', model._meta.pk.name):
+                field = model._meta.pk
+                name = 'pk'
+            elif name in queryset.query.annotations:
+                field = queryset.query.annotations[name].output_field
+            else:
+                try:
+                    field = model._meta.get_field(name)
+                except Exception:
+                    return None
+                if field.is_relation or '__' in name:
+                    return None
+            keys.append((name, term.startswith('-'), getattr(field, 'null', False), field))
+        if keys[-1][0] != 'pk':
+            keys.append(('pk', keys[-1][1], False, model._meta.pk))
+        return keys
+
+    def get_order_by(self, reverse):
+        order_by = []
+        for name, descending, nullable, _ in self.keys:
+            # Pin NULL placement (last going forward) so it doesn't depend on
+            # the database; non-null keys keep a plain ORDER BY for the index.
+            nulls = {}
+            if nullable:
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+            if descending != reverse:
+                order_by.append(F(name).desc(**nulls))
+            else:
+                order_by.append(F(name).asc(**nulls))
+        return order_by
+
+    def get_position_filter(self, position, reverse):
+        # Rows strictly past the position in (possibly reversed) ordering:
+        # (k1 past v1) OR (k1 = v1 AND k2 past v2) OR ...
+        conditions = []
+        equal_so_far = Q()
+        for (name, descending, nullable, _), value in zip(self.keys, position):
+            past = self.get_past_condition(name, descending, nullable, value, reverse)
+            if past is not None:
+                conditions.append(equal_so_far & past)
+            equal_so_far &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return reduce(operator.or_, conditions)
+
+    def get_past_condition(self, name, descending, nullable, value, reverse):
+        if value is None:
+            # NULLs sort last, so only going backwards leaves rows past them
+            return Q(**{f'{name}__isnull': False}) if reverse else None
+        lookup = 'lt' if descending != reverse else 'gt'
+        past = Q(**{f'{name}__{lookup}': value})
+        if nullable and not reverse:
+            past |= Q(**{f'{name}__isnull': True})
+        return past
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name, *_ in self.keys]
+        return [getattr(row, name) for name, *_ in self.keys]
+
+    def encode_cursor(self, position, reverse):
+        values = [None if value is None else str(value) for value in position]
+        payload = json.dumps({'p': values, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values = payload['p']
+            if len(values) != len(self.keys):
+                raise ValueError
+            position = [
+                None if value is None else field.to_python(value)
+                for value, (_, _, _, field) in zip(values, self.keys)
+            ]
+            return position, bool(payload['r'])
+        except Exception:
+            raise NotFound('Invalid cursor.')
+
+    def get_cursor_link(self, position, reverse):
+        if position is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
+
+class OptionalKeysetPagination(KeysetPagination):
+    """Keyset pages on request for endpoints that have always returned a plain list."""
+    fallback = None
+
+
+class StrictKeysetPagination(KeysetPagination):
+    """Keyset pages only, for endpoints with no page-number clients to keep working."""
+    fallback = 'cursor'
+
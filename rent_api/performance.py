@@ -0,0 +1,323 @@
+"""
+Per-request performance accounting.
+
+PerformanceMiddleware times each request and, through a database
+execute_wrapper, counts its queries, their time and how often each query
+shape (the SQL with IN lists collapsed) repeats; a shape run many times in
+one request is usually an N+1. Views using PerformanceMixin also report the
+time spent turning objects into response data, and the queries run while
+doing it. The numbers go out in a Server-Timing header, in a JSON log line
+for a sample of requests (and for every slow or over-budget one), and into
+rolling per-route windows that ``summary()`` turns into percentiles for the
+/api/v1/_perf/ endpoint. A route is the view and action, such as
+``RentAdvertisementViewSet.list``. Under ASGI, where queries run on other
+threads' connections, only time is counted.
+
+Windows are buffered per process and merged into the cache every
+FLUSH_INTERVAL seconds. Merges from different processes can race and drop a
+batch, which costs a few samples, not correctness.
+
+A request over its query budget (QUERY_BUDGETS[route], else QUERY_BUDGET)
+logs a warning, or with BUDGET_ACTION 'raise' fails with
+QueryBudgetExceeded, which is meant for test runs.
+"""
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'api-perf'
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'CACHE': 'default',
+    # Share of requests logged; slow and over-budget requests always are
+    'LOG_SAMPLE_RATE': 0.01,
+    'SLOW_REQUEST_MS': 1000,
+    # Queries allowed per request, by route and otherwise (None for no limit)
+    'QUERY_BUDGETS': {},
+    'QUERY_BUDGET': 50,
+    # 'warn' or 'raise'
+    'BUDGET_ACTION': 'warn',
+    # Query shapes repeated this often in one request are logged
+    'DUPLICATE_THRESHOLD': 3,
+    # Samples kept per route
+    'WINDOW': 1000,
+    'FLUSH_INTERVAL': 10,
+    'TIMEOUT': 24 * 60 * 60,
+}
+
+# "IN (%s, %s, %s)" and "IN (%s)" are the same query
+IN_LIST = re.compile(r'\((?:%s, )*%s\)')
+
+_lock = threading.Lock()
+_pending = defaultdict(list)
+_last_flush = time.monotonic()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def get_setting(name):
+    return getattr(settings, 'API_PERFORMANCE', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting('CACHE')]
+
+
+def _samples_key(route):
+    return f'{KEY_PREFIX}:samples:{route}'
+
+
+def fingerprint(sql):
+    return IN_LIST.sub('(...)', sql)
+
+
+def route_name(view_func, method):
+    view = getattr(view_func, 'cls', view_func)
+    # Viewsets map methods to actions; plain views are named by method
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view.__name__}.{actions.get(method.lower(), method.lower())}'
+
+
+def query_budget(route):
+    budgets = get_setting('QUERY_BUDGETS')
+    return budgets[route] if route in budgets else get_setting('QUERY_BUDGET')
+
+
+class Recorder:
+    """What one request spent; installed as an execute_wrapper on every connection."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.route = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.shapes = Counter()
+        self.serializer_time = 0.0
+        self.serializer_queries = 0
+        self._serializing = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[fingerprint(sql)] += 1
+            if self._serializing:
+                self.serializer_queries += 1
+
+    def serializing(self, function):
+        @wraps(function)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            self._serializing += 1
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._serializing -= 1
+                if not self._serializing:
+                    self.serializer_time += time.perf_counter() - started
+        return timed
+
+    def duplicates(self):
+        threshold = get_setting('DUPLICATE_THRESHOLD')
+        return [
+            {'sql': sql, 'count': count}
+            for sql, count in self.shapes.most_common() if count >= threshold
+        ]
+
+    def server_timing(self, total):
+        metrics = [
+            f'app;dur={total * 1000:.1f}',
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+        ]
+        if self.serializer_time:
+            metrics.append(f'serialize;dur={self.serializer_time * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not get_setting('ENABLED'):
+            return self.get_response(request)
+        recorder = request.performance = Recorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        # Queries run on other threads' connections here, so only time is counted
+        if not get_setting('ENABLED'):
+            return await self.get_response(request)
+        recorder = request.performance = Recorder()
+        response = await self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        recorder = getattr(request, 'performance', None)
+        if recorder is not None:
+            recorder.route = route_name(view_func, request.method)
+
+    def finish(self, request, response, recorder):
+        total = time.perf_counter() - recorder.started
+        if get_setting('SERVER_TIMING'):
+            response['Server-Timing'] = recorder.server_timing(total)
+        if recorder.route is not None:
+            report(request, response, recorder, total)
+        return response
+
+
+class PerformanceMixin:
+    """Count the time a view spends producing response data as serializer time."""
+
+    def get_serializer(self, *args, **kwargs):
+        return self.time_serializer(super().get_serializer(*args, **kwargs))
+
+    def get_values_serializer(self, *args, **kwargs):
+        # Lists served from .values() rows (rent_api/values.py)
+        return self.time_serializer(super().get_values_serializer(*args, **kwargs))
+
+    def time_serializer(self, serializer):
+        recorder = getattr(self.request, 'performance', None)
+        if recorder is not None:
+            # .data calls self.to_representation, so the instance attribute wins
+            serializer.to_representation = recorder.serializing(serializer.to_representation)
+        return serializer
+
+
+def report(request, response, recorder, total):
+    duration = total * 1000
+    budget = query_budget(recorder.route)
+    over_budget = budget is not None and recorder.queries > budget
+    record(recorder.route, (
+        duration, recorder.queries, recorder.sql_time * 1000, recorder.serializer_time * 1000, over_budget,
+    ))
+
+    if over_budget or duration >= get_setting('SLOW_REQUEST_MS') or random.random() < get_setting('LOG_SAMPLE_RATE'):
+        entry = json.dumps({
+            'route': recorder.route,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration, 1),
+            'queries': recorder.queries,
+            'sql_ms': round(recorder.sql_time * 1000, 1),
+            'serializer_ms': round(recorder.serializer_time * 1000, 1),
+            'serializer_queries': recorder.serializer_queries,
+            'query_budget': budget,
+            'duplicates': recorder.duplicates()[:5],
+        })
+        if over_budget:
+            logger.warning(entry)
+        else:
+            logger.info(entry)
+
+    if over_budget and get_setting('BUDGET_ACTION') == 'raise':
+        raise QueryBudgetExceeded(
+            f'{recorder.route} ran {recorder.queries} queries, over its budget of {budget}: {recorder.duplicates()}'
+        )
+
+
+def record(route, sample):
+    """Add (duration ms, queries, SQL ms, serializer ms, over budget) to the route's window."""
+    with _lock:
+        _pending[route].append(sample)
+        due = time.monotonic() - _last_flush >= get_setting('FLUSH_INTERVAL')
+    if due:
+        flush()
+
+
+def flush():
+    """Merge this process's samples into the cached windows."""
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, defaultdict(list)
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+    cache = get_cache()
+    window = get_setting('WINDOW')
+    timeout = get_setting('TIMEOUT')
+    stored = cache.get_many([_samples_key(route) for route in pending])
+    cache.set_many({
+        _samples_key(route): (stored.get(_samples_key(route), []) + samples)[-window:]
+        for route, samples in pending.items()
+    }, timeout)
+    routes = cache.get(f'{KEY_PREFIX}:routes', set())
+    if not routes.issuperset(pending):
+        cache.set(f'{KEY_PREFIX}:routes', routes | set(pending), timeout)
+
+
+def reset():
+    global _pending
+    with _lock:
+        _pending = defaultdict(list)
+    cache = get_cache()
+    routes = cache.get(f'{KEY_PREFIX}:routes', set())
+    cache.delete_many([_samples_key(route) for route in routes] + [f'{KEY_PREFIX}:routes'])
+
+
+def percentile(ordered, fraction):
+    # Nearest rank
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+
+def summary():
+    """Per-route percentiles over the rolling windows, slowest p95 first."""
+    flush()
+    cache = get_cache()
+    routes = cache.get(f'{KEY_PREFIX}:routes', set())
+    stored = cache.get_many([_samples_key(route) for route in routes])
+    rows = []
+    for route in routes:
+        samples = stored.get(_samples_key(route))
+        if not samples:
+            continue
+        durations, queries, sql_times, serializer_times, over_budget = map(sorted, zip(*samples))
+        rows.append({
+            'route': route,
+            'count': len(samples),
+            'p50_ms': round(percentile(durations, 0.5), 1),
+            'p95_ms': round(percentile(durations, 0.95), 1),
+            'p99_ms': round(percentile(durations, 0.99), 1),
+            'queries_p50': percentile(queries, 0.5),
+            'queries_p95': percentile(queries, 0.95),
+            'queries_max': queries[-1],
+            'sql_p95_ms': round(percentile(sql_times, 0.95), 1),
+            'serializer_p95_ms': round(percentile(serializer_times, 0.95), 1),
+            'over_budget': sum(over_budget),
+            'query_budget': query_budget(route),
+        })
+    return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
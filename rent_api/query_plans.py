@@ -0,0 +1,63 @@
+"""
+EXPLAIN harness for the API's hot queries.
+
+``hot_queries()`` lists the queries behind the busiest endpoints, and
+``sequential_scans()`` reads the database's plan for one of them and returns
+the tables it scans in full. The index set these rely on is declared on the
+models (see RentAdvertisement.Meta, Notification.Meta, ...). Run
+``manage.py explain_hot_queries`` to check a live database; rent_api/tests.py
+checks a seeded one.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+
+from rent_add.models import RentAdvertisement, RentRequest, Review
+from rent_user.models import Message, Notification
+
+PAGE = 21
+
+# PostgreSQL: "Seq Scan on rent_add_rentadvertisement"
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+# SQLite: "SCAN rent_add_rentadvertisement" without USING INDEX / PRIMARY KEY
+SQLITE_SCAN = re.compile(r'\bSCAN (\w+)(.*)')
+
+
+def hot_queries(user, advertisement):
+    """Hot querysets keyed by name, for the given user's and ad's pages."""
+    live = RentAdvertisement.objects.filter(status='approved', is_available=True)
+    return {
+        'advertisement_list': live.order_by('-created_at', '-id')[:PAGE],
+        'category_advertisements': live.filter(category=advertisement.category_id).order_by('-created_at')[:PAGE],
+        'owner_advertisements': RentAdvertisement.objects.filter(owner=user).order_by('-created_at')[:PAGE],
+        'notifications': Notification.objects.filter(user=user).order_by('-created_at', '-id')[:PAGE],
+        'unread_notifications': Notification.objects.filter(user=user, is_read=False).order_by('-created_at')[:PAGE],
+        'messages': Message.objects.filter(Q(sender=user) | Q(recipient=user)).order_by('-created_at', '-id')[:PAGE],
+        'user_rent_requests': RentRequest.objects.filter(user=user).order_by('-created_at')[:PAGE],
+        'accepted_rent_request': RentRequest.objects.filter(advertisement=advertisement, status='accepted'),
+        'advertisement_reviews': Review.objects.filter(advertisement=advertisement).order_by('-created_at')[:PAGE],
+        'user_reviews': Review.objects.filter(user=user).order_by('-created_at')[:PAGE],
+    }
+
+
+def analyze(using='default'):
+    """Refresh planner statistics so plans reflect the current data."""
+    with connections[using].cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def sequential_scans(queryset):
+    """Tables the queryset's plan reads in full, and the plan itself."""
+    vendor = connections[queryset.db].vendor
+    plan = queryset.explain()
+    if vendor == 'postgresql':
+        return POSTGRES_SEQ_SCAN.findall(plan), plan
+    if vendor == 'sqlite':
+        tables = []
+        for match in SQLITE_SCAN.finditer(plan):
+            table, rest = match.groups()
+            if 'USING' not in rest and table != 'CONSTANT':
+                tables.append(table)
+        return tables, plan
+    return [], plan
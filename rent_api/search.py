@@ -0,0 +1,105 @@
+"""
+Full-text search for advertisements.
+
+The backend is picked from the database vendor: PostgreSQL uses the
+``search_vector`` tsvector column (GIN indexed), SQLite uses the FTS5 table
+kept in sync by triggers, and anything else falls back to the ``icontains``
+lookups DRF's SearchFilter would run. All backends annotate matching rows
+with ``search_rank`` so results can be sorted by relevance.
+Both indexes are defined in rent_add/search_index.py.
+"""
+import operator
+import re
+from functools import reduce
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from rent_add.search_index import TABLE, FTS_TABLE
+SEARCH_FIELDS = ['title', 'description', 'location']
+
+
+def tokenize(terms):
+    # Only word characters reach the query syntax, so user input can't inject operators
+    return [token.lower() for term in terms for token in re.findall(r'\w+', term)]
+
+
+class IcontainsSearchBackend:
+    """Unindexed fallback with the same semantics as DRF's SearchFilter."""
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(
+                reduce(operator.or_, (Q(**{f'{field}__icontains': term}) for field in SEARCH_FIELDS))
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class PostgresSearchBackend:
+    config = 'english'
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset.none()
+        # Every token must match, the last one as a prefix ("dha" finds "dhaka")
+        query = ' & '.join(tokens[:-1] + [f'{tokens[-1]}:*'])
+        match = RawSQL(
+            f'"{TABLE}"."search_vector" @@ to_tsquery(%s::regconfig, %s)',
+            [self.config, query],
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f'ts_rank_cd("{TABLE}"."search_vector", to_tsquery(%s::regconfig, %s))',
+            [self.config, query],
+            output_field=FloatField(),
+        )
+        return queryset.filter(match).annotate(search_rank=rank)
+
+
+class SQLiteSearchBackend:
+    # bm25 column weights: title, description, location
+    weights = (10.0, 1.0, 5.0)
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset.none()
+        query = ' '.join(f'"{token}"*' for token in tokens)
+        # Join the FTS table on rowid so MATCH drives the query and bm25() is
+        # computed once per hit; it is lower-is-better, so negate it to sort
+        # like PostgreSQL's ranks.
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'"{FTS_TABLE}".rowid = "{TABLE}".rowid', f'"{FTS_TABLE}" MATCH %s'],
+            params=[query],
+            select={'search_rank': f'-bm25("{FTS_TABLE}", {weights})'},
+        )
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    backend_path = getattr(settings, 'ADVERTISEMENT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return BACKENDS.get(connections[using].vendor, IcontainsSearchBackend)()
+
+
+class AdvertisementSearchFilter(filters.SearchFilter):
+    """Drop-in replacement for SearchFilter backed by the full-text index."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend(queryset.db).search(queryset, terms)
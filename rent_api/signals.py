@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from rent_add.models import RentAdvertisement, AdvertisementImage, Review
+from rent_type.models import Category, Amenity
+from rent_api import images
+from rent_api.cache import bump_version
+from rent_api.models import StoredImage
+from users.models import CustomUser
+
+
+# Any change to a model a cached response is built from invalidates that model's
+# cached responses. Images and reviews are only ever shown as part of an ad.
+CACHE_DEPENDENCIES = {
+    RentAdvertisement: RentAdvertisement,
+    AdvertisementImage: RentAdvertisement,
+    Review: RentAdvertisement,
+    Category: Category,
+    Amenity: Amenity,
+}
+# What ads show of their owner (rent_user.serializers.UserSerializer)
+OWNER_FIELDS = {'email', 'first_name', 'last_name'}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_responses(sender, **kwargs):
+    model = CACHE_DEPENDENCIES.get(sender)
+    if model is not None:
+        bump_version(model)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_advertisement_owners(sender, update_fields=None, **kwargs):
+    # Logins save last_login alone, and shouldn't empty the ad caches
+    if update_fields and not OWNER_FIELDS.intersection(update_fields):
+        return
+    bump_version(CustomUser)
+
+
+@receiver(m2m_changed, sender=RentAdvertisement.amenities.through)
+def invalidate_advertisement_amenities(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_version(RentAdvertisement)
+
+
+@receiver(post_delete, sender=AdvertisementImage)
+def delete_stored_image(sender, instance, **kwargs):
+    if instance.stored_image_id is not None:
+        StoredImage.objects.filter(pk=instance.stored_image_id).delete()
+
+
+@receiver(post_delete, sender=StoredImage)
+def delete_image_files(sender, instance, **kwargs):
+    variants, staged_path = instance.variants, instance.staged_path
+
+    def delete_files():
+        images.delete_files(variants)
+        images.remove_staged(staged_path)
+    transaction.on_commit(delete_files)
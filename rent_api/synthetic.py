@@ -0,0 +1,282 @@
+"""
+Synthetic data for benchmarks (the generate_data command).
+
+``generate()`` writes users, ads with amenities and images, reviews,
+favorites, rent requests, messages and notifications with bulk_create, a
+batch at a time, from a seeded random generator, so equal arguments give
+equal volumes and shapes. bulk_create sends no signals, so afterwards it
+rebuilds what they would have maintained, using the same helpers as the
+repair commands: primary images, rating and favorite counters, the daily
+statistics, conversations, inbox counters and the similar-ads lists.
+
+Images are StoredImage rows marked ready, with variants pointing at a
+placeholder service instead of files in storage. Every user gets the same
+password, PASSWORD, so a benchmark can also log in over HTTP.
+"""
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from rent_add import counters, primary_images, similarity, statistics
+from rent_add.models import (
+    AdvertisementImage, FavoriteAdvertisement, RentAdvertisement, RentRequest, Review,
+)
+from rent_api.cache import bump_version
+from rent_api.models import StoredImage
+from rent_type.models import Amenity, Category
+from rent_user import conversations, inbox
+from rent_user.models import Message, Notification
+from users.models import CustomUser
+
+PASSWORD = 'bench-pass-123'
+PLACEHOLDER_URL = 'https://placehold.co/{width}x{height}.{extension}'
+
+WORDS = [
+    'sunny', 'quiet', 'spacious', 'furnished', 'family', 'studio', 'duplex', 'penthouse',
+    'balcony', 'garden', 'parking', 'lift', 'generator', 'rooftop', 'lake', 'market',
+    'school', 'hospital', 'mosque', 'park', 'corner', 'renovated', 'modern', 'cozy',
+]
+LOCATIONS = {
+    'Gulshan': (23.7925, 90.4078), 'Banani': (23.7937, 90.4066), 'Dhanmondi': (23.7461, 90.3742),
+    'Uttara': (23.8759, 90.3795), 'Mirpur': (23.8223, 90.3654), 'Mohammadpur': (23.7662, 90.3589),
+    'Bashundhara': (23.8193, 90.4526), 'Motijheel': (23.7330, 90.4172),
+}
+CATEGORIES = ['Apartment', 'Family flat', 'Bachelor flat', 'Sublet', 'Studio', 'Office space', 'Duplex', 'Hostel']
+AMENITIES = [
+    'Lift', 'Generator', 'Parking', 'Gas', 'Security guard', 'CCTV', 'Rooftop', 'Balcony',
+    'Furnished', 'Air conditioning', 'Water heater', 'Internet', 'Gym', 'Swimming pool',
+]
+# Weights of each ad status
+STATUSES = {'approved': 70, 'pending': 15, 'rented': 8, 'rejected': 4, 'expired': 3}
+VARIANT_WIDTHS = (320, 640, 1280)
+
+DEFAULTS = {
+    'users': 1000,
+    'advertisements': 5000,
+    'images_per_ad': 3,
+    'reviews': 10000,
+    'favorites': 10000,
+    'rent_requests': 10000,
+    'messages': 20000,
+    'notifications': 50000,
+}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def insert(model, objects, batch_size):
+    """bulk_create a batch at a time; returns the saved objects' primary keys."""
+    pks = []
+    for batch in batched(objects, batch_size):
+        with transaction.atomic():
+            pks += [obj.pk for obj in model.objects.bulk_create(batch)]
+    return pks
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+def unique_pairs(rng, count, left, right):
+    """Up to ``count`` distinct (left, right) pairs, drawn at random, in drawing order."""
+    pairs = {}
+    # Dense requests can't always be met; give up after a fair number of tries
+    for _ in range(count * 3):
+        if len(pairs) >= count:
+            break
+        pairs.setdefault((rng.choice(left), rng.choice(right)))
+    return list(pairs)
+
+
+def email(seed, index):
+    return f'bench-{seed}-{index}@example.com'
+
+
+def generate(seed=42, batch_size=2000, similar=True, log=lambda message: None, **counts):
+    """
+    Write the data set for ``seed``; returns {what: rows written}. Each seed
+    can be generated once per database, since ids come from the seed too.
+    """
+    counts = {**DEFAULTS, **counts}
+    rng = random.Random(seed)
+
+    def new_id():
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+    now = timezone.now()
+    written = {}
+
+    password = make_password(PASSWORD)
+    user_ids = insert(CustomUser, (
+        CustomUser(
+            id=new_id(), email=email(seed, index), password=password, first_name='Bench',
+            last_name=f'User {index}', phone_number=f'+8801{rng.randrange(10 ** 9):09d}',
+        )
+        for index in range(counts['users'])
+    ), batch_size)
+    written['users'] = len(user_ids)
+    log(f'{len(user_ids)} users')
+    # About one user in five lists places
+    owner_ids = user_ids[:max(1, len(user_ids) // 5)]
+
+    existing = set(Category.objects.values_list('name', flat=True))
+    Category.objects.bulk_create([Category(name=name) for name in CATEGORIES if name not in existing])
+    category_ids = list(Category.objects.order_by('pk').values_list('pk', flat=True))
+    existing = set(Amenity.objects.values_list('name', flat=True))
+    Amenity.objects.bulk_create([Amenity(name=name) for name in AMENITIES if name not in existing])
+    amenity_ids = list(Amenity.objects.order_by('pk').values_list('pk', flat=True))
+
+    def advertisements():
+        statuses, weights = zip(*STATUSES.items())
+        for _ in range(counts['advertisements']):
+            area, (latitude, longitude) = rng.choice(list(LOCATIONS.items()))
+            advertisement = RentAdvertisement(
+                id=new_id(),
+                title=f'{sentence(rng, 3).capitalize()} in {area}',
+                description=sentence(rng, rng.randint(20, 80)),
+                price=Decimal(rng.randrange(5000, 150000, 500)),
+                location=f'{area}, Dhaka',
+                latitude=Decimal(f'{latitude + rng.uniform(-0.02, 0.02):.6f}'),
+                longitude=Decimal(f'{longitude + rng.uniform(-0.02, 0.02):.6f}'),
+                area=Decimal(rng.randrange(400, 3000, 50)),
+                bedrooms=rng.randint(1, 5),
+                bathrooms=rng.randint(1, 4),
+                category_id=rng.choice(category_ids),
+                owner_id=rng.choice(owner_ids),
+                status=rng.choices(statuses, weights)[0],
+                is_available=rng.random() < 0.9,
+                available_from=(now + timedelta(days=rng.randint(0, 90))).date(),
+                minimum_lease=rng.choice([6, 12, 24]),
+                deposit=Decimal(rng.randrange(0, 300000, 5000)),
+                views_count=int(rng.paretovariate(1.5) * 10),
+            )
+            # save() isn't called, so derive what it would
+            advertisement.geohash = advertisement.compute_geohash()
+            yield advertisement
+
+    advertisement_ids = insert(RentAdvertisement, advertisements(), batch_size)
+    written['advertisements'] = len(advertisement_ids)
+    log(f'{len(advertisement_ids)} advertisements')
+
+    through = RentAdvertisement.amenities.through
+    written['amenity links'] = len(insert(through, (
+        through(rentadvertisement_id=advertisement_id, amenity_id=amenity_id)
+        for advertisement_id in advertisement_ids
+        for amenity_id in rng.sample(amenity_ids, rng.randint(0, min(6, len(amenity_ids))))
+    ), batch_size))
+
+    def stored_image():
+        height_ratio = rng.choice([0.75, 0.5625, 0.6667])
+        variants = [
+            {
+                'width': width, 'height': round(width * height_ratio), 'format': format, 'name': '',
+                'url': PLACEHOLDER_URL.format(width=width, height=round(width * height_ratio), extension=extension),
+            }
+            for format, extension in (('webp', 'webp'), ('jpeg', 'jpg'))
+            for width in VARIANT_WIDTHS
+        ]
+        return StoredImage(
+            status='ready', width=VARIANT_WIDTHS[-1], height=round(VARIANT_WIDTHS[-1] * height_ratio),
+            blurhash='LEHV6nWB2yk8pyo0adR*.7kCMdnj', variants=variants,
+        )
+
+    images = 0
+    for batch in batched(advertisement_ids, max(1, batch_size // max(1, counts['images_per_ad']))):
+        per_ad = [(advertisement_id, rng.randint(0, counts['images_per_ad'])) for advertisement_id in batch]
+        with transaction.atomic():
+            stored = iter(StoredImage.objects.bulk_create([stored_image() for _, count in per_ad for _ in range(count)]))
+            AdvertisementImage.objects.bulk_create([
+                AdvertisementImage(advertisement_id=advertisement_id, stored_image=next(stored), is_primary=index == 0)
+                for advertisement_id, count in per_ad
+                for index in range(count)
+            ])
+        images += sum(count for _, count in per_ad)
+    written['images'] = images
+    log(f'{images} images')
+
+    review_pairs = unique_pairs(rng, counts['reviews'], advertisement_ids, user_ids)
+    written['reviews'] = len(insert(Review, (
+        Review(
+            advertisement_id=advertisement_id, user_id=user_id, rating=rng.choices(range(1, 6), [1, 1, 3, 6, 5])[0],
+            comment=sentence(rng, rng.randint(5, 30)), is_verified=rng.random() < 0.3,
+        )
+        for advertisement_id, user_id in review_pairs
+    ), batch_size))
+
+    favorite_pairs = unique_pairs(rng, counts['favorites'], user_ids, advertisement_ids)
+    written['favorites'] = len(insert(FavoriteAdvertisement, (
+        FavoriteAdvertisement(user_id=user_id, advertisement_id=advertisement_id)
+        for user_id, advertisement_id in favorite_pairs
+    ), batch_size))
+    log(f"{written['reviews']} reviews, {written['favorites']} favorites")
+
+    accepted = set()
+
+    def rent_requests():
+        for advertisement_id, user_id in unique_pairs(rng, counts['rent_requests'], advertisement_ids, user_ids):
+            status = rng.choices(['pending', 'rejected', 'cancelled', 'accepted'], [60, 20, 10, 10])[0]
+            if status == 'accepted':
+                # At most one accepted request per ad
+                if advertisement_id in accepted:
+                    status = 'rejected'
+                accepted.add(advertisement_id)
+            yield RentRequest(
+                id=new_id(), advertisement_id=advertisement_id, user_id=user_id, message=sentence(rng, 12), status=status,
+                move_in_date=(now + timedelta(days=rng.randint(7, 120))).date(),
+                lease_duration=rng.choice([6, 12, 24]),
+            )
+
+    request_ids = insert(RentRequest, rent_requests(), batch_size)
+    written['rent requests'] = len(request_ids)
+
+    owners = dict(RentAdvertisement.objects.filter(pk__in=advertisement_ids).values_list('pk', 'owner_id'))
+
+    def messages():
+        for _ in range(counts['messages']):
+            advertisement_id = rng.choice(advertisement_ids)
+            owner_id, renter_id = owners[advertisement_id], rng.choice(user_ids)
+            if owner_id == renter_id:
+                continue
+            sender_id, recipient_id = (owner_id, renter_id) if rng.random() < 0.4 else (renter_id, owner_id)
+            yield Message(
+                sender_id=sender_id, recipient_id=recipient_id, advertisement_id=advertisement_id,
+                subject=sentence(rng, 4), content=sentence(rng, rng.randint(5, 40)), is_read=rng.random() < 0.6,
+            )
+
+    written['messages'] = len(insert(Message, messages(), batch_size))
+    log(f"{written['rent requests']} rent requests, {written['messages']} messages")
+
+    types = [notification_type for notification_type, _ in Notification.NOTIFICATION_TYPES]
+    written['notifications'] = len(insert(Notification, (
+        Notification(
+            user_id=rng.choice(user_ids), notification_type=rng.choice(types), message=sentence(rng, 10),
+            related_advertisement_id=rng.choice(advertisement_ids) if advertisement_ids else None,
+            is_read=rng.random() < 0.7,
+        )
+        for _ in range(counts['notifications'])
+    ), batch_size))
+    log(f"{written['notifications']} notifications")
+
+    # What the signals would have kept up to date
+    for batch in batched(advertisement_ids, batch_size):
+        primary_images.refresh(batch)
+    counters.reconcile(batch_size=batch_size)
+    statistics.rebuild()
+    conversations.backfill(batch_size=batch_size)
+    inbox.rebuild(batch_size=batch_size)
+    if similar:
+        log('Rebuilding similar ads')
+        similarity.rebuild()
+    for model in (RentAdvertisement, AdvertisementImage, Review, RentRequest, Category, Amenity):
+        bump_version(model)
+    return written
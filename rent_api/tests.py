@@ -1,3 +1,611 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import uuid
+import zoneinfo
+from collections import OrderedDict
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from users.models import CustomUser
+from rent_type.models import Category
+from rent_add.models import AdvertisementImage, RentAdvertisement, RentRequest, Review
+from rent_add import transfer
+from rent_add.serializers import AdvertisementImageSerializer, RentAdvertisementListSerializer
+from rent_user.models import Message, Notification
+from rent_user.serializers import MessageSerializer
+from rent_api import benchmark, exports, fast_json, images, performance, query_plans, synthetic
+from rent_api import cache as response_cache
+from rent_api.models import StoredImage
+
+
+def clear_caches():
+    for each in caches.all():
+        each.clear()
+
+
+class HotQueryPlanTests(TestCase):
+    """Every hot query must be answered from an index on a realistically sized table."""
+    users = 40
+    advertisements = 4000
+    rows_per_user = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(8)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(email=f'user{index}@example.com') for index in range(cls.users)
+        ])
+        categories = Category.objects.bulk_create([Category(name=f'Category {index}') for index in range(10)])
+        statuses = ['approved'] * 2 + ['pending', 'rejected', 'rented']
+        ads = RentAdvertisement.objects.bulk_create([
+            RentAdvertisement(
+                title=f'Flat {index}', description='A flat', location='Dhaka', price=1000, bedrooms=2,
+                bathrooms=1, owner=rng.choice(users), category=rng.choice(categories),
+                status=rng.choice(statuses), is_available=rng.random() < 0.8,
+            )
+            for index in range(cls.advertisements)
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=user, notification_type='message', message='Hi', is_read=rng.random() < 0.7)
+            for user in users for _ in range(cls.rows_per_user)
+        ])
+        Message.objects.bulk_create([
+            Message(sender=user, recipient=rng.choice(users), subject='Hi', content='Hi')
+            for user in users for _ in range(cls.rows_per_user)
+        ])
+        for model in (RentRequest, Review):
+            rows = []
+            for user in users:
+                for advertisement in rng.sample(ads, cls.rows_per_user):
+                    fields = {'rating': rng.randint(1, 5)} if model is Review else {}
+                    rows.append(model(advertisement=advertisement, user=user, **fields))
+            model.objects.bulk_create(rows)
+        query_plans.analyze()
+        cls.user = users[0]
+        cls.advertisement = RentAdvertisement.objects.filter(status='approved', is_available=True).first()
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in query_plans.hot_queries(self.user, self.advertisement).items():
+            with self.subTest(query=name):
+                tables, plan = query_plans.sequential_scans(queryset)
+                self.assertEqual(tables, [], f'{name} scans {tables}:\n{plan}')
+
+    def test_detects_sequential_scan(self):
+        tables, _ = query_plans.sequential_scans(Notification.objects.filter(message='Hi'))
+        self.assertEqual(tables, [Notification._meta.db_table])
+
+
+def image_upload(name='photo.jpg', size=(800, 600), format='JPEG', color=(200, 80, 40), exif=None):
+    buffer = io.BytesIO()
+    options = {'exif': exif} if exif is not None else {}
+    Image.new('RGB', size, color).save(buffer, format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        # The local filesystem stands in for Cloudinary
+        storage = override_settings(
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+                'images': {
+                    'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                    'OPTIONS': {'location': os.path.join(self.directory, 'images'), 'base_url': '/media/'},
+                },
+            },
+            IMAGE_PIPELINE={'STAGING_DIR': os.path.join(self.directory, 'staging'), 'IN_PROCESS_WORKER': False},
+        )
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='pw')
+
+    def stored_file(self, variant):
+        return os.path.join(self.directory, 'images', variant['name'])
+
+    def test_variants_are_sized_oriented_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'Camera maker'
+        upload = image_upload(size=(2400, 1200), exif=exif.tobytes())
+
+        width, height, blurhash, variants = images.render(upload.read())
+
+        # Turned upright, so 1200 wide; nothing is scaled up past that
+        self.assertEqual((width, height), (1200, 2400))
+        self.assertEqual(
+            [(variant['width'], variant['format']) for variant in variants],
+            [(320, 'webp'), (320, 'jpeg'), (640, 'webp'), (640, 'jpeg'), (1200, 'webp'), (1200, 'jpeg')],
+        )
+        for variant in variants:
+            with Image.open(io.BytesIO(variant['content'])) as encoded:
+                self.assertEqual(encoded.format, variant['format'].upper())
+                self.assertEqual(encoded.size, (variant['width'], variant['height']))
+                self.assertEqual(len(encoded.getexif()), 0)
+        self.assertEqual(len(blurhash), 28)
+
+    def test_blurhash_of_a_solid_color(self):
+        blurhash = images.encode_blurhash(Image.new('RGB', (64, 48), (255, 0, 0)))
+        # 4x3 components, with the colour itself as the average
+        self.assertEqual(len(blurhash), 28)
+        self.assertEqual(blurhash[0], 'L')
+        self.assertEqual(blurhash[2:6], images._base83(0xFF0000, 4))
+
+    def test_advertisement_image_is_processed_off_the_request(self):
+        category = Category.objects.create(name='Flat')
+        ad = RentAdvertisement.objects.create(
+            title='Flat', description='A flat', location='Dhaka', price=1000, bedrooms=2, bathrooms=1,
+            owner=self.user, category=category,
+        )
+        serializer = AdvertisementImageSerializer(data={'image': image_upload(size=(1000, 500)), 'is_primary': True})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        image = serializer.save(advertisement=ad)
+
+        data = AdvertisementImageSerializer(image).data
+        self.assertEqual(data['status'], 'pending')
+        self.assertIsNone(data['image'])
+        self.assertTrue(os.path.exists(image.stored_image.staged_path))
+
+        # Cached ad responses are invalidated once the variants are in
+        versions = response_cache.get_versions([RentAdvertisement])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(images.process_pending(), 1)
+        self.assertNotEqual(response_cache.get_versions([RentAdvertisement]), versions)
+
+        image = AdvertisementImage.objects.select_related('stored_image').get(pk=image.pk)
+        data = AdvertisementImageSerializer(image).data
+        self.assertEqual(data['status'], 'ready')
+        self.assertEqual((data['width'], data['height']), (1000, 500))
+        self.assertEqual(
+            data['srcset']['webp'],
+            ', '.join(f'/media/images/{image.stored_image_id}/{width}.webp {width}w' for width in (320, 640, 1000)),
+        )
+        self.assertEqual(data['thumbnail'], f'/media/images/{image.stored_image_id}/640.jpg')
+        self.assertEqual(data['image'], f'/media/images/{image.stored_image_id}/1000.jpg')
+        self.assertFalse(os.path.exists(image.stored_image.staged_path or 'missing'))
+
+        variants = image.stored_image.variants
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertFalse(StoredImage.objects.exists())
+        self.assertFalse(any(os.path.exists(self.stored_file(variant)) for variant in variants))
+
+    def test_replacing_an_advertisement_image(self):
+        category = Category.objects.create(name='Flat')
+        ad = RentAdvertisement.objects.create(
+            title='Flat', description='A flat', location='Dhaka', price=1000, bedrooms=2, bathrooms=1,
+            owner=self.user, category=category,
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/v1/advertisements/{ad.pk}/images/'
+        response = client.post(url, {'image': image_upload(size=(800, 400))}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        images.process_pending()
+        image = AdvertisementImage.objects.get(pk=response.data['id'])
+        old = image.stored_image
+        old_variants = old.variants
+
+        with mock.patch('cloudinary.uploader.upload') as upload, self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(
+                f'{url}{image.pk}/', {'image': image_upload(size=(600, 300))}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 200)
+        # Staged for the pipeline, not uploaded to Cloudinary in the request
+        upload.assert_not_called()
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertIsNone(response.data['image'])
+        self.assertFalse(StoredImage.objects.filter(pk=old.pk).exists())
+        self.assertFalse(any(os.path.exists(self.stored_file(variant)) for variant in old_variants))
+
+        images.process_pending()
+        image.refresh_from_db()
+        self.assertNotEqual(image.stored_image_id, old.pk)
+        self.assertFalse(image.image)
+        response = client.get(f'{url}{image.pk}/')
+        self.assertEqual(response.data['image'], f'/media/images/{image.stored_image_id}/600.jpg')
+
+    def test_profile_image_upload(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.put(
+            '/api/v1/profile/image/', {'profile_image': image_upload('me.png', (400, 400), 'PNG')}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['profile_image_url'])
+
+        images.process_pending()
+        user = CustomUser.objects.get(pk=self.user.pk)
+        client.force_authenticate(user)
+        response = client.get('/api/v1/profile/')
+        stored_id = user.stored_profile_image_id
+        self.assertEqual(response.data['profile_image_url'], f'http://testserver/media/images/{stored_id}/400.jpg')
+        self.assertIn(f'/media/images/{stored_id}/320.webp 320w', response.data['profile_image_srcset']['webp'])
+        self.assertEqual(len(response.data['profile_image_blurhash']), 28)
+
+    def test_undecodable_upload_fails(self):
+        stored = images.stage(SimpleUploadedFile('broken.jpg', b'not an image'))
+        images.process(stored.pk)
+        stored.refresh_from_db()
+        self.assertEqual(stored.status, 'failed')
+        self.assertIn('UnidentifiedImageError', stored.last_error)
+        # Kept for --retry-failed
+        self.assertTrue(os.path.exists(stored.staged_path))
+        self.assertFalse(images.process(stored.pk))
+        self.assertTrue(images.process(stored.pk, retry_failed=True))
+
+
+@override_settings(API_PERFORMANCE={'LOG_SAMPLE_RATE': 0, 'FLUSH_INTERVAL': 0, 'BUDGET_ACTION': 'raise'})
+class PerformanceInstrumentationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        performance.reset()
+        self.addCleanup(performance.reset)
+        self.client = APIClient()
+        self.admin = CustomUser.objects.create_superuser(email='admin@example.com', password='pass12345')
+        owner = CustomUser.objects.create_user(email='owner@example.com', password='pass12345')
+        for index in range(3):
+            RentAdvertisement.objects.create(
+                owner=owner, title=f'Flat {index}', description='A flat', location='Dhaka', price=1000,
+                bedrooms=2, bathrooms=1, status='approved',
+            )
+
+    def test_server_timing_and_summary(self):
+        response = self.client.get('/api/v1/advertisements/')
+        self.assertEqual(response.status_code, 200)
+        metrics = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['app', 'db', 'serialize'])
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/v1/_perf/')
+        routes = {row['route']: row for row in response.data['routes']}
+        listing = routes['RentAdvertisementViewSet.list']
+        self.assertEqual(listing['count'], 1)
+        self.assertEqual(listing['over_budget'], 0)
+        self.assertLessEqual(listing['p50_ms'], listing['p99_ms'])
+
+        self.assertEqual(self.client.delete('/api/v1/_perf/').status_code, 204)
+        self.assertEqual([row['route'] for row in performance.summary()], ['performance_summary.delete'])
+
+    def test_summary_is_for_admins(self):
+        self.client.force_authenticate(CustomUser.objects.get(email='owner@example.com'))
+        self.assertEqual(self.client.get('/api/v1/_perf/').status_code, 403)
+
+    def test_query_budget(self):
+        budgets = {'QUERY_BUDGETS': {'RentAdvertisementViewSet.list': 1}}
+        with override_settings(API_PERFORMANCE={**performance.DEFAULTS, **budgets, 'BUDGET_ACTION': 'raise'}):
+            with self.assertRaises(performance.QueryBudgetExceeded), self.assertLogs('rent_api.performance'):
+                self.client.get('/api/v1/advertisements/')
+        with override_settings(API_PERFORMANCE={**performance.DEFAULTS, **budgets, 'LOG_SAMPLE_RATE': 0}):
+            with self.assertLogs('rent_api.performance', 'WARNING') as logs:
+                # A different query string, so the response isn't served from the cache
+                self.client.get('/api/v1/advertisements/?ordering=price')
+        self.assertIn('"route": "RentAdvertisementViewSet.list"', logs.output[0])
+
+    def test_repeated_query_shapes(self):
+        recorder = performance.Recorder()
+        for ids in (['a'], ['a', 'b'], ['a', 'b', 'c']):
+            recorder.shapes[performance.fingerprint(
+                'SELECT * FROM t WHERE id IN (%s)' % ', '.join('%s' for _ in ids)
+            )] += 1
+        self.assertEqual(recorder.duplicates(), [{'sql': 'SELECT * FROM t WHERE id IN (...)', 'count': 3}])
+
+
+# The message list is over the default query budget; that is for the benchmark to report, not to log here
+@override_settings(API_PERFORMANCE={'QUERY_BUDGET': None, 'LOG_SAMPLE_RATE': 0})
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.written = synthetic.generate(
+            seed=7, users=30, advertisements=60, images_per_ad=2, reviews=80, favorites=80, rent_requests=80,
+            messages=120, notifications=200,
+        )
+
+    def test_generated_data_is_consistent(self):
+        self.assertEqual(self.written['advertisements'], RentAdvertisement.objects.count())
+        with_images = RentAdvertisement.objects.filter(images__isnull=False).distinct()
+        self.assertEqual(with_images.filter(primary_image__isnull=True).count(), 0)
+        self.assertFalse(Message.objects.filter(conversation__isnull=True).exists())
+        self.assertEqual(
+            sum(RentAdvertisement.objects.values_list('rating_count', flat=True)), self.written['reviews']
+        )
+
+    def test_every_router_route_is_benchmarked(self):
+        user = benchmark.benchmark_user()
+        results = benchmark.run(benchmark.ClientTransport(user), user, repeat=2, warmup=0)
+
+        names = {endpoint['name'] for endpoint in results['endpoints']}
+        self.assertTrue({name for _, _, name, detail, _ in benchmark.routes() if not detail} <= names)
+        self.assertIn('advertisement-rent-requests-detail', names)
+        listing = next(endpoint for endpoint in results['endpoints'] if endpoint['name'] == 'advertisement-list')
+        self.assertEqual(listing['statuses'], [200])
+        self.assertLessEqual(listing['p50_ms'], listing['p99_ms'])
+        self.assertEqual(results['meta']['dataset']['rent_add.RentAdvertisement'], 60)
+
+        slower = {'endpoints': [{**listing, 'p95_ms': listing['p95_ms'] * 2, 'queries': listing['queries'] + 1}]}
+        [row] = benchmark.compare(slower, results)
+        self.assertTrue(row['regressed'])
+        [row] = benchmark.compare({'endpoints': [listing]}, results)
+        self.assertFalse(row['regressed'])
+
+
+class ValuesSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(
+            seed=11, similar=False, users=20, advertisements=40, images_per_ad=2, reviews=40, favorites=60,
+            rent_requests=20, messages=60, notifications=60,
+        )
+        cls.user = benchmark.benchmark_user()
+        # What the generated data lacks: an ad without a category whose
+        # image predates the pipeline, and a message about no ad
+        cls.uncategorized = RentAdvertisement.objects.create(
+            owner=cls.user, title='Uncategorized', description='Flat', price='1234.50', location='Gulshan, Dhaka',
+            latitude='23.792500', longitude='90.407800', bedrooms=1, bathrooms=1, status='approved',
+        )
+        AdvertisementImage.objects.create(
+            advertisement=cls.uncategorized, image='image/upload/v1/legacy.jpg', is_primary=True
+        )
+        cls.message = Message.objects.create(
+            sender=cls.user, recipient=CustomUser.objects.exclude(pk=cls.user.pk).first(), subject='Hi', content='Hello'
+        )
+
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fast_paths_render_the_same_json(self):
+        results = benchmark.compare_serializers(self.user, page_size=100, repeat=1, warmup=0)
+        self.assertEqual(
+            {result['name'] for result in results}, {'advertisements', 'messages', 'notifications', 'favorites'}
+        )
+        for result in results:
+            self.assertTrue(result['identical'], result['name'])
+            self.assertGreater(result['values']['rows'], 0)
+            self.assertLessEqual(result['values']['queries'], result['drf']['queries'])
+
+    def test_null_relations_are_left_out_as_drf_leaves_them_out(self):
+        response = self.client.get('/api/v1/advertisements/', {'near': '23.7925,90.4078', 'radius_km': 1})
+        item = next(item for item in response.data['results'] if item['id'] == str(self.uncategorized.pk))
+        self.assertNotIn('category_name', item)
+        self.assertEqual(item['distance'], 0)
+        self.assertIn('legacy', item['primary_image']['image'])
+        drf = RentAdvertisementListSerializer(
+            RentAdvertisement.objects.for_listing(self.user).get(pk=self.uncategorized.pk),
+            context={'request': response.wsgi_request},
+        ).data
+        self.assertEqual({**item, 'distance': None}, {**drf, 'distance': None})
+
+        response = self.client.get('/api/v1/messages/')
+        item = next(item for item in response.data if item['id'] == self.message.pk)
+        self.assertNotIn('advertisement_title', item)
+        self.assertEqual(item, MessageSerializer(self.message).data)
+
+    def test_cursor_pages_over_rows(self):
+        expected = [
+            str(pk) for pk in RentAdvertisement.objects.filter(
+                status='approved', is_available=True
+            ).order_by('-price', '-pk').values_list('pk', flat=True)
+        ]
+        response = self.client.get('/api/v1/advertisements/', {'cursor': '', 'page_size': 7, 'ordering': '-price'})
+        seen = []
+        while True:
+            seen += [item['id'] for item in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(seen, expected)
+
+
+class FastJSONTests(TestCase):
+    PAYLOAD = {
+        'price': Decimal('1234.50'),
+        'deposit': Decimal('0.10'),
+        'id': uuid.UUID('6f1c1c1e-8a4b-4a5e-9a2b-3c4d5e6f7a8b'),
+        'created_at': datetime.datetime(2026, 10, 18, 14, 21, 37, 123456, tzinfo=datetime.timezone.utc),
+        'local': datetime.datetime(1850, 1, 1, tzinfo=zoneinfo.ZoneInfo('Asia/Dhaka')),
+        'naive': datetime.datetime(2026, 1, 2, 3, 4, 5),
+        'available_from': datetime.date(2026, 11, 1),
+        'time': datetime.time(9, 30),
+        'lease': datetime.timedelta(days=30),
+        'label': gettext_lazy('Approved'),
+        'text': 'ঢাকা \u2028 \u2029 "quoted" \\ \x00\x1f\t\n',
+        'numbers': (0, -1, 2 ** 63 - 1, 4.25, 0.001, True, False, None),
+        'big': 2 ** 70,
+        1: 'int key',
+        'nested': ReturnDict(OrderedDict([('results', ReturnList([{'id': 1}], serializer=None))]), serializer=None),
+        'tags': frozenset(['balcony']),
+    }
+
+    def assert_renders_alike(self, data):
+        self.assertEqual(fast_json.FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(fast_json.dumps(data), JSONRenderer().render(data))
+
+    @skipUnless(fast_json.orjson, 'orjson is not installed')
+    def test_renders_the_same_bytes_as_json_renderer(self):
+        self.assert_renders_alike(self.PAYLOAD)
+        self.assert_renders_alike([])
+        self.assertEqual(fast_json.FastJSONRenderer().render(None), b'')
+        # Indented output is JSONRenderer's
+        indented = fast_json.FastJSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        self.assertEqual(indented, b'{\n  "a": 1\n}')
+        with self.assertRaises(TypeError):
+            fast_json.FastJSONRenderer().render({'object': object()})
+
+    def test_standard_library_fallback(self):
+        with mock.patch.object(fast_json, 'orjson', None):
+            self.assert_renders_alike(self.PAYLOAD)
+            self.assertEqual(fast_json.FastJSONParser().parse(io.BytesIO(b'{"a": [1, 2.5]}')), {'a': [1, 2.5]})
+
+    def test_parses_like_json_parser(self):
+        body = JSONRenderer().render({'title': 'ঢাকা', 'price': '1234.50', 'items': [1, 2.5, None, True]})
+        self.assertEqual(fast_json.FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        latin = '{"title": "Caf\u00e9"}'.encode('latin-1')
+        self.assertEqual(
+            fast_json.FastJSONParser().parse(io.BytesIO(latin), parser_context={'encoding': 'latin-1'}),
+            {'title': 'Caf\u00e9'},
+        )
+        for invalid in (b'{"a": ', b'{"a": NaN}'):
+            with self.assertRaises(ParseError) as drf:
+                JSONParser().parse(io.BytesIO(invalid))
+            with self.assertRaises(ParseError) as fast:
+                fast_json.FastJSONParser().parse(io.BytesIO(invalid))
+            self.assertEqual(str(fast.exception), str(drf.exception))
+
+    def test_api_responses_and_benchmark_payloads(self):
+        synthetic.generate(seed=13, similar=False, users=10, advertisements=20, reviews=10, favorites=10,
+                           rent_requests=10, messages=10, notifications=10)
+        user = benchmark.benchmark_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/v1/advertisements/', {'page_size': 100})
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+        response = client.post('/api/v1/notifications/', {'notification_type': 'message', 'message': 'ঢাকা'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['message'], 'ঢাকা')
+
+        for result in benchmark.compare_json(benchmark.json_payloads(user), repeat=1):
+            self.assertTrue(result['identical'], result['name'])
+            self.assertTrue(result['parsed_identical'], result['name'])
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(
+            seed=17, similar=False, users=20, advertisements=40, images_per_ad=0, reviews=40, favorites=0,
+            rent_requests=40, messages=0, notifications=0,
+        )
+        cls.owner = benchmark.benchmark_user()
+        cls.admin = CustomUser.objects.create_user(
+            email='exports-admin@example.com', password='pass12345', first_name='A', last_name='B', is_staff=True
+        )
+
+    def export(self, user, path, headers=None, **params):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(f'/api/v1/exports/{path}', params, headers=headers)
+
+    def ndjson(self, response):
+        self.assertTrue(response.streaming)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_admins_stream_every_user(self):
+        response = self.export(self.admin, 'users.ndjson', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="users.ndjson"')
+        rows = self.ndjson(response)
+        ids = sorted(str(pk) for pk in CustomUser.objects.values_list('pk', flat=True))
+        self.assertEqual([row['id'] for row in rows], ids)
+        self.assertEqual(list(rows[0]), exports.USER_FIELDS)
+
+        response = self.export(self.owner, 'users.ndjson', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(self.export(self.admin, 'payments.ndjson').status_code, 404)
+        self.assertEqual(self.export(self.admin, 'users.xml').status_code, 404)
+
+    def test_owners_stream_their_own_rows(self):
+        rows = self.ndjson(self.export(self.owner, 'advertisements.ndjson'))
+        owned = RentAdvertisement.objects.filter(owner=self.owner)
+        self.assertEqual({row['id'] for row in rows}, {str(pk) for pk in owned.values_list('pk', flat=True)})
+        self.assertEqual({row['owner'] for row in rows}, {self.owner.email})
+        self.assertEqual(rows[0]['price'], str(owned.get(pk=rows[0]['id']).price))
+
+        rows = self.ndjson(self.export(self.owner, 'rent-requests.ndjson', status='pending'))
+        requests = RentRequest.objects.filter(advertisement__owner=self.owner, status='pending')
+        self.assertTrue(rows)
+        self.assertEqual({row['id'] for row in rows}, {str(pk) for pk in requests.values_list('pk', flat=True)})
+        self.assertEqual(rows[0]['user_email'], CustomUser.objects.get(pk=rows[0]['user']).email)
+
+        response = self.export(self.owner, 'reviews.csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        reviews = Review.objects.filter(advertisement__owner=self.owner)
+        self.assertEqual(len(rows), reviews.count())
+        self.assertEqual(list(rows[0]), exports.REVIEW_FIELDS)
+        self.assertEqual(rows[0]['rating'], str(reviews.get(pk=rows[0]['id']).rating))
+
+    def test_csv_cells_are_not_read_as_formulas(self):
+        review = Review.objects.filter(advertisement__owner=self.owner).order_by('pk').first()
+        Review.objects.filter(pk=review.pk).update(comment='=HYPERLINK("http://example.com")')
+        RentAdvertisement.objects.filter(owner=self.owner).update(title='-1+2')
+        response = self.export(self.owner, 'reviews.csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0]['comment'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(rows[0]['rating'], str(review.rating))
+        self.assertEqual(exports.csv_cell('@SUM(A1)'), "'@SUM(A1)")
+        self.assertEqual(exports.csv_cell('\tcmd'), "'\tcmd")
+        self.assertEqual(exports.csv_cell('plain'), 'plain')
+
+        response = self.export(self.owner, 'advertisements.csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual({row['title'] for row in rows}, {"'-1+2"})
+        # NDJSON isn't opened by spreadsheets and keeps the text as written
+        rows = self.ndjson(self.export(self.owner, 'advertisements.ndjson'))
+        self.assertEqual({row['title'] for row in rows}, {'-1+2'})
+
+    def test_csv_export_imports_back_unchanged(self):
+        owned = RentAdvertisement.objects.filter(owner=self.owner)
+        owned.update(contact_phone='+8801712345678', description='- Near the park')
+        before = list(owned.order_by('pk').values('pk', 'contact_phone', 'description', 'title'))
+        self.assertTrue(before)
+        response = self.export(self.owner, 'advertisements.csv')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'ads.csv')
+        with open(path, 'wb') as file:
+            file.writelines(response.streaming_content)
+
+        owned.delete()
+        call_command('import_ads', path, stdout=io.StringIO())
+        after = list(owned.order_by('pk').values('pk', 'contact_phone', 'description', 'title'))
+        self.assertEqual(after, before)
+        self.assertEqual(transfer.unquote_formula("'quoted"), "'quoted")
+
+    def test_rows_are_read_in_chunks_and_sent_in_buffers(self):
+        chunks = exports.stream('rent-requests', self.admin, 'csv', chunk_size=10)
+        first = next(chunks)
+        # Everything fits one buffer, so it's all read before the first chunk
+        self.assertEqual(first.count(b'\r\n'), RentRequest.objects.count() + 1)
+        with self.assertRaises(StopIteration):
+            next(chunks)
+
+        lines = [b'x' * 10] * 25
+        self.assertEqual([len(chunk) for chunk in exports.buffered(lines, size=100)], [100, 100, 50])
+
+        with self.assertNumQueries(1):
+            rows = list(exports.stream('users', self.admin, 'ndjson', chunk_size=5))
+        self.assertTrue(rows)
+
+    def test_user_list_pages_on_request(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        everyone = client.get('/api/v1/users/').data
+        self.assertEqual(len(everyone), CustomUser.objects.count())
+        page = client.get('/api/v1/users/', {'cursor': '', 'page_size': 5}).data
+        self.assertEqual(page['results'], everyone[:5])
+        self.assertIsNotNone(page['next'])
@@ -72,10 +72,14 @@ from users.views import (
 )
 from rent_add.views import (
     RentAdvertisementViewSet, RentRequestViewSet, AdvertisementImageViewSet,
-    FavoriteAdvertisementViewSet, ReviewViewSet, advertisement_statistics
+    FavoriteAdvertisementViewSet, ReviewViewSet, advertisement_statistics,
+    advertisement_statistics_breakdown, advertisement_statistics_timeseries
 )
 from rent_type.views import CategoryViewSet, AmenityViewSet
-from rent_user.views import NotificationViewSet, MessageViewSet
+from rent_user.views import (
+    NotificationViewSet, MessageViewSet, ConversationViewSet, event_stream, inbox_summary
+)
+from rent_api.views import ExportView, performance_summary
 
 
 # Main router
@@ -88,6 +92,7 @@ router.register(r'favorites', FavoriteAdvertisementViewSet, basename='favorite')
 router.register(r'reviews', ReviewViewSet, basename='review')
 router.register(r'notifications', NotificationViewSet, basename='notification')
 router.register(r'messages', MessageViewSet, basename='message')
+router.register(r'conversations', ConversationViewSet, basename='conversation')
 
 
 # Nested router for advertisement images, reviews, and rent requests
@@ -120,6 +125,20 @@ urlpatterns = [
 
     # Advertisement statistics
     path('statistics/', advertisement_statistics, name='advertisement-statistics'),
+    path('statistics/breakdown/', advertisement_statistics_breakdown, name='advertisement-statistics-breakdown'),
+    path('statistics/timeseries/', advertisement_statistics_timeseries, name='advertisement-statistics-timeseries'),
+
+    # Unread counts for badges
+    path('inbox/summary/', inbox_summary, name='inbox-summary'),
+
+    # Server-sent events for notifications and messages
+    path('stream/', event_stream, name='event-stream'),
+
+    # NDJSON or CSV exports, streamed from the database; e.g. exports/advertisements.ndjson
+    path('exports/<slug:name>.<slug:extension>', ExportView.as_view(), name='export'),
+
+    # Request timing and query percentiles per route, for admins
+    path('_perf/', performance_summary, name='performance-summary'),
 ]
 
 # Serve media files in development
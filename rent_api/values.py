@@ -0,0 +1,198 @@
+"""
+Read-only serializers over ``.values()`` rows, for the busiest list endpoints.
+
+A ValuesSerializer stands in for a DRF serializer (``serializer_class``)
+when reading. The DRF serializer's fields are compiled once per class into
+a plan of columns to select and, per field, an accessor reading them from
+the row: a plain lookup for strings, integers and booleans (the database
+returns them as DRF renders them), the DRF field's own to_representation
+for dates, decimals, UUIDs and the like, and the nested serializer's plan,
+under the relation's prefix, for nested serializers. A dotted source
+across a relation that is null is left out, or given its default, as DRF
+does. Method fields become ``get_<name>(row)`` methods on the
+ValuesSerializer, reading what it lists in ``columns``; in a nested
+serializer the row's columns carry ``self.prefix``.
+
+No model instances are built and no fields are looked up per row, and the
+JSON is the same as the DRF serializer's. ValuesListMixin serves a
+viewset's ``list`` this way; the other actions keep the DRF serializers.
+"""
+import operator
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.response import Response
+
+# Their database values are already what DRF renders
+VERBATIM_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.ReadOnlyField)
+
+# Returned by an accessor for a field DRF would leave out
+SKIP = object()
+
+
+def converter(field):
+    """What turns a column into ``field``'s output; None when the column is the output."""
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # values() gives the related pk itself
+        return field.pk_field.to_representation if field.pk_field is not None else None
+    if isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField)):
+        return empty
+    if isinstance(field, VERBATIM_FIELDS):
+        return None
+    return field.to_representation
+
+
+def missing(field):
+    """What DRF outputs for ``field`` when a relation on its source is null."""
+    if field.default is not empty:
+        return field.get_default()
+    if field.allow_null:
+        return None
+    return SKIP
+
+
+class ValuesSerializer:
+    serializer_class = None
+    # Columns read by get_<name> methods and represent() besides the compiled fields
+    columns = ()
+    # Annotations read when the queryset has them, such as the distance of near= queries
+    optional_columns = ()
+    # Field name -> ValuesSerializer for nested (or method) fields; other
+    # nested serializers get one compiled from their own fields
+    nested = {}
+
+    def __init__(self, instance=None, many=False, context=None, prefix=''):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.prefix = prefix
+        self.accessors = [(name, self.get_accessor(name, kind, spec)) for name, kind, spec in self.get_plan()]
+
+    @classmethod
+    def get_plan(cls):
+        # Compiled once per class, and not inherited by subclasses
+        if '_plan' not in cls.__dict__:
+            cls._plan = cls.compile()
+        return cls._plan
+
+    @classmethod
+    def compile(cls):
+        """(name, kind, spec) for each readable field of ``serializer_class``, in its order."""
+        plan = []
+        for field in cls.serializer_class().fields.values():
+            name = field.field_name
+            if field.write_only:
+                continue
+            if hasattr(cls, f'get_{name}') and name not in cls.nested:
+                plan.append((name, 'method', None))
+            elif name in cls.nested or (
+                isinstance(field, serializers.BaseSerializer) and not isinstance(field, serializers.ListSerializer)
+            ):
+                nested = cls.nested.get(name) or type(
+                    f'{type(field).__name__}Values', (ValuesSerializer,), {'serializer_class': type(field)}
+                )
+                relation = name if field.source == '*' else '__'.join(field.source_attrs)
+                plan.append((name, 'nested', (nested, relation)))
+            else:
+                convert = converter(field)
+                if field.source == '*' or convert is empty or isinstance(field, serializers.BaseSerializer):
+                    raise ImproperlyConfigured(
+                        f'{cls.__name__} needs a get_{name}(row) method for '
+                        f'{cls.serializer_class.__name__}.{name}'
+                    )
+                attrs = field.source_attrs
+                guards = ['__'.join(attrs[:depth]) for depth in range(1, len(attrs))]
+                plan.append((name, 'column', ('__'.join(attrs), convert, guards, field)))
+        return plan
+
+    @classmethod
+    def get_columns(cls, prefix=''):
+        names = []
+        for _, kind, spec in cls.get_plan():
+            if kind == 'column':
+                column, _, guards, _ = spec
+                names += [column, *guards]
+            elif kind == 'nested':
+                nested, relation = spec
+                names += [relation, *nested.get_columns(f'{relation}__')]
+        names += cls.columns
+        return [prefix + name for name in dict.fromkeys(names)]
+
+    @classmethod
+    def values(cls, queryset):
+        """``queryset`` as the rows this serializer reads."""
+        columns = cls.get_columns()
+        columns += [name for name in cls.optional_columns if name in queryset.query.annotations]
+        # Relations are read through joins on the columns, so nothing is prefetched
+        return queryset.prefetch_related(None).values(*columns)
+
+    def get_accessor(self, name, kind, spec):
+        if kind == 'method':
+            return getattr(self, f'get_{name}')
+
+        if kind == 'nested':
+            nested_class, relation = spec
+            nested = nested_class(context=self.context, prefix=f'{self.prefix}{relation}__')
+            relation = self.prefix + relation
+
+            def accessor(row):
+                return None if row[relation] is None else nested.represent(row)
+            return accessor
+
+        column, convert, guards, field = spec
+        column = self.prefix + column
+        if convert is None:
+            accessor = operator.itemgetter(column)
+        else:
+            def accessor(row):
+                value = row[column]
+                return None if value is None else convert(value)
+        if not guards:
+            return accessor
+
+        guards = [self.prefix + guard for guard in guards]
+        read = accessor
+
+        def accessor(row):
+            for guard in guards:
+                if row[guard] is None:
+                    return missing(field)
+            return read(row)
+        return accessor
+
+    def represent(self, row):
+        data = {}
+        for name, accessor in self.accessors:
+            value = accessor(row)
+            if value is not SKIP:
+                data[name] = value
+        return data
+
+    def to_representation(self, instance):
+        if self.many:
+            return [self.represent(row) for row in instance]
+        return self.represent(instance)
+
+    @property
+    def data(self):
+        return self.to_representation(self.instance)
+
+
+class ValuesListMixin:
+    """Serve ``list`` from .values() rows with ``values_serializer_class``."""
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.get_values_response(self.values_serializer_class.values(queryset))
+
+    def get_values_response(self, rows):
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(self.get_values_serializer(rows, many=True).data)
+        return self.get_paginated_response(self.get_values_serializer(page, many=True).data)
+
+    def get_values_serializer(self, *args, **kwargs):
+        kwargs.setdefault('context', self.get_serializer_context())
+        return self.values_serializer_class(*args, **kwargs)
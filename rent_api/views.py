@@ -1,3 +1,41 @@
-from django.shortcuts import render
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from rent_api import exports, performance
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def performance_summary(request):
+    """Rolling timing and query percentiles per route; DELETE starts the windows afresh."""
+    if request.method == 'DELETE':
+        performance.reset()
+        return Response(status=204)
+    return Response({'routes': performance.summary()})
+
+
+class ExportView(APIView):
+    """Stream users, advertisements, rent requests or reviews as NDJSON or CSV (rent_api/exports.py)."""
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The URL names the format whatever Accept says; errors are rendered as JSON
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, name, extension):
+        if name not in exports.EXPORTS or extension not in exports.CONTENT_TYPES:
+            raise NotFound()
+        if exports.EXPORTS[name].admin_only and not request.user.is_staff:
+            raise PermissionDenied()
+        response = StreamingHttpResponse(
+            exports.stream(name, request.user, extension, request.query_params.getlist('status')),
+            content_type=exports.CONTENT_TYPES[extension],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{name}.{extension}"'
+        # Tell nginx not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
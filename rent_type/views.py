@@ -4,6 +4,9 @@ from .models import Category, Amenity
 from .serializers import CategorySerializer, AmenitySerializer
 from django.db.models import Count
 from rent_api import permissions
+from rent_api.cache import CachedResponseMixin
+from rent_api.performance import PerformanceMixin
+from rent_add.models import RentAdvertisement
 
 
 
@@ -12,10 +15,12 @@ from rent_api import permissions
 #     serializer_class = CategorySerializer
 #     pagination_class = None
     
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(PerformanceMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.annotate(ad_count=Count('rentadvertisement'))
     serializer_class = CategorySerializer
     pagination_class = None
+    # advertisement_count is derived from the ads table
+    cache_models = (Category, RentAdvertisement)
     permission_classes = [permissions.IsAdminUser]  # Allow unrestricted access
 
 
@@ -30,8 +35,9 @@ class AmenityViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AmenitySerializer
     pagination_class = None
     
-class AmenityViewSet(viewsets.ModelViewSet):
+class AmenityViewSet(PerformanceMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Amenity.objects.all()
     serializer_class = AmenitySerializer
     pagination_class = None
+    cache_models = (Amenity,)
     permission_classes = [permissions.IsAdminUser]  # Allow unrestricted access
\ No newline at end of file
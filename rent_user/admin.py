@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, Message
+from .models import ArchivedNotification, Notification, Message, NotificationJob
 
 
 
@@ -14,4 +14,17 @@ class NotificationAdmin(admin.ModelAdmin):
 class MessageAdmin(admin.ModelAdmin):
     list_display = ['sender', 'recipient', 'subject', 'is_read', 'created_at']
     list_filter = ['is_read', 'created_at']
-    search_fields = ['sender__username', 'recipient__username', 'subject']
\ No newline at end of file
+    search_fields = ['sender__username', 'recipient__username', 'subject']
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ['notification_type', 'user', 'status', 'attempts', 'available_at', 'created_at']
+    list_filter = ['status', 'notification_type']
+    search_fields = ['dedupe_key', 'last_error']
+    raw_id_fields = ('user', 'related_advertisement', 'related_request')
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'notification_type', 'coalesced_count', 'created_at', 'archived_at']
+    list_filter = ['notification_type']
+    raw_id_fields = ('user',)
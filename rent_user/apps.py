@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RentUserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rent_user'
+
+    def ready(self):
+        # Connect the receivers publishing to the event stream
+        from rent_user import signals  # noqa: F401
@@ -0,0 +1,102 @@
+"""
+Publish/subscribe layer behind the event stream (rent_user/views.py).
+
+Each user has a channel, ``user:<id>``. New notifications and messages are
+published to it once their transaction commits (rent_user/signals.py), and
+every open stream of that user receives them. ``LocalBroadcast`` keeps
+subscribers in memory, so it only reaches streams served by the same
+process. Streams therefore also poll the database now and then
+(REALTIME_STREAM['POLL_INTERVAL']), which picks up events published
+elsewhere. Set REALTIME_STREAM['BROADCAST'] to the dotted path of another
+class with the same three methods to swap the layer out.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'BROADCAST': 'rent_user.broadcast.LocalBroadcast',
+    # Events buffered per stream before it falls back to reading the database
+    'QUEUE_SIZE': 1000,
+    # Seconds between keep-alive comments on an idle stream
+    'HEARTBEAT': 20,
+    # Seconds between database polls for events published by other processes
+    'POLL_INTERVAL': 15,
+    # Milliseconds clients wait before reconnecting
+    'RETRY': 3000,
+}
+
+_broadcast = None
+_broadcast_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'REALTIME_STREAM', {}).get(name, DEFAULTS[name])
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    def __init__(self, channel, loop, queue_size):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+        # Set when events were dropped on a full queue; the stream re-reads the database
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class LocalBroadcast:
+    """Fan-out to subscribers in this process. publish() may be called from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        """Subscribe the running event loop to a channel."""
+        subscription = Subscription(channel, asyncio.get_running_loop(), get_setting('QUEUE_SIZE'))
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def get_broadcast():
+    global _broadcast
+    if _broadcast is None:
+        with _broadcast_lock:
+            if _broadcast is None:
+                _broadcast = import_string(get_setting('BROADCAST'))()
+    return _broadcast
@@ -0,0 +1,95 @@
+"""
+Conversations: messages grouped by participant pair and advertisement.
+
+Saving a Message files it under its Conversation, created on first use, and
+moves the conversation's ``last_message`` forward (rent_user/signals.py).
+So the conversation list is read from one row per thread, and a thread's
+messages from the (conversation, created_at, id) index, without going
+through the sender OR recipient scan over every message.
+``backfill()`` files messages that have no conversation yet; migration 0006
+runs it over the existing rows.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from rent_user.models import Conversation, Message
+
+
+def participants(user_id, other_id):
+    """The pair in the order Conversation stores it."""
+    return tuple(sorted((user_id, other_id), key=str))
+
+
+def conversation_lookup(sender_id, recipient_id, advertisement_id):
+    participant_one_id, participant_two_id = participants(sender_id, recipient_id)
+    return {
+        'participant_one_id': participant_one_id,
+        'participant_two_id': participant_two_id,
+        'advertisement_id': advertisement_id,
+    }
+
+
+def get_or_create(sender_id, recipient_id, advertisement_id):
+    conversation, _ = Conversation.objects.get_or_create(
+        **conversation_lookup(sender_id, recipient_id, advertisement_id)
+    )
+    return conversation
+
+
+def record_message(message):
+    """Make a new message its conversation's last, unless a later one got there first."""
+    Conversation.objects.filter(pk=message.conversation_id).filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at)
+    ).update(last_message=message, last_message_at=message.created_at)
+
+
+def refresh_last_message(conversations, message_model=Message):
+    """Point each conversation in the queryset at its newest message."""
+    latest = message_model.objects.filter(conversation=OuterRef('pk')).order_by('-created_at', '-pk')
+    return conversations.update(
+        last_message=Subquery(latest.values('pk')[:1]),
+        last_message_at=Subquery(latest.values('created_at')[:1]),
+    )
+
+
+def backfill(message_model=Message, conversation_model=Conversation, batch_size=1000):
+    """File every message without a conversation, a batch per transaction; returns how many."""
+    filed = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            message_model.objects.filter(pk__gt=last_pk, conversation__isnull=True).order_by('pk')
+            .values_list('pk', 'sender_id', 'recipient_id', 'advertisement_id')[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        keys = {
+            pk: tuple(conversation_lookup(sender_id, recipient_id, advertisement_id).values())
+            for pk, sender_id, recipient_id, advertisement_id in batch
+        }
+        with transaction.atomic():
+            conversation_model.objects.bulk_create(
+                [
+                    conversation_model(participant_one_id=one, participant_two_id=two, advertisement_id=advertisement_id)
+                    for one, two, advertisement_id in set(keys.values())
+                ],
+                ignore_conflicts=True,
+            )
+            conversation_ids = {
+                (one, two, advertisement_id): pk
+                for pk, one, two, advertisement_id in conversation_model.objects.filter(
+                    participant_one_id__in={key[0] for key in keys.values()},
+                    participant_two_id__in={key[1] for key in keys.values()},
+                ).values_list('pk', 'participant_one_id', 'participant_two_id', 'advertisement_id')
+            }
+            message_model.objects.bulk_update(
+                [message_model(pk=pk, conversation_id=conversation_ids[key]) for pk, key in keys.items()],
+                ['conversation'],
+            )
+            refresh_last_message(
+                conversation_model.objects.filter(pk__in=set(conversation_ids[key] for key in keys.values())),
+                message_model,
+            )
+        filed += len(batch)
+    return filed
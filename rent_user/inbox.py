@@ -0,0 +1,170 @@
+"""
+Unread counters behind /api/v1/inbox/summary/.
+
+Each InboxCounter row holds a user's unread notifications of one type, or
+their unread messages in one conversation (the other participant and the
+advertisement). Counters move in the same transaction as the rows they
+count: on save and delete through rent_user/signals.py, and in
+notifications.process() for batches written with bulk_create.
+mark_all_as_read resets a user's counters of a kind with one UPDATE.
+``rebuild()`` (the rebuild_inbox_counters command) recomputes them from the
+source tables for anything that bypassed both, such as a queryset.update().
+"""
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from rent_user.models import InboxCounter, Message, Notification
+
+
+def conversation_key(sender_id, advertisement_id):
+    return f"{sender_id}:{advertisement_id or ''}"
+
+
+def notification_counts(values):
+    """What a notification adds to the counters, given its field values by attname."""
+    if values.get('is_read', True) or values.get('user_id') is None:
+        return Counter()
+    return Counter({(values['user_id'], 'notification', values['notification_type']): 1})
+
+
+def message_counts(values):
+    if values.get('is_read', True) or values.get('recipient_id') is None:
+        return Counter()
+    key = conversation_key(values['sender_id'], values.get('advertisement_id'))
+    return Counter({(values['recipient_id'], 'message', key): 1})
+
+
+_pending = threading.local()
+
+
+@contextmanager
+def batched():
+    """Collect the counter changes made inside the block and apply them together at the end."""
+    if getattr(_pending, 'deltas', None) is not None:
+        yield
+        return
+    _pending.deltas = Counter()
+    try:
+        yield
+        deltas = _pending.deltas
+    finally:
+        _pending.deltas = None
+    adjust(deltas)
+
+
+def changes(old, new):
+    deltas = Counter(new)
+    deltas.subtract(old)
+    return deltas
+
+
+def adjust(deltas, model=InboxCounter):
+    """Apply {(user_id, kind, key): delta} in one UPDATE, creating missing rows first."""
+    pending = getattr(_pending, 'deltas', None)
+    if pending is not None:
+        pending.update(deltas)
+        return
+    deltas = {bucket: delta for bucket, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic(savepoint=False):
+        missing = [bucket for bucket, delta in deltas.items() if delta > 0]
+        if missing:
+            model.objects.bulk_create(
+                [model(user_id=user_id, kind=kind, key=key) for user_id, kind, key in missing],
+                ignore_conflicts=True,
+            )
+        rows = model.objects.filter(
+            user_id__in={user_id for user_id, _, _ in deltas},
+            kind__in={kind for _, kind, _ in deltas},
+            key__in={key for _, _, key in deltas},
+        ).values_list('pk', 'user_id', 'kind', 'key')
+        matched = {pk: deltas[tuple(bucket)] for pk, *bucket in rows if tuple(bucket) in deltas}
+        if matched:
+            model.objects.filter(pk__in=matched).update(unread=F('unread') + Case(
+                *(When(pk=pk, then=Value(delta)) for pk, delta in matched.items()),
+                default=Value(0), output_field=IntegerField(),
+            ))
+
+
+def count_created(notifications):
+    """Count notifications written with bulk_create, which sends no post_save."""
+    total = Counter()
+    for notification in notifications:
+        total += notification_counts({
+            'user_id': notification.user_id,
+            'notification_type': notification.notification_type,
+            'is_read': notification.is_read,
+        })
+    adjust(total)
+
+
+def reset(user_id, kind, key=None):
+    """Zero a user's counters of one kind (or one counter), after their rows were marked read."""
+    counters = InboxCounter.objects.filter(user_id=user_id, kind=kind)
+    if key is not None:
+        counters = counters.filter(key=key)
+    counters.exclude(unread=0).update(unread=0)
+
+
+def conversation_unread(user_id, conversations):
+    """Unread messages for the user in each conversation, keyed by conversation pk."""
+    keys = {
+        conversation_key(conversation.other_participant_id(user_id), conversation.advertisement_id): conversation.pk
+        for conversation in conversations
+    }
+    return {
+        keys[key]: unread
+        for key, unread in InboxCounter.objects.filter(
+            user_id=user_id, kind='message', key__in=keys
+        ).values_list('key', 'unread')
+    }
+
+
+def summary(user_id):
+    notifications = {}
+    conversations = []
+    for kind, key, unread in InboxCounter.objects.filter(user_id=user_id, unread__gt=0).values_list(
+        'kind', 'key', 'unread'
+    ):
+        if kind == 'notification':
+            notifications[key] = unread
+        else:
+            sender_id, advertisement_id = key.split(':')
+            conversations.append({
+                'user': sender_id,
+                'advertisement': advertisement_id or None,
+                'unread': unread,
+            })
+    conversations.sort(key=lambda conversation: (-conversation['unread'], conversation['user']))
+    return {
+        'notifications': {'unread': sum(notifications.values()), 'by_type': notifications},
+        'messages': {
+            'unread': sum(conversation['unread'] for conversation in conversations),
+            'conversations': conversations,
+        },
+    }
+
+
+def rebuild(notification_model=Notification, message_model=Message, counter_model=InboxCounter, batch_size=1000):
+    """Recompute every counter from the unread rows; returns the number of counters written."""
+    counters = [
+        counter_model(user_id=user_id, kind='notification', key=notification_type, unread=unread)
+        for user_id, notification_type, unread in notification_model.objects.filter(is_read=False)
+        .order_by().values_list('user_id', 'notification_type').annotate(unread=Count('pk'))
+    ]
+    counters += [
+        counter_model(
+            user_id=recipient_id, kind='message', key=conversation_key(sender_id, advertisement_id), unread=unread
+        )
+        for recipient_id, sender_id, advertisement_id, unread in message_model.objects.filter(is_read=False)
+        .order_by().values_list('recipient_id', 'sender_id', 'advertisement_id').annotate(unread=Count('pk'))
+    ]
+    with transaction.atomic():
+        counter_model.objects.all().delete()
+        counter_model.objects.bulk_create(counters, batch_size=batch_size)
+    return len(counters)
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rent_user import notifications
+from rent_user.models import Notification
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure notification throughput: one Notification.objects.create() per event '
+        'against queueing the events and draining them with the worker. '
+        'Rows are inserted inside a transaction that is rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = options['events']
+        with transaction.atomic():
+            users = CustomUser.objects.bulk_create([
+                CustomUser(email=f'bench-notify-{index}@example.com') for index in range(options['users'])
+            ])
+            events = [
+                {
+                    'user': users[index % len(users)],
+                    'notification_type': 'message',
+                    'message': f'Benchmark event {index}',
+                    'dedupe_key': f'bench:{index}',
+                }
+                for index in range(count)
+            ]
+
+            started = time.perf_counter()
+            for event in events:
+                Notification.objects.create(
+                    user=event['user'], notification_type=event['notification_type'], message=event['message']
+                )
+            self.report('synchronous create', count, time.perf_counter() - started)
+
+            started = time.perf_counter()
+            for event in events:
+                notifications.notify(**event)
+            self.report('enqueue (request side)', count, time.perf_counter() - started)
+
+            # Enqueue the same events again: every one is a duplicate
+            notifications.notify_many(events)
+
+            started = time.perf_counter()
+            created = notifications.run_once(options['batch_size'])
+            self.report('worker drain', created, time.perf_counter() - started)
+            transaction.set_rollback(True)
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(f'{label:<24} {count:>8} notifications  {elapsed:8.3f}s  {count / elapsed:10.0f}/s')
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rent_user import retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold runs of similar notifications into digests, then move old read notifications '
+        'to the archive table (or to gzipped JSON Lines files with --to-directory)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive-after-days', type=int, default=None)
+        parser.add_argument('--coalesce-after-hours', type=int, default=None)
+        parser.add_argument('--min-count', type=int, default=None, help='Smallest run worth a digest')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--to-directory', default=None, help='Archive to files in this directory')
+        parser.add_argument('--skip-coalesce', action='store_true')
+        parser.add_argument('--skip-archive', action='store_true')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if not options['skip_coalesce']:
+            hours = options['coalesce_after_hours'] or retention.get_setting('COALESCE_AFTER_HOURS')
+            self.timed('coalesced', retention.coalesce, now - timedelta(hours=hours), options['min_count'])
+        if not options['skip_archive']:
+            days = options['archive_after_days'] or retention.get_setting('ARCHIVE_AFTER_DAYS')
+            self.timed(
+                'archived', retention.archive, now - timedelta(days=days),
+                options['to_directory'], options['batch_size'],
+            )
+
+    def timed(self, label, function, *args):
+        started = time.perf_counter()
+        rows = function(*args)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label:<10} {rows:>8} notifications  {elapsed:8.3f}s  {rows / elapsed:10.0f}/s')
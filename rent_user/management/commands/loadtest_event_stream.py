@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from rent_user import broadcast, notifications
+from rent_user.models import Notification
+from users.models import CustomUser
+
+
+def resident_memory():
+    """Resident set size of this process in bytes (Linux)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * 4096
+    except OSError:
+        raise CommandError('Memory is read from /proc/self/statm, which this system lacks')
+
+
+class Connection:
+    """One client of the ASGI application, driven in-process."""
+
+    def __init__(self, path, token):
+        self.scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'authorization', f'JWT {token}'.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        self.requested = False
+        self.status = None
+        self.opened = asyncio.Event()
+        self.notified = asyncio.Event()
+        self.closing = asyncio.Event()
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.closing.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body':
+            self.opened.set()
+            if b'event: notification' in message.get('body', b''):
+                self.notified.set()
+
+
+class Command(BaseCommand):
+    help = (
+        'Hold many idle event-stream connections open against the ASGI application in this '
+        'process, then push a notification to every user and time how long it takes to reach '
+        'each connection. Creates temporary users and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds to wait for each step.')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(email=f'loadtest-stream-{index}@example.com') for index in range(options['users'])
+        ])
+        try:
+            asyncio.run(self.run(users, options))
+        finally:
+            CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    async def run(self, users, options):
+        application = get_asgi_application()
+        path = reverse('event-stream')
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+        connections = [Connection(path, tokens[index % len(tokens)]) for index in range(options['connections'])]
+
+        memory_before, threads_before = resident_memory(), threading.active_count()
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(application(connection.scope, connection.receive, connection.send))
+            for connection in connections
+        ]
+        await asyncio.wait_for(
+            asyncio.gather(*(connection.opened.wait() for connection in connections)), options['timeout']
+        )
+        elapsed = time.perf_counter() - started
+        failed = sum(connection.status != 200 for connection in connections)
+        if failed:
+            raise CommandError(f'{failed} connections were refused')
+        memory = resident_memory() - memory_before
+        self.stdout.write(
+            f"opened {len(connections)} connections in {elapsed:.2f}s; "
+            f"{broadcast.get_broadcast().subscriber_count()} subscribed"
+        )
+        self.stdout.write(
+            f'memory: {memory / 2 ** 20:.1f} MiB total, {memory / len(connections) / 1024:.1f} KiB per connection; '
+            f'threads: {threading.active_count() - threads_before} more'
+        )
+
+        for round_number in range(options['rounds']):
+            for connection in connections:
+                connection.notified.clear()
+            started = time.perf_counter()
+            await asyncio.to_thread(self.notify_everyone, users, round_number)
+            await asyncio.wait_for(
+                asyncio.gather(*(connection.notified.wait() for connection in connections)), options['timeout']
+            )
+            self.stdout.write(
+                f'round {round_number + 1}: notification for {len(users)} users reached '
+                f'{len(connections)} connections in {(time.perf_counter() - started) * 1000:.1f} ms'
+            )
+
+        for connection in connections:
+            connection.closing.set()
+        await asyncio.wait_for(asyncio.gather(*tasks), options['timeout'])
+        self.stdout.write(f'closed; {broadcast.get_broadcast().subscriber_count()} still subscribed')
+
+    def notify_everyone(self, users, round_number):
+        # Written the way the notification worker writes a batch
+        created = Notification.objects.bulk_create([
+            Notification(user=user, notification_type='message', message=f'Load test round {round_number}')
+            for user in users
+        ])
+        notifications.notifications_created.send(sender=Notification, notifications=created)
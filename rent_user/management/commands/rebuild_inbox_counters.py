@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from rent_user import inbox
+
+
+class Command(BaseCommand):
+    help = 'Recompute the unread notification and message counters from the source tables'
+
+    def handle(self, *args, **options):
+        written = inbox.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} inbox counters'))
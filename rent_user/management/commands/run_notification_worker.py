@@ -0,0 +1,33 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from rent_user import notifications
+
+
+class Command(BaseCommand):
+    help = 'Write queued notifications in batches until stopped (or once with --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--purge-after-days', type=int, default=7,
+                            help='Delete finished jobs (and release their dedupe keys) after this many days')
+
+    def handle(self, *args, **options):
+        worker_id = uuid.uuid4().hex
+        while True:
+            created = notifications.run_once(options['batch_size'], worker_id)
+            if created:
+                self.stdout.write(f'Created {created} notifications')
+            if options['purge_after_days']:
+                notifications.purge(timezone.now() - timedelta(days=options['purge_after_days']))
+            if options['once']:
+                return
+            connections.close_all()
+            time.sleep(options['interval'])
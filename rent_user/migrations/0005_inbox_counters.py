@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from rent_user import inbox
+
+
+def backfill_counters(apps, schema_editor):
+    inbox.rebuild(
+        apps.get_model('rent_user', 'Notification'),
+        apps.get_model('rent_user', 'Message'),
+        apps.get_model('rent_user', 'InboxCounter'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_user', '0004_notification_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('notification', 'Notification'), ('message', 'Message')], max_length=12)),
+                ('key', models.CharField(max_length=100)),
+                ('unread', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'kind', 'key'), name='rent_user_inbox_counter_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from rent_user import conversations
+
+
+def backfill_conversations(apps, schema_editor):
+    conversations.backfill(apps.get_model('rent_user', 'Message'), apps.get_model('rent_user', 'Conversation'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_add', '0009_similar_advertisement'),
+        ('rent_user', '0005_inbox_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('advertisement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rent_add.rentadvertisement')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rent_user.message')),
+                ('participant_one', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('participant_two', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='rent_user.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at', 'id'], name='rent_user_msg_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['participant_one', 'last_message_at', 'id'], name='rent_user_conv_one_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['participant_two', 'last_message_at', 'id'], name='rent_user_conv_two_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('advertisement__isnull', False)), fields=('participant_one', 'participant_two', 'advertisement'), name='rent_user_conversation_ad_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('advertisement__isnull', True)), fields=('participant_one', 'participant_two'), name='rent_user_conversation_unique'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
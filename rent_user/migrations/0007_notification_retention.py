@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_user', '0006_conversations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='coalesced_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('notification_type', models.CharField(choices=[('rent_request', 'Rent Request'), ('request_accepted', 'Request Accepted'), ('request_rejected', 'Request Rejected'), ('ad_approved', 'Advertisement Approved'), ('ad_rejected', 'Advertisement Rejected'), ('new_review', 'New Review'), ('message', 'Message')], max_length=20)),
+                ('message', models.TextField()),
+                ('related_advertisement_id', models.UUIDField(blank=True, null=True)),
+                ('related_request_id', models.UUIDField(blank=True, null=True)),
+                ('is_read', models.BooleanField(default=True)),
+                ('coalesced_count', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at'], name='rent_user_archived_user_idx')],
+            },
+        ),
+    ]
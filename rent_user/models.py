@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from rent_add.models import RentAdvertisement, RentRequest
 from django.utils import timezone
@@ -21,19 +21,184 @@ class Notification(models.Model):
     related_advertisement = models.ForeignKey(RentAdvertisement, on_delete=models.CASCADE, null=True, blank=True)
     related_request = models.ForeignKey(RentRequest, on_delete=models.CASCADE, null=True, blank=True)
     is_read = models.BooleanField(default=False)
+    # How many notifications a digest row stands for (see rent_user/retention.py)
+    coalesced_count = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='rent_user_notif_user_idx'),
+            models.Index(fields=['user', 'is_read', 'created_at'], name='rent_user_notif_unread_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.notification_type}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The unread counters move in post_save; keep them in the same transaction
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+class ArchivedNotification(models.Model):
+    """A read notification moved out of the live table (see rent_user/retention.py)."""
+    # The notification's own id
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    message = models.TextField()
+    # Plain ids: archived rows outlive the ads and requests they mention
+    related_advertisement_id = models.UUIDField(null=True, blank=True)
+    related_request_id = models.UUIDField(null=True, blank=True)
+    is_read = models.BooleanField(default=True)
+    coalesced_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='rent_user_archived_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.notification_type} (archived)"
+
+
 class Message(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_messages')
     advertisement = models.ForeignKey(RentAdvertisement, on_delete=models.CASCADE, null=True, blank=True)
+    # Filled in on save from the sender, recipient and advertisement (rent_user/conversations.py)
+    conversation = models.ForeignKey(
+        'Conversation', on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name='messages'
+    )
     subject = models.CharField(max_length=200)
     content = models.TextField()
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The inbox is sender OR recipient, so each side gets its own index
+            models.Index(fields=['sender', 'created_at', 'id'], name='rent_user_msg_sender_idx'),
+            models.Index(fields=['recipient', 'created_at', 'id'], name='rent_user_msg_recipient_idx'),
+            models.Index(fields=['conversation', 'created_at', 'id'], name='rent_user_msg_thread_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.sender.username} to {self.recipient.username}: {self.subject}"
\ No newline at end of file
+        return f"{self.sender.username} to {self.recipient.username}: {self.subject}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+class Conversation(models.Model):
+    """
+    The messages between two users about one advertisement (or about none).
+    The participants are stored in a fixed order, so each pair has one row.
+    """
+    participant_one = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    participant_two = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    advertisement = models.ForeignKey(RentAdvertisement, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['participant_one', 'participant_two', 'advertisement'],
+                condition=models.Q(advertisement__isnull=False), name='rent_user_conversation_ad_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['participant_one', 'participant_two'],
+                condition=models.Q(advertisement__isnull=True), name='rent_user_conversation_unique',
+            ),
+        ]
+        indexes = [
+            # Listing is participant_one OR participant_two, newest first
+            models.Index(fields=['participant_one', 'last_message_at', 'id'], name='rent_user_conv_one_idx'),
+            models.Index(fields=['participant_two', 'last_message_at', 'id'], name='rent_user_conv_two_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.participant_one_id} and {self.participant_two_id} ({self.advertisement_id})"
+
+    def other_participant_id(self, user_id):
+        return self.participant_two_id if self.participant_one_id == user_id else self.participant_one_id
+
+
+class NotificationJob(models.Model):
+    """A notification waiting to be written by a worker (see rent_user/notifications.py)."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    message = models.TextField()
+    related_advertisement = models.ForeignKey(RentAdvertisement, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    related_request = models.ForeignKey(RentRequest, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # Events enqueued twice with the same key produce one notification
+    dedupe_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='rent_user_job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type} for {self.user_id} ({self.status})"
+
+    def to_notification(self):
+        return Notification(
+            user_id=self.user_id,
+            notification_type=self.notification_type,
+            message=self.message,
+            related_advertisement_id=self.related_advertisement_id,
+            related_request_id=self.related_request_id,
+        )
+
+
+class InboxCounter(models.Model):
+    """A user's unread notifications of one type, or messages in one conversation (see rent_user/inbox.py)."""
+    KIND_CHOICES = (
+        ('notification', 'Notification'),
+        ('message', 'Message'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='inbox_counters')
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    # The notification type, or "<sender id>:<advertisement id>" for a conversation
+    key = models.CharField(max_length=100)
+    unread = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'key'], name='rent_user_inbox_counter_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.key}: {self.unread}"
+
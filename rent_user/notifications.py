@@ -0,0 +1,193 @@
+"""
+Notification dispatch through a database-backed job queue.
+
+Request handlers call ``notify()``, which inserts a NotificationJob row
+inside the request's transaction. Workers claim ready jobs in batches and
+turn each batch into one ``Notification.objects.bulk_create``. The jobs are
+marked done in the same transaction, so a crashed worker never delivers a
+batch twice. Failed jobs are retried with exponential backoff and end up
+``failed`` after MAX_ATTEMPTS. Jobs enqueued twice with the same
+``dedupe_key`` produce one notification.
+
+There is no broker: by default each web process runs a background worker
+thread, woken as soon as a transaction that enqueued jobs commits. Set
+IN_PROCESS_WORKER to False and run the ``run_notification_worker`` command to
+move the work to dedicated processes. Any number of workers can run side by
+side; jobs are claimed with a conditional UPDATE.
+
+``notifications_created`` is sent with the new notifications once each
+batch commits, for delivery channels to hook into.
+"""
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from rent_user import inbox
+from rent_user.models import Notification, NotificationJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 500,
+    'MAX_ATTEMPTS': 5,
+    # Seconds before the first retry; doubles with every further attempt
+    'RETRY_DELAY': 30,
+    # Seconds a claimed batch stays locked before another worker may take it over
+    'LEASE': 60,
+    'IN_PROCESS_WORKER': True,
+    # Seconds between polls of the in-process worker when nothing wakes it (0: only on wakeups)
+    'POLL_INTERVAL': 5,
+}
+
+notifications_created = Signal()
+
+_worker_lock = threading.Lock()
+_worker = None
+_wakeup = threading.Event()
+
+
+def get_setting(name):
+    return getattr(settings, 'NOTIFICATION_QUEUE', {}).get(name, DEFAULTS[name])
+
+
+def notify(user, notification_type, message, related_advertisement=None, related_request=None, dedupe_key=None):
+    """Queue one notification; it is written once the current transaction commits."""
+    notify_many([{
+        'user': user,
+        'notification_type': notification_type,
+        'message': message,
+        'related_advertisement': related_advertisement,
+        'related_request': related_request,
+        'dedupe_key': dedupe_key,
+    }])
+
+
+def notify_many(events):
+    """
+    Queue several notifications in one INSERT. Each event is a dict of
+    notify()'s arguments; foreign keys may also be given as ``user_id`` etc.
+    """
+    jobs = [NotificationJob(**event) for event in events]
+    if not jobs:
+        return
+    NotificationJob.objects.bulk_create(jobs, ignore_conflicts=True)
+    if get_setting('IN_PROCESS_WORKER'):
+        transaction.on_commit(_wake_worker)
+
+
+def claim(batch_size, worker_id):
+    """Lock up to batch_size ready jobs for this worker and return them."""
+    now = timezone.now()
+    ready = Q(status='pending', available_at__lte=now) | Q(status='processing', locked_until__lt=now)
+    with transaction.atomic():
+        candidates = NotificationJob.objects.filter(ready).order_by('available_at', 'pk')
+        if connections[candidates.db].features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        job_ids = list(candidates.values_list('pk', flat=True)[:batch_size])
+        # Re-checking readiness in the UPDATE keeps two workers from taking the same job
+        NotificationJob.objects.filter(ready, pk__in=job_ids).update(
+            status='processing',
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=get_setting('LEASE')),
+            attempts=F('attempts') + 1,
+        )
+    return list(NotificationJob.objects.filter(pk__in=job_ids, locked_by=worker_id, status='processing'))
+
+
+def process(jobs):
+    """Write the notifications for claimed jobs; returns how many were created."""
+    if not jobs:
+        return 0
+    try:
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create([job.to_notification() for job in jobs])
+            inbox.count_created(notifications)
+            _mark_done(jobs)
+    except Exception:
+        # Find the job that broke the batch; the rest still go through
+        logger.exception('Notification batch failed, retrying jobs one by one')
+        return sum(_process_one(job) for job in jobs)
+    transaction.on_commit(lambda: notifications_created.send(sender=Notification, notifications=notifications))
+    return len(notifications)
+
+
+def _process_one(job):
+    try:
+        with transaction.atomic():
+            notification = job.to_notification()
+            notification.save()
+            _mark_done([job])
+    except Exception as exc:
+        _mark_failed(job, exc)
+        return 0
+    transaction.on_commit(lambda: notifications_created.send(sender=Notification, notifications=[notification]))
+    return 1
+
+
+def _mark_done(jobs):
+    NotificationJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+        status='done', locked_by='', locked_until=None, last_error=''
+    )
+
+
+def _mark_failed(job, exc):
+    if job.attempts >= get_setting('MAX_ATTEMPTS'):
+        logger.error('Giving up on notification job %s after %s attempts: %r', job.pk, job.attempts, exc)
+        status, available_at = 'failed', job.available_at
+    else:
+        status = 'pending'
+        available_at = timezone.now() + timedelta(seconds=get_setting('RETRY_DELAY') * 2 ** (job.attempts - 1))
+    NotificationJob.objects.filter(pk=job.pk).update(
+        status=status, available_at=available_at, locked_by='', locked_until=None, last_error=repr(exc)
+    )
+
+
+def run_once(batch_size=None, worker_id=None):
+    """Drain every ready job; returns the number of notifications created."""
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    worker_id = worker_id or uuid.uuid4().hex
+    created = 0
+    while True:
+        jobs = claim(batch_size, worker_id)
+        if not jobs:
+            return created
+        created += process(jobs)
+
+
+def purge(older_than):
+    """Delete finished jobs created before ``older_than``; their dedupe keys are released."""
+    deleted, _ = NotificationJob.objects.filter(status='done', created_at__lt=older_than).delete()
+    return deleted
+
+
+def _work_forever(interval):
+    while True:
+        _wakeup.wait(interval or None)
+        _wakeup.clear()
+        try:
+            run_once()
+        except Exception:
+            logger.exception('In-process notification worker failed')
+        finally:
+            # The worker thread has its own connection; don't leave it open between runs
+            connections.close_all()
+
+
+def _wake_worker():
+    global _worker
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                _worker = threading.Thread(
+                    target=_work_forever, args=[get_setting('POLL_INTERVAL')],
+                    name='notification-worker', daemon=True,
+                )
+                _worker.start()
+    _wakeup.set()
@@ -0,0 +1,143 @@
+"""
+Keeping the Notification table small.
+
+``coalesce()`` folds runs of similar notifications into one digest row.
+A run is at least MIN_COUNT notifications of one type about one ad for one
+user, older than COALESCE_AFTER_HOURS, for example a dozen rent requests
+on the same flat. The digest is the newest original's row, so it keeps that
+row's id and timestamp; it is unread if any of the originals was, and
+records how many it replaced in ``coalesced_count``.
+
+``archive()`` moves read notifications older than ARCHIVE_AFTER_DAYS out
+of the table. They go to ArchivedNotification, or, given a directory, to
+gzipped JSON Lines files. Rows are walked in primary-key order, one
+BATCH_SIZE transaction at a time with a PAUSE in between, so no lock is
+held for long and concurrent writers get through.
+
+The compact_notifications command runs both and reports rows per second.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from rent_user import inbox
+from rent_user.models import ArchivedNotification, Notification
+
+DEFAULTS = {
+    'ARCHIVE_AFTER_DAYS': 90,
+    'COALESCE_AFTER_HOURS': 24,
+    'MIN_COUNT': 5,
+    'BATCH_SIZE': 1000,
+    # Seconds to sleep between batches
+    'PAUSE': 0.05,
+}
+
+# Types that pile up about a single ad, and how their digests read
+DIGEST_MESSAGES = {
+    'rent_request': '{count} rent requests for "{title}"',
+    'new_review': '{count} new reviews on "{title}"',
+    'message': '{count} messages about "{title}"',
+}
+
+ARCHIVED_FIELDS = [
+    'id', 'user_id', 'notification_type', 'message', 'related_advertisement_id',
+    'related_request_id', 'is_read', 'coalesced_count', 'created_at',
+]
+
+
+def get_setting(name):
+    return getattr(settings, 'NOTIFICATION_RETENTION', {}).get(name, DEFAULTS[name])
+
+
+def coalesce(older_than=None, min_count=None):
+    """Replace each run with a digest; returns the number of notifications replaced."""
+    older_than = older_than or timezone.now() - timedelta(hours=get_setting('COALESCE_AFTER_HOURS'))
+    min_count = min_count or get_setting('MIN_COUNT')
+    runs = Notification.objects.filter(
+        notification_type__in=DIGEST_MESSAGES, related_advertisement__isnull=False, created_at__lt=older_than,
+    ).order_by().values('user_id', 'notification_type', 'related_advertisement_id').annotate(
+        rows=Count('pk'), first_id=Min('pk'), last_id=Max('pk'),
+    ).filter(rows__gte=min_count)
+
+    replaced = 0
+    for run in list(runs):
+        replaced += _coalesce_run(run, older_than)
+        time.sleep(get_setting('PAUSE'))
+    return replaced
+
+
+def _coalesce_run(run, older_than):
+    with transaction.atomic(), inbox.batched():
+        notifications = list(
+            Notification.objects.select_for_update().filter(
+                user_id=run['user_id'], notification_type=run['notification_type'],
+                related_advertisement_id=run['related_advertisement_id'],
+                pk__gte=run['first_id'], pk__lte=run['last_id'], created_at__lt=older_than,
+            ).select_related('related_advertisement')
+        )
+        if len(notifications) < 2:
+            return 0
+        count = sum(notification.coalesced_count for notification in notifications)
+        # The newest original becomes the digest, so it keeps that row's id and
+        # timestamp and stays in the pk order archive() walks
+        digest = max(notifications, key=lambda notification: (notification.created_at, notification.pk))
+        digest.message = DIGEST_MESSAGES[run['notification_type']].format(
+            count=count, title=digest.related_advertisement.title
+        )
+        digest.is_read = all(notification.is_read for notification in notifications)
+        digest.coalesced_count = count
+        digest.save(update_fields=['message', 'is_read', 'coalesced_count'])
+        Notification.objects.filter(
+            pk__in=[notification.pk for notification in notifications if notification.pk != digest.pk]
+        ).delete()
+    return len(notifications)
+
+
+def archive(older_than=None, directory=None, batch_size=None):
+    """Move old read notifications out of the table; returns how many were moved."""
+    older_than = older_than or timezone.now() - timedelta(days=get_setting('ARCHIVE_AFTER_DAYS'))
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    moved = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Notification.objects.filter(pk__gt=last_pk).order_by('pk').values(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not batch or min(row['created_at'] for row in batch) >= older_than:
+                # Ids grow with time, so everything further on is too recent
+                return moved
+            last_pk = batch[-1]['id']
+            rows = [row for row in batch if row['is_read'] and row['created_at'] < older_than]
+            if rows:
+                if directory:
+                    write_chunk(directory, rows)
+                else:
+                    ArchivedNotification.objects.bulk_create(
+                        [ArchivedNotification(**row) for row in rows], ignore_conflicts=True
+                    )
+                with inbox.batched():
+                    Notification.objects.filter(pk__in=[row['id'] for row in rows], is_read=True).delete()
+                moved += len(rows)
+        time.sleep(get_setting('PAUSE'))
+
+
+def write_chunk(directory, rows):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"notifications-{rows[0]['id']}-{rows[-1]['id']}.jsonl.gz")
+    lines = ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+    with open(path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as chunk:
+            chunk.write(lines.encode())
+        # On disk before the rows are deleted
+        raw.flush()
+        os.fsync(raw.fileno())
+    return path
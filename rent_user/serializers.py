@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from users.models import CustomUser
-from rent_user.models import Notification, Message
+from rent_user.models import Conversation, Notification, Message
 from rent_add.models import RentAdvertisement, RentRequest ,AdvertisementImage, FavoriteAdvertisement, Review
 from rent_type.models import Category, Amenity
+from rent_api.values import ValuesSerializer
 
 
 
@@ -33,6 +34,11 @@ class NotificationSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class NotificationValuesSerializer(ValuesSerializer):
+    """NotificationSerializer over .values() rows (rent_api/values.py)."""
+    serializer_class = NotificationSerializer
+
+
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -48,7 +54,47 @@ class MessageSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['sender']
 
+class MessageValuesSerializer(ValuesSerializer):
+    """MessageSerializer over .values() rows (rent_api/values.py)."""
+    serializer_class = MessageSerializer
+
 class MessageCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = ['recipient', 'advertisement', 'subject', 'content']
\ No newline at end of file
+        fields = ['recipient', 'advertisement', 'subject', 'content']
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    other_participant = serializers.SerializerMethodField()
+    advertisement_title = serializers.CharField(source='advertisement.title', read_only=True, default=None)
+    last_message = serializers.SerializerMethodField()
+    unread = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Conversation
+        fields = [
+            'id', 'other_participant', 'advertisement', 'advertisement_title',
+            'last_message', 'last_message_at', 'unread'
+        ]
+
+    def get_other_participant(self, obj):
+        user = self.context['request'].user
+        other = obj.participant_two if obj.participant_one_id == user.pk else obj.participant_one
+        return UserSerializer(other).data
+
+    def get_last_message(self, obj):
+        message = obj.last_message
+        if message is None:
+            return None
+        return {
+            'id': message.pk,
+            'sender': message.sender_id,
+            'subject': message.subject,
+            'preview': message.content[:140],
+            'is_read': message.is_read,
+            'created_at': serializers.DateTimeField().to_representation(message.created_at),
+        }
+
+    def get_unread(self, obj):
+        return self.context.get('unread', {}).get(obj.pk, 0)
+
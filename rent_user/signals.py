@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from rent_user import broadcast, conversations, inbox, notifications, stream
+from rent_user.models import Conversation, Message, Notification
+
+
+def publish_notifications(created):
+    layer = broadcast.get_broadcast()
+    for notification in created:
+        layer.publish(broadcast.user_channel(notification.user_id), stream.notification_event(notification))
+
+
+def publish_message(message):
+    layer = broadcast.get_broadcast()
+    event = stream.message_event(message)
+    for user_id in {message.sender_id, message.recipient_id}:
+        layer.publish(broadcast.user_channel(user_id), event)
+
+
+@receiver(post_save, sender=Notification)
+def publish_notification_on_save(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_notifications([instance]), robust=True)
+
+
+@receiver(notifications.notifications_created)
+def publish_queued_notifications(sender, notifications, **kwargs):
+    # Sent after commit for batches written with bulk_create, which skips post_save.
+    # Jobs retried one by one are saved and published twice; streams drop the repeat.
+    publish_notifications([notification for notification in notifications if notification.pk is not None])
+
+
+@receiver(post_save, sender=Message)
+def publish_message_on_save(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_message(instance), robust=True)
+
+
+def saved_values(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification_on_save(sender, instance, created, **kwargs):
+    old = {} if created else getattr(instance, '_loaded_values', {})
+    inbox.adjust(inbox.changes(inbox.notification_counts(old), inbox.notification_counts(saved_values(instance))))
+
+
+@receiver(post_delete, sender=Notification)
+def count_unread_notification_on_delete(sender, instance, **kwargs):
+    inbox.adjust(inbox.changes(inbox.notification_counts(saved_values(instance)), {}))
+
+
+@receiver(post_save, sender=Message)
+def count_unread_message_on_save(sender, instance, created, **kwargs):
+    old = {} if created else getattr(instance, '_loaded_values', {})
+    inbox.adjust(inbox.changes(inbox.message_counts(old), inbox.message_counts(saved_values(instance))))
+
+
+@receiver(post_delete, sender=Message)
+def count_unread_message_on_delete(sender, instance, **kwargs):
+    inbox.adjust(inbox.changes(inbox.message_counts(saved_values(instance)), {}))
+
+
+@receiver(pre_save, sender=Message)
+def file_message_in_conversation(sender, instance, **kwargs):
+    if instance.conversation_id is None and instance.sender_id and instance.recipient_id:
+        instance.conversation = conversations.get_or_create(
+            instance.sender_id, instance.recipient_id, instance.advertisement_id
+        )
+
+
+@receiver(post_save, sender=Message)
+def move_conversation_forward(sender, instance, created, **kwargs):
+    if created and instance.conversation_id:
+        conversations.record_message(instance)
+
+
+@receiver(post_delete, sender=Message)
+def refresh_conversation_on_delete(sender, instance, **kwargs):
+    if instance.conversation_id:
+        conversations.refresh_last_message(Conversation.objects.filter(pk=instance.conversation_id))
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_save, sender=Message)
+def remember_saved_values(sender, instance, **kwargs):
+    # Connected after the receivers above, which compare against the old values
+    instance._loaded_values = {**getattr(instance, '_loaded_values', {}), **saved_values(instance)}
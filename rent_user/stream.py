@@ -0,0 +1,197 @@
+"""
+Server-sent events for a user's new notifications and messages.
+
+``/api/v1/stream/`` answers with ``text/event-stream``. Each event carries
+an ``id`` of the form ``<notification id>.<message id>``, the newest of each
+the client has seen. Browsers send it back as ``Last-Event-ID`` when they
+reconnect (other clients may pass ``?last_event_id=``), and the stream
+resumes with whatever was created after it. Without one the stream starts
+at the user's current newest items.
+
+The stream subscribes to the user's broadcast channel before reading the
+database, so nothing created in between is missed; events already covered
+by the cursor are dropped. Served over WSGI, where a request can't be held
+open cheaply, the endpoint returns the pending events and a ``retry`` hint
+and closes, and clients simply reconnect.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, connections
+from django.db.models import Max, Q
+from django.http import HttpResponse, JsonResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from rent_user import broadcast
+from rent_user.models import Message, Notification
+from rent_user.serializers import MessageSerializer, NotificationSerializer
+
+# Events read from the database per query when catching up
+CATCH_UP_BATCH = 100
+# Threads, and so database connections, shared by every stream in the process
+DATABASE_THREADS = 4
+
+_executor = ThreadPoolExecutor(DATABASE_THREADS, thread_name_prefix='event-stream')
+
+
+class Cursor:
+    """The newest notification and message ids a client has seen."""
+
+    def __init__(self, notification=0, message=0):
+        self.notification = notification
+        self.message = message
+
+    @classmethod
+    def parse(cls, value):
+        try:
+            notification, message = (int(part) for part in value.split('.'))
+        except (AttributeError, ValueError):
+            return None
+        return cls(max(notification, 0), max(message, 0))
+
+    def __str__(self):
+        return f'{self.notification}.{self.message}'
+
+    def advance(self, event):
+        """Move past an event; returns False if it was already seen."""
+        if event['id'] <= getattr(self, event['type']):
+            return False
+        setattr(self, event['type'], event['id'])
+        return True
+
+
+def notification_event(notification):
+    return {
+        'type': 'notification',
+        'id': notification.pk,
+        'data': JSONRenderer().render(NotificationSerializer(notification).data).decode(),
+    }
+
+
+def message_event(message):
+    return {
+        'type': 'message',
+        'id': message.pk,
+        'data': JSONRenderer().render(MessageSerializer(message).data).decode(),
+    }
+
+
+def format_event(event, cursor):
+    return f"id: {cursor}\nevent: {event['type']}\ndata: {event['data']}\n\n"
+
+
+def messages_of(user_id):
+    return Message.objects.filter(Q(sender_id=user_id) | Q(recipient_id=user_id))
+
+
+def current_cursor(user_id):
+    return Cursor(
+        Notification.objects.filter(user_id=user_id).aggregate(newest=Max('pk'))['newest'] or 0,
+        messages_of(user_id).aggregate(newest=Max('pk'))['newest'] or 0,
+    )
+
+
+def catch_up(user_id, cursor):
+    """Events after the cursor, oldest first; at most CATCH_UP_BATCH of each kind."""
+    notifications = Notification.objects.filter(user_id=user_id, pk__gt=cursor.notification).order_by('pk')
+    messages = messages_of(user_id).filter(pk__gt=cursor.message).select_related(
+        'sender', 'recipient', 'advertisement'
+    ).order_by('pk')
+    return (
+        [notification_event(notification) for notification in notifications[:CATCH_UP_BATCH]]
+        + [message_event(message) for message in messages[:CATCH_UP_BATCH]]
+    )
+
+
+def _run(func, *args):
+    try:
+        return func(*args)
+    except DatabaseError:
+        # Let the next call on this thread reconnect
+        connections.close_all()
+        raise
+
+
+async def database(func, *args):
+    """
+    Run database work for a stream. A stream outlives its request, so it
+    can't hold on to a connection of its own; the queries of all streams go
+    through a small pool of threads instead.
+    """
+    return await sync_to_async(_run, thread_sensitive=False, executor=_executor)(func, *args)
+
+
+def authenticate(request):
+    """The user of the JWT in the Authorization header or ``?token=``, or None."""
+    authentication = JWTAuthentication()
+    try:
+        raw_token = request.GET.get('token')
+        if raw_token:
+            return authentication.get_user(authentication.get_validated_token(raw_token))
+        result = authentication.authenticate(request)
+    except (InvalidToken, TokenError):
+        return None
+    return result[0] if result else None
+
+
+def unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+def requested_cursor(request):
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    return Cursor.parse(last_event_id) if last_event_id else None
+
+
+def pending_response(request):
+    """The events after the client's cursor as one finished response, for WSGI."""
+    user = authenticate(request)
+    if user is None:
+        return unauthorized()
+    cursor = requested_cursor(request) or current_cursor(user.pk)
+    body = f"retry: {broadcast.get_setting('RETRY')}\n\n" + ''.join(pending_events(user.pk, cursor))
+    return HttpResponse(body, content_type='text/event-stream')
+
+
+def pending_events(user_id, cursor):
+    """Every event after the cursor, formatted; moves the cursor."""
+    chunks = []
+    while True:
+        events = [event for event in catch_up(user_id, cursor) if cursor.advance(event)]
+        chunks.extend(format_event(event, cursor) for event in events)
+        if len(events) < CATCH_UP_BATCH:
+            return chunks
+
+
+async def events(user_id, cursor, subscription):
+    """The body of a streaming response; runs until the client goes away."""
+    loop = asyncio.get_running_loop()
+    heartbeat = broadcast.get_setting('HEARTBEAT')
+    poll_interval = broadcast.get_setting('POLL_INTERVAL')
+    try:
+        yield f"retry: {broadcast.get_setting('RETRY')}\n\n"
+        last_write = next_poll = loop.time()
+        while True:
+            if loop.time() >= next_poll or subscription.overflowed:
+                subscription.overflowed = False
+                chunks = await database(pending_events, user_id, cursor)
+                if chunks:
+                    last_write = loop.time()
+                    yield ''.join(chunks)
+                next_poll = loop.time() + poll_interval if poll_interval else float('inf')
+            timeout = max(0, min(last_write + heartbeat, next_poll) - loop.time())
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if loop.time() >= last_write + heartbeat:
+                    last_write = loop.time()
+                    yield ': keep-alive\n\n'
+                continue
+            if cursor.advance(event):
+                last_write = loop.time()
+                yield format_event(event, cursor)
+    finally:
+        broadcast.get_broadcast().unsubscribe(subscription)
@@ -1,3 +1,447 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import CustomUser
+from rent_add.models import RentAdvertisement
+from rent_user import broadcast, conversations, inbox, notifications, retention, stream
+from rent_user.models import (
+    ArchivedNotification, Conversation, InboxCounter, Message, Notification, NotificationJob
+)
+
+
+def create_user(email, **extra_fields):
+    return CustomUser.objects.create_user(
+        email=email, password='pass12345', first_name='Test', last_name='User', **extra_fields
+    )
+
+
+class MessagePaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user('user@example.com')
+        self.other = create_user('other@example.com')
+        for index in range(5):
+            Message.objects.create(sender=self.other, recipient=self.user, subject=f'Hello {index}', content='Hi')
+        self.client.force_authenticate(self.user)
+
+    def test_plain_list_without_cursor(self):
+        response = self.client.get('/api/v1/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+
+    def test_cursor_pages(self):
+        response = self.client.get('/api/v1/messages/', {'cursor': '', 'page_size': 2})
+        subjects = []
+        while True:
+            subjects += [item['subject'] for item in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(subjects, [f'Hello {index}' for index in range(4, -1, -1)])
+
+
+@override_settings(NOTIFICATION_QUEUE={'IN_PROCESS_WORKER': False, 'BATCH_SIZE': 2, 'MAX_ATTEMPTS': 2})
+class NotificationQueueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user('user@example.com')
+        self.other = create_user('other@example.com')
+
+    def test_jobs_are_written_in_batches(self):
+        notifications.notify_many([
+            {'user': self.user, 'notification_type': 'message', 'message': f'Hello {index}'} for index in range(5)
+        ])
+        self.assertFalse(Notification.objects.exists())
+        received = []
+        handler = lambda sender, notifications, **kwargs: received.append(len(notifications))
+        notifications.notifications_created.connect(handler)
+        self.addCleanup(notifications.notifications_created.disconnect, handler)
+
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(notifications.run_once(), 5)
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT INTO "rent_user_notification"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(received, [2, 2, 1])
+        self.assertFalse(NotificationJob.objects.exclude(status='done').exists())
+
+    def test_duplicate_events_are_dropped(self):
+        for _ in range(2):
+            notifications.notify(self.user, 'message', 'Hello', dedupe_key='message:1')
+        notifications.run_once()
+        notifications.notify(self.user, 'message', 'Hello', dedupe_key='message:1')
+        self.assertEqual(notifications.run_once(), 0)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_failures_are_retried_then_given_up(self):
+        notifications.notify(self.user, 'message', 'Good')
+        notifications.notify(self.other, 'message', 'Poison')
+        original_save = Notification.save
+
+        def save(notification, *args, **kwargs):
+            if notification.message == 'Poison':
+                raise ValueError('boom')
+            return original_save(notification, *args, **kwargs)
+
+        with mock.patch.object(Notification.objects, 'bulk_create', side_effect=ValueError('batch')), \
+                mock.patch.object(Notification, 'save', save), \
+                self.assertLogs('rent_user.notifications', 'ERROR'):
+            self.assertEqual(notifications.run_once(), 1)
+            poison = NotificationJob.objects.get(message='Poison')
+            self.assertEqual((poison.status, poison.attempts), ('pending', 1))
+            self.assertGreater(poison.available_at, timezone.now())
+
+            NotificationJob.objects.filter(pk=poison.pk).update(available_at=timezone.now())
+            self.assertEqual(notifications.run_once(), 0)
+        poison.refresh_from_db()
+        self.assertEqual((poison.status, poison.attempts), ('failed', 2))
+        self.assertIn('boom', poison.last_error)
+        self.assertEqual(list(Notification.objects.values_list('message', flat=True)), ['Good'])
+
+    def test_sending_a_message_queues_the_notification(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/v1/messages/', {
+            'recipient': str(self.other.pk), 'subject': 'Hi', 'content': 'Is it free?',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertFalse(Notification.objects.exists())
+        notifications.run_once()
+        self.assertEqual(Notification.objects.get().user, self.other)
+
+
+class EventStreamCursorTests(TestCase):
+    def setUp(self):
+        self.user = create_user('user@example.com')
+        self.other = create_user('other@example.com')
+
+    def test_resume_after_last_event_id(self):
+        first = Notification.objects.create(user=self.user, notification_type='message', message='One')
+        Notification.objects.create(user=self.other, notification_type='message', message='Not mine')
+        message = Message.objects.create(sender=self.other, recipient=self.user, subject='Hi', content='Hello')
+        cursor = stream.Cursor.parse(f'{first.pk}.0')
+
+        chunks = stream.pending_events(self.user.pk, cursor)
+
+        self.assertEqual(len(chunks), 1)
+        self.assertIn('event: message', chunks[0])
+        self.assertEqual(str(cursor), f'{first.pk}.{message.pk}')
+        self.assertEqual(stream.pending_events(self.user.pk, cursor), [])
+
+    def test_live_events_already_seen_are_dropped(self):
+        cursor = stream.Cursor(5, 3)
+        self.assertFalse(cursor.advance({'type': 'notification', 'id': 5}))
+        self.assertTrue(cursor.advance({'type': 'message', 'id': 4}))
+        self.assertEqual(str(cursor), '5.4')
+
+    def test_invalid_last_event_id(self):
+        self.assertIsNone(stream.Cursor.parse('abc'))
+        self.assertIsNone(stream.Cursor.parse('1.2.3'))
+
+    def test_polling_fallback_without_asgi(self):
+        Notification.objects.create(user=self.user, notification_type='message', message='One')
+        token = AccessToken.for_user(self.user)
+
+        response = self.client.get('/api/v1/stream/', {'token': str(token), 'last_event_id': '0.0'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertIn('event: notification', body)
+
+    def test_requires_token(self):
+        response = self.client.get('/api/v1/stream/', {'token': 'bogus'})
+        self.assertEqual(response.status_code, 401)
+
+
+class EventStreamTests(TransactionTestCase):
+    # Stream queries run on their own threads, so the data has to be committed
+
+    def setUp(self):
+        self.user = create_user('user@example.com')
+        self.other = create_user('other@example.com')
+        self.headers = {'Authorization': f'JWT {AccessToken.for_user(self.user)}'}
+
+    async def next_chunk(self, content):
+        return (await asyncio.wait_for(anext(content), 5)).decode()
+
+    async def disconnect(self, content):
+        # A client going away cancels the task streaming the response
+        waiting = asyncio.ensure_future(anext(content))
+        await asyncio.sleep(0.1)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+
+    async def test_pushes_new_messages_and_notifications(self):
+        response = await self.async_client.get('/api/v1/stream/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        content = aiter(response.streaming_content)
+        self.assertTrue((await self.next_chunk(content)).startswith('retry: '))
+
+        message = await sync_to_async(Message.objects.create)(
+            sender=self.other, recipient=self.user, subject='Hi', content='Hello'
+        )
+        chunk = await self.next_chunk(content)
+        self.assertIn('event: message', chunk)
+        self.assertIn(f'id: 0.{message.pk}', chunk)
+
+        # Written by the notification worker with bulk_create
+        created = await sync_to_async(Notification.objects.bulk_create)([
+            Notification(user=self.user, notification_type='message', message='New message')
+        ])
+        await sync_to_async(notifications.notifications_created.send)(sender=Notification, notifications=created)
+        chunk = await self.next_chunk(content)
+        self.assertIn('event: notification', chunk)
+        self.assertIn(f'id: {created[0].pk}.{message.pk}', chunk)
+
+        await self.disconnect(content)
+        self.assertEqual(broadcast.get_broadcast().subscriber_count(), 0)
+
+    async def test_reconnect_replays_missed_events(self):
+        notification = await sync_to_async(Notification.objects.create)(
+            user=self.user, notification_type='message', message='While away'
+        )
+        response = await self.async_client.get('/api/v1/stream/', headers={**self.headers, 'Last-Event-ID': '0.0'})
+        content = aiter(response.streaming_content)
+        await self.next_chunk(content)
+
+        chunk = await self.next_chunk(content)
+        self.assertIn('While away', chunk)
+        self.assertIn(f'id: {notification.pk}.0', chunk)
+        await self.disconnect(content)
+
+
+@override_settings(NOTIFICATION_QUEUE={'IN_PROCESS_WORKER': False})
+class InboxSummaryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user('user@example.com')
+        self.other = create_user('other@example.com')
+        self.client.force_authenticate(self.user)
+
+    def summary(self):
+        response = self.client.get('/api/v1/inbox/summary/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_follow_creates_reads_and_deletes(self):
+        first = Notification.objects.create(user=self.user, notification_type='message', message='One')
+        Notification.objects.create(user=self.user, notification_type='new_review', message='Two')
+        notifications.notify(self.user, 'message', 'Queued')
+        notifications.run_once()
+        Message.objects.create(sender=self.other, recipient=self.user, subject='Hi', content='Hello')
+        read = Message.objects.create(sender=self.other, recipient=self.user, subject='Hi', content='Again')
+        Message.objects.create(sender=self.user, recipient=self.other, subject='Re', content='Mine')
+
+        summary = self.summary()
+        self.assertEqual(summary['notifications'], {'unread': 3, 'by_type': {'message': 2, 'new_review': 1}})
+        self.assertEqual(summary['messages']['conversations'], [
+            {'user': str(self.other.pk), 'advertisement': None, 'unread': 2},
+        ])
+
+        self.assertEqual(self.client.post(f'/api/v1/notifications/{first.pk}/mark_as_read/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/v1/messages/{read.pk}/mark_as_read/').status_code, 200)
+        Notification.objects.get(notification_type='new_review').delete()
+
+        summary = self.summary()
+        self.assertEqual(summary['notifications'], {'unread': 1, 'by_type': {'message': 1}})
+        self.assertEqual(summary['messages']['unread'], 1)
+
+    def test_mark_all_as_read_resets_with_one_update(self):
+        for index in range(3):
+            Notification.objects.create(user=self.user, notification_type='message', message=str(index))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/v1/notifications/mark_all_as_read/')
+        self.assertEqual(response.status_code, 200)
+        counter_updates = [query for query in queries if 'UPDATE "rent_user_inboxcounter"' in query['sql']]
+        self.assertEqual(len(counter_updates), 1)
+        self.assertEqual(self.summary()['notifications'], {'unread': 0, 'by_type': {}})
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_rebuild_matches_signal_maintained_counters(self):
+        Notification.objects.create(user=self.user, notification_type='message', message='One')
+        Message.objects.create(sender=self.other, recipient=self.user, subject='Hi', content='Hello')
+        expected = self.summary()
+        InboxCounter.objects.update(unread=7)
+
+        inbox.rebuild()
+
+        self.assertEqual(self.summary(), expected)
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user('user@example.com')
+        self.other = create_user('other@example.com')
+        self.third = create_user('third@example.com')
+        self.advertisement = RentAdvertisement.objects.create(
+            owner=self.other, title='Flat', description='A nice flat', price='1000.00',
+            location='Dhaka', bedrooms=2, bathrooms=1, status='approved',
+        )
+        self.client.force_authenticate(self.user)
+
+    def send(self, sender, recipient, content, advertisement=None):
+        return Message.objects.create(
+            sender=sender, recipient=recipient, advertisement=advertisement, subject='Hi', content=content
+        )
+
+    def test_messages_are_threaded_by_pair_and_advertisement(self):
+        first = self.send(self.user, self.other, 'Is it free?', self.advertisement)
+        reply = self.send(self.other, self.user, 'Yes', self.advertisement)
+        general = self.send(self.other, self.user, 'Hello')
+
+        self.assertEqual(first.conversation_id, reply.conversation_id)
+        self.assertNotEqual(first.conversation_id, general.conversation_id)
+        self.assertEqual(Conversation.objects.get(pk=first.conversation_id).last_message, reply)
+
+    def test_listing_with_previews_and_unread_counts(self):
+        self.send(self.other, self.user, 'Is it free?', self.advertisement)
+        self.send(self.other, self.user, 'Still there?', self.advertisement)
+        self.send(self.third, self.user, 'Old news')
+        Message.objects.filter(content='Old news').update(created_at=timezone.now() - timedelta(days=1))
+        conversations.refresh_last_message(Conversation.objects.all())
+        self.send(self.third, self.other, 'Not yours')
+
+        response = self.client.get('/api/v1/conversations/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['last_message']['preview'] for item in response.data], ['Still there?', 'Old news'])
+        latest = response.data[0]
+        self.assertEqual(latest['other_participant']['id'], str(self.other.pk))
+        self.assertEqual((latest['advertisement'], latest['advertisement_title']), (self.advertisement.pk, 'Flat'))
+        self.assertEqual(latest['unread'], 2)
+        self.assertEqual(self.client.get('/api/v1/inbox/summary/').data['messages']['conversations'][0], {
+            'user': str(self.other.pk), 'advertisement': str(self.advertisement.pk), 'unread': 2,
+        })
+
+        self.client.post(f"/api/v1/conversations/{latest['id']}/mark_as_read/")
+        response = self.client.get('/api/v1/conversations/')
+        self.assertEqual([item['unread'] for item in response.data], [0, 1])
+        self.assertEqual(self.client.get('/api/v1/inbox/summary/').data['messages']['unread'], 1)
+
+    def test_thread_messages_are_cursor_paged(self):
+        for index in range(5):
+            self.send(self.other, self.user, f'Message {index}')
+        conversation = Conversation.objects.get()
+
+        contents = []
+        url = f'/api/v1/conversations/{conversation.pk}/messages/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            contents += [item['content'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(contents, [f'Message {index}' for index in reversed(range(5))])
+
+    def test_outsiders_cannot_read_a_thread(self):
+        self.send(self.other, self.third, 'Private')
+        conversation = Conversation.objects.get()
+        response = self.client.get(f'/api/v1/conversations/{conversation.pk}/messages/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_backfill_files_existing_messages(self):
+        self.send(self.user, self.other, 'One', self.advertisement)
+        self.send(self.other, self.user, 'Two', self.advertisement)
+        last = self.send(self.third, self.user, 'Three')
+        Message.objects.update(conversation=None)
+        Conversation.objects.all().delete()
+
+        self.assertEqual(conversations.backfill(batch_size=2), 3)
+
+        self.assertEqual(Conversation.objects.count(), 2)
+        self.assertFalse(Message.objects.filter(conversation__isnull=True).exists())
+        self.assertEqual(Message.objects.get(pk=last.pk).conversation.last_message_id, last.pk)
+
+
+@override_settings(NOTIFICATION_RETENTION={'PAUSE': 0})
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.user = create_user('user@example.com')
+        self.advertisement = RentAdvertisement.objects.create(
+            owner=self.user, title='Flat', description='A nice flat', price='1000.00',
+            location='Dhaka', bedrooms=2, bathrooms=1, status='approved',
+        )
+        self.now = timezone.now()
+
+    def notification(self, age, **fields):
+        notification = Notification.objects.create(
+            user=self.user, notification_type='rent_request', message='New request',
+            related_advertisement=self.advertisement, **fields
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=self.now - age)
+        return notification
+
+    def test_runs_are_coalesced_into_a_digest(self):
+        for index in range(6):
+            self.notification(timedelta(days=2, minutes=index), is_read=index > 0)
+        recent = self.notification(timedelta(minutes=1))
+
+        replaced = retention.coalesce(self.now - timedelta(days=1), min_count=5)
+
+        self.assertEqual(replaced, 6)
+        digest = Notification.objects.exclude(pk=recent.pk).get()
+        self.assertEqual(digest.coalesced_count, 6)
+        self.assertEqual(digest.message, '6 rent requests for "Flat"')
+        self.assertFalse(digest.is_read)
+        self.assertEqual(digest.created_at, self.now - timedelta(days=2))
+        self.assertEqual(inbox.summary(self.user.pk)['notifications']['unread'], 2)
+
+    def test_digests_are_archived(self):
+        originals = [self.notification(timedelta(days=100, minutes=index), is_read=True) for index in range(5)]
+        recent = [self.notification(timedelta(minutes=1)) for _ in range(3)]
+        retention.coalesce(self.now - timedelta(days=1), min_count=5)
+        [digest] = Notification.objects.exclude(pk__in=[item.pk for item in recent])
+        self.assertEqual(digest.pk, originals[0].pk)
+
+        self.assertEqual(retention.archive(self.now - timedelta(days=90), batch_size=2), 1)
+        self.assertEqual(ArchivedNotification.objects.get().coalesced_count, 5)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_short_runs_are_left_alone(self):
+        for index in range(3):
+            self.notification(timedelta(days=2))
+        self.assertEqual(retention.coalesce(self.now - timedelta(days=1), min_count=5), 0)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_old_read_notifications_are_archived_in_batches(self):
+        old_read = [self.notification(timedelta(days=100), is_read=True) for _ in range(5)]
+        old_unread = self.notification(timedelta(days=100))
+        new_read = self.notification(timedelta(days=1), is_read=True)
+
+        moved = retention.archive(self.now - timedelta(days=90), batch_size=2)
+
+        self.assertEqual(moved, 5)
+        self.assertEqual(
+            set(Notification.objects.values_list('pk', flat=True)), {old_unread.pk, new_read.pk}
+        )
+        self.assertEqual(
+            set(ArchivedNotification.objects.values_list('pk', flat=True)), {item.pk for item in old_read}
+        )
+
+    def test_archive_to_files(self):
+        old = self.notification(timedelta(days=100), is_read=True)
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(retention.archive(self.now - timedelta(days=90), directory=directory), 1)
+            [path] = [os.path.join(directory, name) for name in os.listdir(directory)]
+            with gzip.open(path, 'rt') as chunk:
+                rows = [json.loads(line) for line in chunk]
+        self.assertEqual([row['id'] for row in rows], [old.pk])
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(ArchivedNotification.objects.exists())
 
-# Create your tests here.
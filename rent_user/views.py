@@ -1,14 +1,26 @@
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_GET
 
-from .models import Notification, Message
+from rent_api.pagination import OptionalKeysetPagination, StrictKeysetPagination
+from rent_api.performance import PerformanceMixin
+from rent_api.values import ValuesListMixin
+from rent_user import broadcast, inbox, notifications, stream
+from .models import Conversation, Notification, Message
 from .serializers import (
     NotificationSerializer, 
     MessageSerializer, 
-    MessageCreateSerializer
+    MessageCreateSerializer,
+    ConversationSerializer,
+    MessageValuesSerializer,
+    NotificationValuesSerializer
 )
 
 
@@ -39,26 +51,45 @@ from .serializers import (
 #         Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
 #         return Response({'status': 'all notifications marked as read'})
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(PerformanceMixin, ValuesListMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
+    values_serializer_class = NotificationValuesSerializer
     queryset = Notification.objects.all()
+    pagination_class = OptionalKeysetPagination
 
     def get_queryset(self):
         # Only return notifications for the current user
-        return Notification.objects.filter(user=self.request.user)
+        return Notification.objects.filter(user=self.request.user).order_by('-created_at', '-id')
 
     def perform_create(self, serializer):
         # Automatically assign the current user
         serializer.save(user=self.request.user)
 
+    @action(detail=True, methods=['post'])
+    def mark_as_read(self, request, pk=None):
+        notification = self.get_object()
+        if not notification.is_read:
+            notification.is_read = True
+            notification.save(update_fields=['is_read'])
+        return Response({'status': 'notification marked as read'})
 
-class MessageViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def mark_all_as_read(self, request):
+        with transaction.atomic():
+            Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+            inbox.reset(request.user.pk, 'notification')
+        return Response({'status': 'all notifications marked as read'})
+
+
+class MessageViewSet(PerformanceMixin, ValuesListMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
+    pagination_class = OptionalKeysetPagination
+    values_serializer_class = MessageValuesSerializer
     
     def get_queryset(self):
         return Message.objects.filter(
             Q(sender=self.request.user) | Q(recipient=self.request.user)
-        ).order_by('-created_at')
+        ).order_by('-created_at', '-id')
     
     def get_serializer_class(self):
         if self.action in ['create']:
@@ -68,10 +99,97 @@ class MessageViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         message = serializer.save(sender=self.request.user)
         
-        # Create notification for the recipient
-        Notification.objects.create(
+        # Notify the recipient
+        notifications.notify(
             user=message.recipient,
             notification_type='message',
             message=f'You have a new message from {self.request.user.username}.',
-            related_advertisement=message.advertisement
-        )
\ No newline at end of file
+            related_advertisement=message.advertisement,
+            dedupe_key=f'message:{message.pk}'
+        )
+
+    @action(detail=True, methods=['post'])
+    def mark_as_read(self, request, pk=None):
+        message = self.get_object()
+        if message.recipient_id != request.user.pk:
+            return Response({'error': 'Only the recipient can mark a message as read'}, status=status.HTTP_403_FORBIDDEN)
+        if not message.is_read:
+            message.is_read = True
+            message.save(update_fields=['is_read'])
+        return Response({'status': 'message marked as read'})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_as_read(self, request):
+        with transaction.atomic():
+            Message.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+            inbox.reset(request.user.pk, 'message')
+        return Response({'status': 'all messages marked as read'})
+
+
+class ConversationViewSet(PerformanceMixin, viewsets.ReadOnlyModelViewSet):
+    """The user's threads, most recently active first, and the messages in each."""
+    serializer_class = ConversationSerializer
+    pagination_class = OptionalKeysetPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        return Conversation.objects.filter(
+            Q(participant_one=user) | Q(participant_two=user), last_message__isnull=False
+        ).select_related(
+            'participant_one', 'participant_two', 'advertisement', 'last_message'
+        ).order_by('-last_message_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        conversations = list(queryset) if page is None else page
+        context = {
+            **self.get_serializer_context(),
+            'unread': inbox.conversation_unread(request.user.pk, conversations),
+        }
+        data = self.get_serializer(conversations, many=True, context=context).data
+        return Response(data) if page is None else self.get_paginated_response(data)
+
+    @action(detail=True, methods=['get'], pagination_class=StrictKeysetPagination)
+    def messages(self, request, pk=None):
+        conversation = self.get_object()
+        rows = MessageValuesSerializer.values(conversation.messages.order_by('-created_at', '-id'))
+        page = self.paginate_queryset(rows)
+        return self.get_paginated_response(MessageValuesSerializer(page, many=True).data)
+
+    @action(detail=True, methods=['post'])
+    def mark_as_read(self, request, pk=None):
+        conversation = self.get_object()
+        with transaction.atomic():
+            conversation.messages.filter(recipient=request.user, is_read=False).update(is_read=True)
+            key = inbox.conversation_key(conversation.other_participant_id(request.user.pk), conversation.advertisement_id)
+            inbox.reset(request.user.pk, 'message', key)
+        return Response({'status': 'conversation marked as read'})
+
+
+@api_view(['GET'])
+def inbox_summary(request):
+    """Unread notifications per type and unread messages per conversation."""
+    return Response(inbox.summary(request.user.pk))
+
+
+@require_GET
+async def event_stream(request):
+    """Push the user's new notifications and messages as server-sent events."""
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI: hand over what is pending and let the client reconnect
+        return await sync_to_async(stream.pending_response)(request)
+
+    user = await stream.database(stream.authenticate, request)
+    if user is None:
+        return stream.unauthorized()
+    # Subscribe before reading the cursor so nothing slips in between
+    subscription = broadcast.get_broadcast().subscribe(broadcast.user_channel(user.pk))
+    cursor = stream.requested_cursor(request) or await stream.database(stream.current_cursor, user.pk)
+    response = StreamingHttpResponse(
+        stream.events(user.pk, cursor, subscription), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
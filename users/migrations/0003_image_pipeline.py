@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rent_api', '0001_initial'),
+        ('users', '0002_alter_customuser_profile_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='stored_profile_image',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='rent_api.storedimage'),
+        ),
+    ]
@@ -50,7 +50,11 @@ class CustomUser(AbstractUser):
         null=True,
         verbose_name=_('Phone Number')
     )
+    # Uploads made before the image pipeline; newer ones are in stored_profile_image
     profile_image = CloudinaryField('profile_image', blank=True, null=True)
+    stored_profile_image = models.OneToOneField(
+        'rent_api.StoredImage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
     role = models.CharField(
         max_length=20, 
         choices=Role.choices, 
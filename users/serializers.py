@@ -2,6 +2,8 @@ from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 from djoser.serializers import UserSerializer as BaseUserSerializer
 from rest_framework import serializers
 from django.core.validators import RegexValidator
+from django.db import transaction
+from rent_api import images
 from .models import CustomUser
 
 class CustomUserCreateSerializer(BaseUserCreateSerializer):
@@ -25,12 +27,16 @@ class CustomUserCreateSerializer(BaseUserCreateSerializer):
 
 class CustomUserSerializer(BaseUserSerializer):
     profile_image_url = serializers.SerializerMethodField()
+    profile_image_srcset = serializers.SerializerMethodField()
+    profile_image_blurhash = serializers.CharField(
+        source='stored_profile_image.blurhash', read_only=True, default=''
+    )
 
     class Meta(BaseUserSerializer.Meta):
         model = CustomUser
         fields = (
             'id', 'email', 'first_name', 'last_name', 'phone_number',
-            'profile_image', 'profile_image_url', 'role', 
+            'profile_image', 'profile_image_url', 'profile_image_srcset', 'profile_image_blurhash', 'role',
             'is_verified', 'is_active', 'created_at', 'last_login'
         )
         read_only_fields = ('id', 'email', 'is_verified', 'created_at', 'last_login')
@@ -46,6 +52,9 @@ class CustomUserSerializer(BaseUserSerializer):
     
     def get_profile_image_url(self, obj):
         request = self.context.get('request')
+        url = images.variant_url(obj.stored_profile_image)
+        if url:
+            return request.build_absolute_uri(url) if request else url
         try:
             if obj.profile_image and hasattr(obj.profile_image, 'url'):
                 url = obj.profile_image.url
@@ -56,6 +65,9 @@ class CustomUserSerializer(BaseUserSerializer):
             return None
         return None
 
+    def get_profile_image_srcset(self, obj):
+        return {format: images.srcset(obj.stored_profile_image, format) for format in images.get_setting('FORMATS')}
+
 class UserProfileUpdateSerializer(serializers.ModelSerializer):
     phone_number = serializers.CharField(
         max_length=15,
@@ -81,4 +93,15 @@ class ProfileImageSerializer(serializers.ModelSerializer):
     profile_image = serializers.ImageField()
     class Meta:
         model = CustomUser
-        fields = ('profile_image',)
\ No newline at end of file
+        fields = ('profile_image',)
+
+    def update(self, instance, validated_data):
+        # Through the image pipeline (rent_api/images.py) rather than straight to Cloudinary
+        previous = instance.stored_profile_image
+        with transaction.atomic():
+            instance.stored_profile_image = images.stage(validated_data['profile_image'])
+            instance.profile_image = None
+            instance.save(update_fields=['stored_profile_image', 'profile_image'])
+            if previous is not None:
+                previous.delete()
+        return instance
\ No newline at end of file
@@ -1,10 +1,11 @@
-from rest_framework import status, permissions
+from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.exceptions import ValidationError
+from rent_api.pagination import OptionalKeysetPagination
 from .models import CustomUser
 from .serializers import (CustomUserSerializer, UserProfileUpdateSerializer, 
                          ProfileImageSerializer)
@@ -50,16 +51,21 @@ class ProfileImageView(APIView):
             request.user.profile_image.delete()
             request.user.profile_image = None
             request.user.save()
+        if request.user.stored_profile_image:
+            # Its variants are deleted along with it
+            request.user.stored_profile_image.delete()
+            request.user.stored_profile_image = None
         user_serializer = CustomUserSerializer(request.user, context={'request': request})
         return Response(user_serializer.data)
 
-class UserListView(APIView):
+class UserListView(generics.ListAPIView):
+    """Every user, or keyset pages with ?cursor=; exports/users.ndjson streams the whole table."""
     permission_classes = [permissions.IsAdminUser]
-    
-    def get(self, request):
-        users = CustomUser.objects.all()
-        serializer = CustomUserSerializer(users, many=True, context={'request': request})
-        return Response(serializer.data)
+    serializer_class = CustomUserSerializer
+    pagination_class = OptionalKeysetPagination
+
+    def get_queryset(self):
+        return CustomUser.objects.select_related('stored_profile_image').order_by('-created_at', '-id')
 
 class UserLogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]